@@ -1,32 +1,24 @@
 import argparse
-import rasterio
-import numpy as np
 
-def calcular_areas_manchas(raster_path, min_valor, max_valor):
-    # Abrir o mosaico raster
-    with rasterio.open(raster_path) as src:
-        # Ler os dados do raster
-        raster_data = src.read(1)  # Lê a primeira banda
+import motor_area
 
-        # Obter a resolução espacial do raster (tamanho da célula)
-        pixel_area = src.res[0] * src.res[1]  # Largura x Altura da célula
+def calcular_areas_manchas(raster_path, min_valor, max_valor, **opcoes):
+    # Contar os pixels do mosaico raster em blocos, apenas dentro do intervalo
+    areas_motor = motor_area.calcular_area_manchas(raster_path, valor_min=min_valor, valor_max=max_valor, **opcoes)
 
-        # Dicionário para armazenar as áreas por valor
-        areas_por_valor = {}
+    # Dicionário para armazenar as áreas por valor
+    areas_por_valor = {}
 
-        # Calcular a área para cada valor dentro do intervalo
-        for valor in range(min_valor, max_valor + 1):
-            # Criar uma máscara para o valor atual
-            mancha_mask = raster_data == valor
+    # Obter a área para cada valor dentro do intervalo
+    for valor in range(min_valor, max_valor + 1):
+        # Calcular a área em unidades do sistema de coordenadas do raster
+        area_total = areas_motor.get(valor, (0.0, 0.0))[0]
 
-            # Calcular a área em unidades do sistema de coordenadas do raster
-            area_total = np.sum(mancha_mask) * pixel_area
+        # Armazenar o resultado
+        areas_por_valor[valor] = area_total
 
-            # Armazenar o resultado
-            areas_por_valor[valor] = area_total
-
-            # Mostrar a área calculada para cada valor
-            print(f'Área total para a mancha com valor {valor}: {area_total:.2f} unidades²')
+        # Mostrar a área calculada para cada valor
+        print(f'Área total para a mancha com valor {valor}: {area_total:.2f} unidades²')
 
     return areas_por_valor
 
@@ -36,10 +28,13 @@ if __name__ == "__main__":
     parser.add_argument('raster_path', type=str, help='Caminho para o arquivo raster (mosaico).')
     parser.add_argument('min_valor', type=int, help='Valor mínimo das manchas.')
     parser.add_argument('max_valor', type=int, help='Valor máximo das manchas.')
+    motor_area.adicionar_argumentos_motor(parser)
+    motor_area.adicionar_argumentos_aproximacao(parser)
 
     # Ler os argumentos
     args = parser.parse_args()
 
     # Chamar a função com os argumentos da linha de comando
-    calcular_areas_manchas(args.raster_path, args.min_valor, args.max_valor)
+    calcular_areas_manchas(args.raster_path, args.min_valor, args.max_valor,
+                           **motor_area.opcoes_motor(args), **motor_area.opcoes_aproximacao(args))
 
@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 
 import os
-import sys
-import numpy as np
-import rasterio
-import pandas as pd
+import argparse
+
+import indice_zonas
+import manifesto_area
+import motor_area
+import saida_area
 
 def verificar_entrada_existente(caminho):
     """
@@ -13,69 +15,70 @@ def verificar_entrada_existente(caminho):
     if not os.path.exists(caminho):
         raise FileNotFoundError(f"Arquivo ou diretório não encontrado: {caminho}")
 
-def calcular_area_manchas(raster_path, pixel_area):
+def calcular_area_manchas(raster_path, pixel_area, **opcoes):
     """
     Calcula a área das manchas no raster cortado.
     
     Parâmetros:
     - raster_path: Caminho para o raster cortado.
     - pixel_area: Área de cada pixel (resolução).
+    - opcoes: Opções do motor de área (ex.: orcamento_memoria).
     
     Retorna um dicionário com a área das manchas.
     """
-    with rasterio.open(raster_path) as src:
-        raster_data = src.read(1)  # Ler a primeira banda
-        valores_unicos, contagem = np.unique(raster_data, return_counts=True)
-
-        # Calcular a área para cada valor único (mancha)
-        areas_m2 = contagem * pixel_area  # Multiplica o número de pixels pela área de cada pixel em metros quadrados
-        areas_ha = areas_m2 / 10000  # Converter de metros quadrados para hectares
-
-        return dict(zip(valores_unicos, zip(areas_m2, areas_ha)))  # Retorna tanto a área em m² quanto em hectares
-
-def salvar_areas_em_csv(areas_por_estado, output_csv):
-    """
-    Salva as áreas das manchas em um arquivo CSV.
-    
-    Parâmetros:
-    - areas_por_estado: Dicionário com as áreas das manchas por estado.
-    - output_csv: Caminho do arquivo CSV de saída.
-    """
-    df = pd.DataFrame(areas_por_estado)
-    df.to_csv(output_csv, index=False)
-    print(f"Arquivo CSV salvo em: {output_csv}")
+    # Percorrer o raster em blocos usando a área de pixel informada
+    return motor_area.calcular_area_manchas(raster_path, pixel_area=pixel_area, **opcoes)
 
 def main():
-    if len(sys.argv) != 4:
-        print("Uso correto: python calcular_areas_manchas.py <diretorio_rasters> <resolucao_metros> <output.csv>")
-        sys.exit(1)
-
-    # Capturar os argumentos da linha de comando
-    diretorio_rasters = sys.argv[1]
-    resolucao = float(sys.argv[2])
-    output_csv = sys.argv[3]
+    # Configurar os argumentos da linha de comando
+    parser = argparse.ArgumentParser(description="Calcular as áreas das manchas de cada raster estadual de um diretório, com resolução informada, e salvar em CSV.")
+    parser.add_argument('diretorio_rasters', type=str, help="Diretório com os rasters cortados por estado (.tif ou .vrt), ou o mosaico quando --estados for usado.")
+    parser.add_argument('resolucao', type=float, help="Resolução do pixel em metros.")
+    parser.add_argument('output_csv', type=str, help="Caminho do arquivo CSV de saída.")
+    motor_area.adicionar_argumentos_motor(parser)
+    motor_area.adicionar_argumentos_aproximacao(parser)
+    motor_area.adicionar_argumentos_intervalos(parser)
+    indice_zonas.adicionar_argumentos_zonais(parser, cobertura=True)
+    saida_area.adicionar_argumentos_saida(parser)
+    manifesto_area.adicionar_argumentos_manifesto(parser)
+    args = parser.parse_args()
 
     # Calcular a área de cada pixel
-    pixel_area = resolucao * resolucao
+    pixel_area = args.resolucao * args.resolucao
 
-    # Listar os rasters no diretório
-    rasters = [os.path.join(diretorio_rasters, f) for f in os.listdir(diretorio_rasters) if f.endswith('.tif')]
+    if args.estados and (args.approx is not None or args.intervalos or args.limites_intervalos):
+        parser.error("--approx e os intervalos não estão disponíveis no modo zonal (--estados).")
 
-    areas_por_estado = {"Estado": [], "Mancha": [], "Area_m2": [], "Area_ha": []}
+    opcoes = motor_area.opcoes_motor(args)
+    aproximacao = motor_area.opcoes_aproximacao(args)
+    intervalos = motor_area.opcoes_intervalos(args)
 
-    # Calcular as áreas das manchas para cada raster
-    for raster_path in rasters:
-        estado_nome = os.path.basename(raster_path).replace("raster_", "").replace(".tif", "")
-        areas_manchas = calcular_area_manchas(raster_path, pixel_area)
+    # Gravar os resultados de cada estado assim que ficam prontos
+    with saida_area.abrir_saida(args.output_csv, **saida_area.opcoes_saida(args)) as escrever:
+        if args.estados:
+            # Modo zonal: rasterizar os estados uma vez e contar o mosaico em uma única passada
+            verificar_entrada_existente(args.diretorio_rasters)
+            verificar_entrada_existente(args.estados)
+            areas_por_raster = indice_zonas.calcular_area_manchas_por_zona(args.diretorio_rasters, args.estados, campo=args.campo,
+                                                                             diretorio_cache=args.cache_zonas, cobertura_exata=args.cobertura_exata,
+                                                                             pixel_area=pixel_area, **opcoes)
+            for estado_nome, areas_manchas in areas_por_raster.items():
+                escrever(saida_area.colunas_areas(areas_manchas, Estado=estado_nome))
+        else:
+            # Listar os rasters no diretório
+            rasters = [os.path.join(args.diretorio_rasters, f) for f in os.listdir(args.diretorio_rasters) if f.endswith(('.tif', '.vrt'))]
 
-        for mancha, (area_m2, area_ha) in areas_manchas.items():
-            areas_por_estado["Estado"].append(estado_nome)
-            areas_por_estado["Mancha"].append(mancha)
-            areas_por_estado["Area_m2"].append(area_m2)
-            areas_por_estado["Area_ha"].append(area_ha)
+            # Calcular as áreas das manchas para cada raster
+            # (os rasters que não mudaram são lidos do manifesto ao lado da saída)
+            parametros = {"pixel_area": pixel_area, "valor_min": None, "valor_max": None,
+                          "tolerancia": args.approx, "intervalos": intervalos["intervalos"]}
+            def calcular(raster_path):
+                return calcular_area_manchas(raster_path, pixel_area, **opcoes, **aproximacao, **intervalos)
 
-    # Salvar as áreas em um arquivo CSV
-    salvar_areas_em_csv(areas_por_estado, output_csv)
+            for raster_path, areas_manchas in manifesto_area.calcular_areas_com_manifesto(
+                    rasters, args.output_csv, calcular, parametros, args.hash, not args.sem_manifesto):
+                estado_nome = os.path.splitext(os.path.basename(raster_path))[0].replace("raster_", "")
+                escrever(saida_area.colunas_areas(areas_manchas, Estado=estado_nome))
 
 if __name__ == "__main__":
     main()
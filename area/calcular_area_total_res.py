@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 
 import os
-import sys
-import numpy as np
-import rasterio
-import pandas as pd
+import argparse
+
+import motor_area
+import saida_area
 
 def verificar_entrada_existente(caminho):
     """
@@ -13,65 +13,57 @@ def verificar_entrada_existente(caminho):
     if not os.path.exists(caminho):
         raise FileNotFoundError(f"Arquivo ou diretório não encontrado: {caminho}")
 
-def calcular_area_manchas(raster_path, pixel_area):
+def calcular_area_manchas(raster_path, pixel_area, **opcoes):
     """
     Calcula a área das manchas no raster cortado.
     
     Parâmetros:
     - raster_path: Caminho para o raster.
     - pixel_area: Área de cada pixel (resolução).
+    - opcoes: Opções do motor de área (ex.: orcamento_memoria).
     
     Retorna um dicionário com a área das manchas em metros quadrados e hectares.
     """
-    with rasterio.open(raster_path) as src:
-        raster_data = src.read(1)  # Ler a primeira banda
-        valores_unicos, contagem = np.unique(raster_data, return_counts=True)
-
-        # Calcular a área para cada valor único (mancha)
-        areas_m2 = contagem * pixel_area  # Multiplica o número de pixels pela área de cada pixel em metros quadrados
-        areas_ha = areas_m2 / 10000  # Converter de metros quadrados para hectares
-
-        return dict(zip(valores_unicos, zip(areas_m2, areas_ha)))  # Retorna tanto a área em m² quanto em hectares
+    # Percorrer o raster em blocos usando a área de pixel informada
+    return motor_area.calcular_area_manchas(raster_path, pixel_area=pixel_area, **opcoes)
 
-def salvar_areas_em_csv(areas_manchas, output_csv):
+def salvar_areas_em_csv(areas_manchas, output_csv, **opcoes_saida):
     """
-    Salva as áreas das manchas em um arquivo CSV.
+    Salva as áreas das manchas em um arquivo CSV (ou Parquet/SQLite, conforme a extensão).
     
     Parâmetros:
     - areas_manchas: Dicionário com as áreas das manchas.
     - output_csv: Caminho do arquivo CSV de saída.
+    - opcoes_saida: Opções da saída (formato, anexar, tabela).
     """
-    df = pd.DataFrame(columns=["Mancha", "Area_m2", "Area_ha"])
-    
-    # Use pd.concat corretamente
-    df = pd.concat([pd.DataFrame({"Mancha": [mancha], "Area_m2": [area_m2], "Area_ha": [area_ha]})
-                    for mancha, (area_m2, area_ha) in areas_manchas.items()],
-                   ignore_index=True)
-    
-    df.to_csv(output_csv, index=False)
-    print(f"Arquivo CSV salvo em: {output_csv}")
+    # Montar as colunas direto do dicionário e gravar em uma única chamada
+    with saida_area.abrir_saida(output_csv, **opcoes_saida) as escrever:
+        escrever(saida_area.colunas_areas(areas_manchas))
 
 def main():
-    if len(sys.argv) != 4:
-        print("Uso correto: python calcular_areas_manchas.py <raster.tif> <resolucao_metros> <output.csv>")
-        sys.exit(1)
-
-    # Capturar os argumentos da linha de comando
-    raster_path = sys.argv[1]
-    resolucao = float(sys.argv[2])
-    output_csv = sys.argv[3]
+    # Configurar os argumentos da linha de comando
+    parser = argparse.ArgumentParser(description="Calcular as áreas das manchas de um raster com resolução informada e salvar em CSV.")
+    parser.add_argument('raster_path', type=str, help="Caminho para o arquivo raster.")
+    parser.add_argument('resolucao', type=float, help="Resolução do pixel em metros.")
+    parser.add_argument('output_csv', type=str, help="Caminho do arquivo CSV de saída.")
+    motor_area.adicionar_argumentos_motor(parser)
+    motor_area.adicionar_argumentos_aproximacao(parser)
+    motor_area.adicionar_argumentos_intervalos(parser)
+    saida_area.adicionar_argumentos_saida(parser)
+    args = parser.parse_args()
 
     # Verificar se o raster existe
-    verificar_entrada_existente(raster_path)
+    verificar_entrada_existente(args.raster_path)
 
     # Calcular a área de cada pixel
-    pixel_area = resolucao * resolucao
+    pixel_area = args.resolucao * args.resolucao
 
     # Calcular as áreas das manchas para o raster
-    areas_manchas = calcular_area_manchas(raster_path, pixel_area)
+    areas_manchas = calcular_area_manchas(args.raster_path, pixel_area, **motor_area.opcoes_motor(args),
+                                          **motor_area.opcoes_aproximacao(args), **motor_area.opcoes_intervalos(args))
 
     # Salvar as áreas em um arquivo CSV
-    salvar_areas_em_csv(areas_manchas, output_csv)
+    salvar_areas_em_csv(areas_manchas, args.output_csv, **saida_area.opcoes_saida(args))
 
 if __name__ == "__main__":
     main()
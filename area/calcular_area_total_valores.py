@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 
 import os
-import sys
-import numpy as np
-import rasterio
-import pandas as pd
+import argparse
+
+import motor_area
+import saida_area
 
 def verificar_entrada_existente(caminho):
     """
@@ -13,7 +13,7 @@ def verificar_entrada_existente(caminho):
     if not os.path.exists(caminho):
         raise FileNotFoundError(f"Arquivo ou diretório não encontrado: {caminho}")
 
-def calcular_area_manchas(raster_path, valor_min, valor_max):
+def calcular_area_manchas(raster_path, valor_min, valor_max, **opcoes):
     """
     Calcula a área das manchas no raster dentro de um intervalo de valores.
     
@@ -21,69 +21,49 @@ def calcular_area_manchas(raster_path, valor_min, valor_max):
     - raster_path: Caminho para o raster.
     - valor_min: Valor mínimo do intervalo de manchas a serem processadas.
     - valor_max: Valor máximo do intervalo de manchas a serem processadas.
+    - opcoes: Opções do motor de área (ex.: orcamento_memoria).
     
     Retorna um dicionário com a área das manchas em metros quadrados e hectares.
     """
-    with rasterio.open(raster_path) as src:
-        # Extrair a resolução diretamente do raster
-        pixel_area = src.res[0] * src.res[1]  # Calcular a área do pixel (em metros quadrados)
-
-        raster_data = src.read(1)  # Ler a primeira banda
-        
-        # Filtrar os valores únicos dentro do intervalo definido
-        valores_unicos, contagem = np.unique(raster_data, return_counts=True)
-        filtro = (valores_unicos >= valor_min) & (valores_unicos <= valor_max)
-        valores_filtrados = valores_unicos[filtro]
-        contagem_filtrada = contagem[filtro]
-
-        # Calcular a área para cada valor filtrado (mancha)
-        areas_m2 = contagem_filtrada * pixel_area  # Área em metros quadrados
-        areas_ha = areas_m2 / 10000  # Converter de metros quadrados para hectares
-
-        return dict(zip(valores_filtrados, zip(areas_m2, areas_ha)))  # Retorna as áreas em m² e ha
+    # Percorrer o raster em blocos, extraindo a resolução diretamente do raster
+    return motor_area.calcular_area_manchas(raster_path, valor_min=valor_min, valor_max=valor_max, **opcoes)
 
-def salvar_areas_em_csv(areas_manchas, output_csv):
+def salvar_areas_em_csv(areas_manchas, output_csv, **opcoes_saida):
     """
-    Salva as áreas das manchas em um arquivo CSV.
+    Salva as áreas das manchas em um arquivo CSV (ou Parquet/SQLite, conforme a extensão).
     
     Parâmetros:
     - areas_manchas: Dicionário com as áreas das manchas.
     - output_csv: Caminho do arquivo CSV de saída.
+    - opcoes_saida: Opções da saída (formato, anexar, tabela).
     """
-    # Lista para armazenar os DataFrames
-    lista_df = []
-
-    # Criar DataFrames para cada mancha e concatenar no final
-    for mancha, (area_m2, area_ha) in areas_manchas.items():
-        df = pd.DataFrame({"Mancha": [mancha], "Area_m2": [area_m2], "Area_ha": [area_ha]})
-        lista_df.append(df)
-    
-    # Concatenar todos os DataFrames
-    df_final = pd.concat(lista_df, ignore_index=True)
-
-    # Salvar o DataFrame concatenado em CSV
-    df_final.to_csv(output_csv, index=False)
-    print(f"Arquivo CSV salvo em: {output_csv}")
+    # Montar as colunas direto do dicionário e gravar em uma única chamada
+    with saida_area.abrir_saida(output_csv, **opcoes_saida) as escrever:
+        escrever(saida_area.colunas_areas(areas_manchas))
 
 def main():
-    if len(sys.argv) != 5:
-        print("Uso correto: python calcular_areas_manchas.py <raster.tif> <valor_min> <valor_max> <output.csv>")
-        sys.exit(1)
-
-    # Capturar os argumentos da linha de comando
-    raster_path = sys.argv[1]
-    valor_min = int(sys.argv[2])
-    valor_max = int(sys.argv[3])
-    output_csv = sys.argv[4]
+    # Configurar os argumentos da linha de comando
+    parser = argparse.ArgumentParser(description="Calcular as áreas das manchas de um raster dentro de um intervalo de valores e salvar em CSV.")
+    parser.add_argument('raster_path', type=str, help="Caminho para o arquivo raster.")
+    parser.add_argument('valor_min', type=int, help="Valor mínimo do intervalo de manchas.")
+    parser.add_argument('valor_max', type=int, help="Valor máximo do intervalo de manchas.")
+    parser.add_argument('output_csv', type=str, help="Caminho do arquivo CSV de saída.")
+    motor_area.adicionar_argumentos_motor(parser)
+    motor_area.adicionar_argumentos_aproximacao(parser)
+    motor_area.adicionar_argumentos_intervalos(parser)
+    saida_area.adicionar_argumentos_saida(parser)
+    args = parser.parse_args()
 
     # Verificar se o raster existe
-    verificar_entrada_existente(raster_path)
+    verificar_entrada_existente(args.raster_path)
 
     # Calcular as áreas das manchas para o raster dentro do intervalo de valores
-    areas_manchas = calcular_area_manchas(raster_path, valor_min, valor_max)
+    areas_manchas = calcular_area_manchas(args.raster_path, args.valor_min, args.valor_max,
+                                          **motor_area.opcoes_motor(args), **motor_area.opcoes_aproximacao(args),
+                                          **motor_area.opcoes_intervalos(args))
 
     # Salvar as áreas em um arquivo CSV
-    salvar_areas_em_csv(areas_manchas, output_csv)
+    salvar_areas_em_csv(areas_manchas, args.output_csv, **saida_area.opcoes_saida(args))
 
 if __name__ == "__main__":
     main()
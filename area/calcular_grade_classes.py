@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Grade grosseira com a área de cada classe por célula (ex.: por 1 km ou por 0,1°).
+
+A grade tem origem alinhada a múltiplos do tamanho da célula, e cada pixel entra na
+célula que contém o seu centro, de modo que a célula não precisa ter um número inteiro
+de pixels (ex.: 1000 m sobre pixels de 30 m). O mosaico é lido uma única vez, em faixas
+de linhas inteiras de células, e cada faixa é reduzida de forma vetorizada: um único
+bincount conta os pixels de cada classe em cada célula. O resultado é um GeoTIFF com uma
+banda por classe, em hectares por célula, gravado em blocos e comprimido. Com --workers,
+as faixas são reduzidas em paralelo e gravadas pelo processo principal, na ordem.
+
+As bandas só são conhecidas depois de todas as faixas: em rasters inteiros, as faixas
+reduzidas vão para um arquivo temporário ao lado da saída e são copiadas para as bandas no
+fim. Rasters de ponto flutuante (ou inteiros com intervalo largo demais para o bincount)
+precisam de uma passada prévia para levantar as classes e gravam as faixas direto.
+"""
+
+import os
+import math
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio.transform import Affine
+from rasterio.windows import Window
+
+import motor_area
+import tabela_integral
+
+# Lado dos blocos do GeoTIFF de saída, em células
+_BLOCO_SAIDA = 256
+
+# Tolerância para tratar o tamanho de célula como um fator inteiro de pixels, com a grade
+# alinhada ao canto do raster
+_TOLERANCIA_FATOR = 1e-6
+
+def verificar_entrada_existente(caminho):
+    """
+    Verifica se o arquivo ou diretório existe.
+    """
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f"Arquivo ou diretório não encontrado: {caminho}")
+
+def grade_de_celulas(src, tamanho_celula=None, fator=None):
+    """
+    Define a grade grosseira sobre o raster.
+
+    Com `fator`, as células têm fator x fator pixels a partir do canto do raster. Com
+    `tamanho_celula` (nas unidades do CRS, ex.: 1000 m ou 0.1°), a origem da grade é alinhada
+    a múltiplos do tamanho da célula e cada pixel entra na célula que contém o seu centro,
+    floor((coordenada - origem_grade) / tamanho_celula); se o tamanho for um múltiplo inteiro
+    da resolução e o canto do raster já estiver alinhado, equivale a um fator inteiro.
+
+    Retorna um dicionário com o transform, a largura e a altura da grade, o fator inteiro (ou
+    None) e, por eixo (x, y), a razão entre a célula e o pixel e o deslocamento da origem da
+    grade em relação ao canto do raster, em pixels.
+    """
+    transform = src.transform
+    if transform.b != 0 or transform.d != 0 or transform.e >= 0:
+        raise ValueError(f"A grade de classes exige um raster sem rotação e com o norte para cima: {src.name}")
+    xres, yres = transform.a, -transform.e
+
+    if fator is None:
+        razao = (tamanho_celula / xres, tamanho_celula / yres)
+        if min(razao) < 1 - _TOLERANCIA_FATOR:
+            raise ValueError(f"O tamanho de célula {tamanho_celula} é menor que a resolução {src.res}.")
+
+        # Canto noroeste da célula que contém o centro do primeiro pixel
+        oeste = math.floor((transform.c + xres / 2) / tamanho_celula) * tamanho_celula
+        norte = math.ceil((transform.f - yres / 2) / tamanho_celula) * tamanho_celula
+        deslocamento = ((oeste - transform.c) / xres, (transform.f - norte) / yres)
+
+        inteiro = round(razao[0])
+        if (all(abs(r - inteiro) <= _TOLERANCIA_FATOR * r for r in razao) and
+                all(abs(d) <= _TOLERANCIA_FATOR for d in deslocamento)):
+            fator = inteiro
+        else:
+            grade = {"transform": Affine(tamanho_celula, 0, oeste, 0, -tamanho_celula, norte), "fator": None,
+                     "razao": razao, "deslocamento": deslocamento}
+
+    if fator is not None:
+        grade = {"transform": transform * Affine.scale(fator), "fator": fator,
+                 "razao": (float(fator), float(fator)), "deslocamento": (0.0, 0.0)}
+    grade["largura"] = int(celulas_dos_pixels(grade, 0, src.width - 1, 1)[0]) + 1
+    grade["altura"] = int(celulas_dos_pixels(grade, 1, src.height - 1, 1)[0]) + 1
+    return grade
+
+def celulas_dos_pixels(grade, eixo, inicio, n):
+    """
+    Retorna o índice na grade da célula de `n` pixels consecutivos a partir de `inicio`:
+    colunas com `eixo` 0, linhas com `eixo` 1.
+    """
+    pixels = np.arange(inicio, inicio + n)
+    if grade["fator"] is not None:
+        return pixels // grade["fator"]
+    return np.floor((pixels + 0.5 - grade["deslocamento"][eixo]) / grade["razao"][eixo]).astype(np.intp)
+
+def perfil_grade(src, grade, n_classes):
+    """
+    Monta o perfil do GeoTIFF da grade: uma banda float32 por classe, em blocos e comprimido.
+    """
+    largura, altura = grade["largura"], grade["altura"]
+    perfil = {
+        "driver": "GTiff",
+        "width": largura,
+        "height": altura,
+        "count": n_classes,
+        "dtype": "float32",
+        "crs": src.crs,
+        "transform": grade["transform"],
+        "compress": "DEFLATE",
+        "predictor": 3,
+        "interleave": "band",
+        "BIGTIFF": "IF_SAFER",
+    }
+    if largura > _BLOCO_SAIDA or altura > _BLOCO_SAIDA:
+        perfil.update({"tiled": True, "blockxsize": _BLOCO_SAIDA, "blockysize": _BLOCO_SAIDA})
+    return perfil
+
+def _reduzir_faixa(raster_path, inicio, altura, valores, plano, grade, pesos_linhas, unidade):
+    """
+    Lê uma faixa de linhas inteiras de células e retorna a área (ha) de cada classe por célula.
+
+    Com `valores` None, as classes são as presentes na faixa (contadas com `plano`, como em
+    `motor_area.contar_pixels`); senão, as de `valores`. Retorna uma tupla (valores, areas),
+    com `areas` float32 (classes, linhas_de_celulas, colunas_de_celulas).
+
+    Abre o raster a cada chamada, para funcionar também em um processo separado.
+    """
+    with rasterio.open(raster_path) as src:
+        janela = Window(0, inicio, src.width, altura)
+        dados = src.read(1, window=janela)
+    if valores is None:
+        acumulador = motor_area.acumular_bloco(motor_area.novo_acumulador(plano), dados, plano)
+        valores, _ = motor_area.finalizar_contagem(acumulador, plano)
+    indices_classe = tabela_integral.indices_de_classe(dados, valores)
+    linhas_celula = celulas_dos_pixels(grade, 1, inicio, altura)
+    celulas = tabela_integral.contar_celulas(indices_classe, motor_area.pesos_da_janela(pesos_linhas, janela),
+                                             grade["fator"], grade["largura"], valores.size,
+                                             linhas_celula - linhas_celula[0],
+                                             celulas_dos_pixels(grade, 0, 0, dados.shape[1]))
+    return valores, (np.moveaxis(celulas, 2, 0) * (unidade / 10000)).astype(np.float32)
+
+def _reduzir_faixas(argumentos, workers):
+    """
+    Reduz as faixas em série ou em `workers` processos e gera os resultados na ordem.
+
+    Em paralelo, no máximo 2 x workers faixas ficam em andamento ou prontas à espera de
+    gravação, para que a memória não cresça com o número de faixas.
+    """
+    if workers <= 1:
+        yield from map(_reduzir_faixa, *argumentos)
+        return
+
+    # Usar "spawn" para não herdar o estado interno do GDAL do processo pai
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=contexto) as executor:
+        pendentes = deque()
+        try:
+            for argumentos_faixa in zip(*argumentos):
+                pendentes.append(executor.submit(_reduzir_faixa, *argumentos_faixa))
+                if len(pendentes) > 2 * workers:
+                    yield pendentes.popleft().result()
+            while pendentes:
+                yield pendentes.popleft().result()
+        finally:
+            for futuro in pendentes:
+                futuro.cancel()
+
+def _gravar_faixa(dst, valores, linha, valores_faixa, areas_faixa):
+    """
+    Grava uma faixa reduzida na grade, a partir da linha de células `linha`; as bandas das
+    classes ausentes da faixa ficam com área zero.
+    """
+    areas = np.zeros((valores.size, *areas_faixa.shape[1:]), dtype=np.float32)
+    areas[np.searchsorted(valores, valores_faixa)] = areas_faixa
+    dst.write(areas, window=Window(0, linha, dst.width, areas.shape[1]))
+
+def _verificar_classes(valores, raster_path):
+    """
+    Verifica se o número de classes no intervalo cabe nas bandas da grade.
+    """
+    if valores.size == 0:
+        raise ValueError(f"Nenhuma classe encontrada no intervalo em {raster_path}.")
+    if valores.size > tabela_integral.MAX_CLASSES:
+        raise ValueError(f"O raster tem {valores.size} classes no intervalo (máximo {tabela_integral.MAX_CLASSES}); "
+                         "restrinja o intervalo com --valor-min/--valor-max.")
+
+def calcular_grade_classes(raster_path, output_path, tamanho_celula=None, fator=None, pixel_area=None,
+                           valor_min=None, valor_max=None,
+                           orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO, workers=1):
+    """
+    Calcula a área de cada classe por célula da grade grosseira e grava o GeoTIFF de saída.
+
+    Parâmetros:
+    - raster_path: Caminho para o raster (ex.: o mosaico).
+    - output_path: Caminho do GeoTIFF de saída (uma banda por classe, em hectares).
+    - tamanho_celula: Lado da célula, nas unidades do CRS do raster (ex.: 1000 ou 0.1); não
+      precisa ser múltiplo da resolução (ver `grade_de_celulas`).
+    - fator: Lado da célula em pixels (alternativa a `tamanho_celula`).
+    - pixel_area, valor_min, valor_max, orcamento_memoria, workers: Ver `motor_area.calcular_area_manchas`.
+
+    Em rasters inteiros cujo intervalo cabe no bincount, o mosaico é lido uma única vez: cada
+    faixa é reduzida só nas classes presentes nela e gravada em um arquivo temporário ao lado
+    da saída, até que o conjunto de classes, que define as bandas, seja conhecido; só uma
+    faixa por vez fica em memória. Nos demais (ponto flutuante ou intervalos largos), uma
+    passada prévia levanta as classes e as faixas são gravadas direto na saída.
+
+    Retorna a lista de classes, na ordem das bandas.
+    """
+    with rasterio.open(raster_path) as src:
+        grade = grade_de_celulas(src, tamanho_celula, fator)
+        pesos_linhas, unidade = motor_area.definir_area_pixel(src, pixel_area)
+        plano = motor_area.planejar_contagem(src.dtypes[0], valor_min, valor_max)
+
+        valores = None
+        if plano["modo"] != "bincount":
+            # As classes presentes no intervalo definem as bandas da saída
+            print(f"INFO: Tipo {src.dtypes[0]} sem contagem direta no intervalo; as classes são levantadas "
+                  "em uma passada prévia pelo raster.")
+            valores, _ = motor_area.contar_pixels(src, valor_min, valor_max, orcamento_memoria, workers, pesos_linhas)
+            _verificar_classes(valores, raster_path)
+
+        altura_raster, largura_raster = src.height, src.width
+        bytes_pixel = motor_area.bytes_por_pixel(src.dtypes[0])
+
+    # Faixas de linhas inteiras de células, dentro do orçamento de memória de cada processo
+    workers = max(1, workers)
+    linhas_pixels = max(1, int(orcamento_memoria // workers // (bytes_pixel * largura_raster)))
+    celulas_faixa = max(1, int(linhas_pixels // grade["razao"][1]))
+    linhas_celula = celulas_dos_pixels(grade, 1, 0, altura_raster)
+    inicios = np.searchsorted(linhas_celula, np.arange(0, grade["altura"], celulas_faixa)).tolist()
+    alturas = np.diff(inicios + [altura_raster]).tolist()
+    linhas_grade = [int(linhas_celula[inicio]) for inicio in inicios]
+    n = len(inicios)
+    argumentos = ([raster_path] * n, inicios, alturas, [valores] * n, [plano] * n, [grade] * n, [pesos_linhas] * n,
+                  [unidade] * n)
+    faixas = _reduzir_faixas(argumentos, workers)
+
+    descricao = (f"células de {grade['fator']} x {grade['fator']} pixels" if grade["fator"] is not None else
+                 f"células de {grade['transform'].a:g} ({grade['razao'][0]:.4g} x {grade['razao'][1]:.4g} pixels)")
+    with rasterio.open(raster_path) as src:
+        if valores is not None:
+            perfil = perfil_grade(src, grade, valores.size)
+            print(f"INFO: Grade de {perfil['height']} x {perfil['width']} {descricao}, {valores.size} classes, "
+                  f"{n} faixas.")
+            with rasterio.open(output_path, "w", **perfil) as dst:
+                for banda, valor in enumerate(valores, start=1):
+                    dst.set_band_description(banda, f"classe_{valor}")
+                for linha, (valores_faixa, areas_faixa) in zip(linhas_grade, faixas):
+                    _gravar_faixa(dst, valores, linha, valores_faixa, areas_faixa)
+            print(f"Grade de classes salva em: {output_path}")
+            return valores
+
+        # Classes ainda desconhecidas: as faixas vão para um arquivo temporário, na ordem
+        temporario = output_path + f".{os.getpid()}.tmp"
+        try:
+            valores_faixas, classes = [], np.empty(0)
+            with open(temporario, "wb") as f:
+                for valores_faixa, areas_faixa in faixas:
+                    classes = np.union1d(classes, valores_faixa)
+                    if classes.size > tabela_integral.MAX_CLASSES:
+                        _verificar_classes(classes, raster_path)
+                    valores_faixas.append(valores_faixa)
+                    np.save(f, areas_faixa)
+            valores = np.unique(np.concatenate(valores_faixas))
+            _verificar_classes(valores, raster_path)
+
+            perfil = perfil_grade(src, grade, valores.size)
+            print(f"INFO: Grade de {perfil['height']} x {perfil['width']} {descricao}, {valores.size} classes, "
+                  f"{n} faixas.")
+            with open(temporario, "rb") as f, rasterio.open(output_path, "w", **perfil) as dst:
+                for banda, valor in enumerate(valores, start=1):
+                    dst.set_band_description(banda, f"classe_{valor}")
+                for linha, valores_faixa in zip(linhas_grade, valores_faixas):
+                    _gravar_faixa(dst, valores, linha, valores_faixa, np.load(f))
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+
+    print(f"Grade de classes salva em: {output_path}")
+    return valores
+
+def main():
+    # Configurar os argumentos da linha de comando
+    parser = argparse.ArgumentParser(description="Calcular a área (ha) de cada classe por célula de uma grade grosseira e salvar em um GeoTIFF com uma banda por classe.")
+    parser.add_argument('raster_path', type=str, help="Caminho para o raster (ex.: o mosaico).")
+    parser.add_argument('output_tif', type=str, help="Caminho do GeoTIFF de saída.")
+    celula = parser.add_mutually_exclusive_group(required=True)
+    celula.add_argument('--celula', type=float, help="Lado da célula nas unidades do CRS do raster (ex.: 1000 ou 0.1).")
+    celula.add_argument('--fator', type=int, help="Lado da célula em pixels do raster.")
+    parser.add_argument('--resolucao', type=float, default=None, help="Resolução do pixel em metros (opcional).")
+    parser.add_argument('--valor-min', type=float, default=None, help="Valor mínimo das classes (opcional).")
+    parser.add_argument('--valor-max', type=float, default=None, help="Valor máximo das classes (opcional).")
+    motor_area.adicionar_argumentos_motor(parser)
+    args = parser.parse_args()
+
+    verificar_entrada_existente(args.raster_path)
+
+    # Calcular a área de cada pixel, se a resolução foi informada
+    pixel_area = args.resolucao * args.resolucao if args.resolucao else None
+
+    calcular_grade_classes(args.raster_path, args.output_tif, args.celula, args.fator, pixel_area,
+                           args.valor_min, args.valor_max, **motor_area.opcoes_motor(args))
+
+if __name__ == "__main__":
+    main()
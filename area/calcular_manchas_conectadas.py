@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+Estatísticas de manchas (componentes conectados) por classe, e opcionalmente por estado.
+
+Os scripts `calcular_area_*` contam pixels por valor; aqui cada mancha é uma região
+contígua de pixels da mesma classe. O raster é percorrido em faixas de largura total:
+cada faixa é rotulada em uma única passada (`scipy.sparse.csgraph.connected_components`
+sobre as ligações entre vizinhos de mesma classe, qualquer que seja o número de classes),
+e as manchas que tocam a borda entre faixas são unidas às da faixa seguinte. Uma mancha
+é emitida assim que deixa de tocar a última linha lida, de modo que a memória fica
+limitada ao tamanho da faixa mais uma linha de rótulos.
+"""
+
+import os
+import argparse
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+import indice_zonas
+import motor_area
+import saida_area
+
+# Limites (em hectares) das classes de tamanho do resumo
+CLASSES_TAMANHO_PADRAO = (1, 10, 100, 1000)
+
+# Memória de trabalho por pixel da faixa: chaves, rótulos e ligações do grafo
+_BYTES_ROTULAGEM_POR_PIXEL = 96
+
+def verificar_entrada_existente(caminho):
+    """
+    Verifica se o arquivo ou diretório existe.
+    """
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f"Arquivo ou diretório não encontrado: {caminho}")
+
+def planejar_chaves(dtype, n_zonas=0, valor_min=None, valor_max=None, nodata=None):
+    """
+    Monta o plano de codificação (zona, classe) -> chave inteira.
+
+    Retorna um dicionário com o menor valor do tipo, o número de valores possíveis e os
+    filtros de intervalo e de nodata. Pixels filtrados recebem a chave -1.
+    """
+    dtype = np.dtype(dtype)
+    if not np.issubdtype(dtype, np.integer):
+        raise ValueError(f"A rotulagem de manchas exige rasters de classes inteiras (tipo encontrado: {dtype})")
+    info = np.iinfo(dtype)
+    n_valores = int(info.max) - int(info.min) + 1
+    if n_valores * (n_zonas + 1) > np.iinfo(np.int64).max:
+        raise ValueError(f"Tipo muito largo para a rotulagem de manchas: {dtype}")
+    return {"min": int(info.min), "n_valores": n_valores, "n_zonas": n_zonas,
+            "valor_min": valor_min, "valor_max": valor_max, "nodata": nodata}
+
+def chaves_do_bloco(bloco, plano, zonas=None):
+    """
+    Codifica cada pixel do bloco na chave (zona, classe), ou -1 para pixels ignorados.
+    """
+    chaves = bloco.astype(np.int64) - plano["min"]
+    ignorar = np.zeros(bloco.shape, dtype=bool)
+    if plano["nodata"] is not None:
+        ignorar |= bloco == plano["nodata"]
+    if plano["valor_min"] is not None:
+        ignorar |= bloco < plano["valor_min"]
+    if plano["valor_max"] is not None:
+        ignorar |= bloco > plano["valor_max"]
+
+    if zonas is not None:
+        # Manchas não atravessam a divisa entre estados; pixels fora dos estados são ignorados
+        chaves += zonas.astype(np.int64) * plano["n_valores"]
+        ignorar |= zonas == 0
+
+    chaves[ignorar] = -1
+    return chaves
+
+def ligacoes_iguais(chaves_a, chaves_b, deslocamento_a, deslocamento_b, largura):
+    """
+    Retorna os pares de índices planos (i, j) de pixels vizinhos com a mesma chave válida.
+
+    `chaves_a` e `chaves_b` são recortes alinhados de duas regiões; os índices são
+    recalculados na grade de largura `largura` somando os deslocamentos de cada recorte.
+    """
+    iguais = (chaves_a == chaves_b) & (chaves_a >= 0)
+    linhas, colunas = np.nonzero(iguais)
+    base = linhas.astype(np.int64) * largura + colunas
+    return base + deslocamento_a, base + deslocamento_b
+
+def rotular_faixa(chaves, conectividade=4):
+    """
+    Rotula os componentes conectados de uma faixa, ligando vizinhos com a mesma chave.
+
+    Retorna uma tupla (rotulos, n): `rotulos` tem a forma de `chaves` com ids de 0 a n - 1.
+    Pixels ignorados (chave -1) ficam cada um em um componente isolado.
+    """
+    altura, largura = chaves.shape
+    pares = [
+        # Vizinho à direita e vizinho abaixo
+        ligacoes_iguais(chaves[:, :-1], chaves[:, 1:], 0, 1, largura),
+        ligacoes_iguais(chaves[:-1, :], chaves[1:, :], 0, largura, largura),
+    ]
+    if conectividade == 8:
+        # Diagonais: abaixo à direita e abaixo à esquerda
+        pares.append(ligacoes_iguais(chaves[:-1, :-1], chaves[1:, 1:], 0, largura + 1, largura))
+        pares.append(ligacoes_iguais(chaves[:-1, 1:], chaves[1:, :-1], 1, largura, largura))
+
+    origem = np.concatenate([i for i, _ in pares])
+    destino = np.concatenate([j for _, j in pares])
+    n_pixels = altura * largura
+    grafo = coo_matrix((np.ones(origem.size, dtype=np.int8), (origem, destino)), shape=(n_pixels, n_pixels))
+    n, rotulos = connected_components(grafo, directed=False)
+    return rotulos.reshape(altura, largura), n
+
+def ligacoes_entre_linhas(chaves_acima, chaves_abaixo, conectividade=4):
+    """
+    Retorna os pares de colunas (coluna_acima, coluna_abaixo) ligadas entre duas linhas consecutivas.
+    """
+    deslocamentos = [(0, 0)]
+    if conectividade == 8:
+        deslocamentos += [(0, 1), (1, 0)]
+
+    acima, abaixo = [], []
+    largura = chaves_acima.size
+    for desloc_acima, desloc_abaixo in deslocamentos:
+        trecho_acima = chaves_acima[desloc_acima:largura - desloc_abaixo]
+        trecho_abaixo = chaves_abaixo[desloc_abaixo:largura - desloc_acima]
+        colunas = np.flatnonzero((trecho_acima == trecho_abaixo) & (trecho_acima >= 0))
+        acima.append(colunas + desloc_acima)
+        abaixo.append(colunas + desloc_abaixo)
+    return np.concatenate(acima), np.concatenate(abaixo)
+
+def rotular_janela(bloco, plano, conectividade=4, pesos_linhas=None, zonas=None):
+    """
+    Rotula uma faixa e resume os seus componentes.
+
+    Retorna um dicionário com, para cada componente, a chave, o número de pixels e o
+    peso (soma dos pesos das linhas, ou o número de pixels), além das chaves e rótulos
+    da primeira e da última linha, usados para unir a faixa às vizinhas.
+    """
+    chaves = chaves_do_bloco(bloco, plano, zonas)
+    rotulos, n = rotular_faixa(chaves, conectividade)
+
+    planos_rotulos = rotulos.ravel()
+    pixels = np.bincount(planos_rotulos, minlength=n)
+    if pesos_linhas is None:
+        pesos = pixels.astype(np.float64)
+    else:
+        pesos = np.bincount(planos_rotulos, weights=np.repeat(pesos_linhas.astype(np.float64), chaves.shape[1]),
+                            minlength=n)
+
+    chave_componente = np.empty(n, dtype=np.int64)
+    chave_componente[planos_rotulos] = chaves.ravel()
+
+    return {
+        "chaves": chave_componente,
+        "pixels": pixels,
+        "pesos": pesos,
+        "primeira_chaves": chaves[0].copy(),
+        "primeira_rotulos": rotulos[0].copy(),
+        "ultima_chaves": chaves[-1].copy(),
+        "ultima_rotulos": rotulos[-1].copy(),
+    }
+
+def _rotular_faixa_processo(raster_path, janela, plano, conectividade, pesos_linhas, zonas_path=None):
+    """
+    Rotula uma faixa em um processo separado. A janela chega como tupla (col_off, row_off, largura, altura).
+    """
+    janela = Window(*janela)
+    with rasterio.open(raster_path) as src:
+        bloco = src.read(1, window=janela)
+    zonas = None
+    if zonas_path:
+        with rasterio.open(zonas_path) as zonas_src:
+            zonas = zonas_src.read(1, window=janela)
+    return rotular_janela(bloco, plano, conectividade, motor_area.pesos_da_janela(pesos_linhas, janela), zonas)
+
+def costurar_faixa(ativas, faixa, conectividade=4):
+    """
+    Une os componentes de uma faixa às manchas ainda abertas da faixa anterior.
+
+    Parâmetros:
+    - ativas: Manchas que tocam a última linha lida (dicionário com chaves, pixels, pesos,
+      chaves e ids da última linha), ou None na primeira faixa.
+    - faixa: Resumo retornado por `rotular_janela`.
+
+    Retorna uma tupla (fechadas, ativas): `fechadas` tem as chaves, pixels e pesos das manchas
+    que não continuam na próxima faixa; `ativas` é o novo estado aberto.
+    """
+    n_local = faixa["chaves"].size
+    if ativas is None:
+        n_ativas = 0
+        origem = destino = np.empty(0, dtype=np.int64)
+    else:
+        n_ativas = ativas["chaves"].size
+        colunas_acima, colunas_abaixo = ligacoes_entre_linhas(ativas["ultima_chaves"], faixa["primeira_chaves"],
+                                                              conectividade)
+        origem = ativas["ultima_ids"][colunas_acima]
+        destino = faixa["primeira_rotulos"][colunas_abaixo] + n_ativas
+
+    # Grafo pequeno: manchas abertas + componentes da faixa, ligados pela borda entre as faixas
+    n_nos = n_ativas + n_local
+    grafo = coo_matrix((np.ones(origem.size, dtype=np.int8), (origem, destino)), shape=(n_nos, n_nos))
+    n_grupos, grupo = connected_components(grafo, directed=False)
+
+    def juntar(campo):
+        return faixa[campo] if ativas is None else np.concatenate([ativas[campo], faixa[campo]])
+
+    chaves = np.empty(n_grupos, dtype=np.int64)
+    chaves[grupo] = juntar("chaves")
+    pixels = np.bincount(grupo, weights=juntar("pixels"), minlength=n_grupos).astype(np.int64)
+    pesos = np.bincount(grupo, weights=juntar("pesos"), minlength=n_grupos)
+
+    # Grupos presentes na última linha continuam abertos
+    grupo_ultima_linha = grupo[faixa["ultima_rotulos"] + n_ativas]
+    abertos = np.zeros(n_grupos, dtype=bool)
+    abertos[grupo_ultima_linha] = True
+    validos = chaves >= 0
+
+    fechados = ~abertos & validos
+    fechadas = {"chaves": chaves[fechados], "pixels": pixels[fechados], "pesos": pesos[fechados]}
+
+    novo_id = np.cumsum(abertos) - 1
+    novas_ativas = {
+        "chaves": chaves[abertos],
+        "pixels": pixels[abertos],
+        "pesos": pesos[abertos],
+        "ultima_chaves": faixa["ultima_chaves"],
+        "ultima_ids": novo_id[grupo_ultima_linha],
+    }
+    return fechadas, novas_ativas
+
+def fechar_ativas(ativas):
+    """
+    Emite todas as manchas abertas ao final do raster.
+    """
+    validos = ativas["chaves"] >= 0
+    return {"chaves": ativas["chaves"][validos], "pixels": ativas["pixels"][validos],
+            "pesos": ativas["pesos"][validos]}
+
+def rotular_manchas(src, zonas_src=None, n_zonas=0, conectividade=4, valor_min=None, valor_max=None,
+                    incluir_nodata=False, orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO, workers=1,
+                    pesos_linhas=None):
+    """
+    Percorre o raster em faixas e gera as manchas conforme elas são fechadas.
+
+    Parâmetros:
+    - src: Dataset aberto com `rasterio.open`.
+    - zonas_src: Dataset com o id da zona de cada pixel (opcional).
+    - n_zonas: Maior id de zona.
+    - conectividade: 4 (vizinhos laterais) ou 8 (inclui as diagonais).
+    - valor_min, valor_max: Intervalo de classes rotuladas (opcional).
+    - incluir_nodata: Se True, o valor de nodata também forma manchas.
+    - orcamento_memoria: Memória máxima (em bytes) usada por faixa.
+    - workers: Número de processos que rotulam as faixas em paralelo (a costura é sequencial).
+    - pesos_linhas: Peso inteiro de cada linha (ver `motor_area.definir_area_pixel`), opcional.
+
+    Gera tuplas (plano, fechadas), em que `fechadas` tem as chaves, pixels e pesos das manchas.
+    """
+    if conectividade not in (4, 8):
+        raise ValueError(f"Conectividade inválida: {conectividade} (use 4 ou 8)")
+    if zonas_src is None:
+        n_zonas = 0
+
+    nodata = None if incluir_nodata else src.nodata
+    plano = planejar_chaves(src.dtypes[0], n_zonas, valor_min, valor_max, nodata)
+    bytes_pixel = np.dtype(src.dtypes[0]).itemsize + _BYTES_ROTULAGEM_POR_PIXEL
+
+    if workers > 1:
+        janelas = [(int(j.col_off), int(j.row_off), int(j.width), int(j.height))
+                   for j in motor_area.iterar_faixas(src, orcamento_memoria // workers, bytes_pixel)]
+        n = len(janelas)
+        zonas_path = zonas_src.name if zonas_src is not None else None
+        contexto = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=contexto)
+        faixas = executor.map(_rotular_faixa_processo, [src.name] * n, janelas, [plano] * n,
+                              [conectividade] * n, [pesos_linhas] * n, [zonas_path] * n)
+    else:
+        executor = None
+        faixas = (rotular_janela(src.read(1, window=janela), plano, conectividade,
+                                 motor_area.pesos_da_janela(pesos_linhas, janela),
+                                 zonas_src.read(1, window=janela) if zonas_src is not None else None)
+                  for janela in motor_area.iterar_faixas(src, orcamento_memoria, bytes_pixel))
+
+    try:
+        ativas = None
+        for faixa in faixas:
+            fechadas, ativas = costurar_faixa(ativas, faixa, conectividade)
+            yield plano, fechadas
+        if ativas is not None:
+            yield plano, fechar_ativas(ativas)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+def decodificar_chaves(chaves, plano):
+    """
+    Converte as chaves de volta em (zona, classe).
+    """
+    return chaves // plano["n_valores"], chaves % plano["n_valores"] + plano["min"]
+
+def resumir_manchas(resumo, zonas, classes, areas_ha, limites_ha):
+    """
+    Soma as manchas fechadas de uma faixa ao resumo {(zona, classe): estatísticas}.
+    """
+    if areas_ha.size == 0:
+        return resumo
+
+    ordem = np.lexsort((classes, zonas))
+    zonas, classes, areas_ha = zonas[ordem], classes[ordem], areas_ha[ordem]
+    inicio_grupo = np.flatnonzero(np.r_[True, (zonas[1:] != zonas[:-1]) | (classes[1:] != classes[:-1])])
+
+    n_manchas = np.diff(np.r_[inicio_grupo, areas_ha.size])
+    soma = np.add.reduceat(areas_ha, inicio_grupo)
+    maior = np.maximum.reduceat(areas_ha, inicio_grupo)
+    faixa_tamanho = np.searchsorted(np.asarray(limites_ha, dtype=np.float64), areas_ha, side="right")
+
+    for k, inicio in enumerate(inicio_grupo):
+        chave = (int(zonas[inicio]), classes[inicio].item())
+        distribuicao = np.bincount(faixa_tamanho[inicio:inicio + n_manchas[k]], minlength=len(limites_ha) + 1)
+        atual = resumo.get(chave)
+        if atual is None:
+            resumo[chave] = {"n": int(n_manchas[k]), "area_ha": float(soma[k]), "maior_ha": float(maior[k]),
+                             "distribuicao": distribuicao}
+        else:
+            atual["n"] += int(n_manchas[k])
+            atual["area_ha"] += float(soma[k])
+            atual["maior_ha"] = max(atual["maior_ha"], float(maior[k]))
+            atual["distribuicao"] = atual["distribuicao"] + distribuicao
+    return resumo
+
+def nomes_classes_tamanho(limites_ha):
+    """
+    Nomes das colunas da distribuição de tamanhos (ex.: Manchas_ate_1ha, Manchas_1_10ha, ...).
+    """
+    nomes = [f"Manchas_ate_{limites_ha[0]:g}ha"]
+    nomes += [f"Manchas_{a:g}_{b:g}ha" for a, b in zip(limites_ha[:-1], limites_ha[1:])]
+    nomes.append(f"Manchas_acima_{limites_ha[-1]:g}ha")
+    return nomes
+
+def calcular_manchas_conectadas(raster_path, pixel_area=None, zonas_path=None, campo=indice_zonas.CAMPO_ZONA_PADRAO,
+                                diretorio_cache=None, conectividade=4, valor_min=None, valor_max=None,
+                                incluir_nodata=False, limites_ha=CLASSES_TAMANHO_PADRAO, manchas_csv=None,
+                                orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO, workers=1):
+    """
+    Calcula as estatísticas das manchas de cada classe (e de cada estado, com `zonas_path`).
+
+    Parâmetros:
+    - raster_path: Caminho para o raster (ou mosaico).
+    - pixel_area: Área de cada pixel (opcional; ver `motor_area.calcular_area_manchas`).
+    - zonas_path, campo, diretorio_cache: Shapefile dos estados e cache do índice (opcional).
+    - conectividade: 4 ou 8.
+    - valor_min, valor_max: Intervalo de classes (opcional).
+    - incluir_nodata: Se True, o nodata também forma manchas.
+    - limites_ha: Limites das classes de tamanho do resumo, em hectares.
+    - manchas_csv: Se informado, salva neste arquivo (CSV, Parquet ou SQLite) uma linha por mancha,
+      gravada conforme as faixas são fechadas.
+    - orcamento_memoria, workers: Ver `motor_area`.
+
+    Retorna um dicionário com as colunas do resumo por (estado,) classe.
+    """
+    limites_ha = sorted(limites_ha)
+    resumo = {}
+
+    with contextlib.ExitStack() as pilha, rasterio.open(raster_path) as src:
+        escrever_manchas = pilha.enter_context(saida_area.abrir_saida(manchas_csv)) if manchas_csv else None
+        pesos_linhas, unidade = motor_area.definir_area_pixel(src, pixel_area)
+
+        zonas_src = None
+        nomes_zonas = []
+        if zonas_path:
+            indice_path, nomes_zonas = indice_zonas.obter_indice_zonas(src, zonas_path, campo, diretorio_cache,
+                                                                       orcamento_memoria)
+            zonas_src = rasterio.open(indice_path)
+
+        try:
+            for plano, fechadas in rotular_manchas(src, zonas_src, len(nomes_zonas), conectividade, valor_min,
+                                                   valor_max, incluir_nodata, orcamento_memoria, workers,
+                                                   pesos_linhas):
+                zonas, classes = decodificar_chaves(fechadas["chaves"], plano)
+                classes = classes.astype(src.dtypes[0])
+                areas_m2 = fechadas["pesos"] * unidade
+                resumo = resumir_manchas(resumo, zonas, classes, areas_m2 / 10000, limites_ha)
+
+                if escrever_manchas is not None:
+                    manchas = {"Mancha": classes, "Pixels": fechadas["pixels"], "Area_m2": areas_m2,
+                               "Area_ha": areas_m2 / 10000}
+                    if zonas_path:
+                        manchas = {"Estado": np.asarray(nomes_zonas, dtype=object)[zonas - 1], **manchas}
+                    escrever_manchas(manchas)
+        finally:
+            if zonas_src is not None:
+                zonas_src.close()
+
+    colunas_distribuicao = nomes_classes_tamanho(limites_ha)
+    tabela = {"Estado": [], "Mancha": [], "N_manchas": [], "Area_ha": [], "Maior_mancha_ha": [],
+              "Media_mancha_ha": []}
+    tabela.update({coluna: [] for coluna in colunas_distribuicao})
+    for (zona, classe), estatisticas in sorted(resumo.items()):
+        tabela["Estado"].append(nomes_zonas[zona - 1] if zonas_path else None)
+        tabela["Mancha"].append(classe)
+        tabela["N_manchas"].append(estatisticas["n"])
+        tabela["Area_ha"].append(estatisticas["area_ha"])
+        tabela["Maior_mancha_ha"].append(estatisticas["maior_ha"])
+        tabela["Media_mancha_ha"].append(estatisticas["area_ha"] / estatisticas["n"])
+        for coluna, quantidade in zip(colunas_distribuicao, estatisticas["distribuicao"]):
+            tabela[coluna].append(int(quantidade))
+
+    if not zonas_path:
+        del tabela["Estado"]
+    return tabela
+
+def salvar_resumo_em_csv(resumo, output_csv, **opcoes_saida):
+    """
+    Salva o resumo das manchas em um arquivo CSV (ou Parquet/SQLite, conforme a extensão).
+    """
+    with saida_area.abrir_saida(output_csv, **opcoes_saida) as escrever:
+        escrever(resumo)
+
+def main():
+    # Configurar os argumentos da linha de comando
+    parser = argparse.ArgumentParser(description="Calcular o número, a maior mancha e a distribuição de tamanhos das manchas (componentes conectados) de cada classe e salvar em CSV.")
+    parser.add_argument('raster_path', type=str, help="Caminho para o raster (ou mosaico, com --estados).")
+    parser.add_argument('output_csv', type=str, help="Caminho do arquivo CSV de resumo.")
+    parser.add_argument('--resolucao', type=float, default=None, help="Resolução do pixel em metros (opcional).")
+    parser.add_argument('--valor-min', type=float, default=None, help="Valor mínimo das classes rotuladas.")
+    parser.add_argument('--valor-max', type=float, default=None, help="Valor máximo das classes rotuladas.")
+    parser.add_argument('--conectividade', type=int, choices=(4, 8), default=4,
+                        help="Vizinhança usada para ligar os pixels (padrão: 4).")
+    parser.add_argument('--incluir-nodata', action='store_true', help="Rotula também as manchas de nodata.")
+    parser.add_argument('--classes-tamanho', type=float, nargs='+', default=list(CLASSES_TAMANHO_PADRAO),
+                        help="Limites, em hectares, das classes de tamanho do resumo (padrão: 1 10 100 1000).")
+    parser.add_argument('--manchas-csv', type=str, default=None,
+                        help="Salva também um arquivo (CSV, Parquet ou SQLite) com uma linha por mancha.")
+    motor_area.adicionar_argumentos_motor(parser)
+    indice_zonas.adicionar_argumentos_zonais(parser)
+    saida_area.adicionar_argumentos_saida(parser)
+    args = parser.parse_args()
+
+    verificar_entrada_existente(args.raster_path)
+    if args.estados:
+        verificar_entrada_existente(args.estados)
+
+    # Calcular a área de cada pixel, se a resolução foi informada
+    pixel_area = args.resolucao * args.resolucao if args.resolucao else None
+
+    tabela = calcular_manchas_conectadas(args.raster_path, pixel_area, args.estados, args.campo, args.cache_zonas,
+                                         args.conectividade, args.valor_min, args.valor_max, args.incluir_nodata,
+                                         args.classes_tamanho, args.manchas_csv, **motor_area.opcoes_motor(args))
+
+    # Salvar o resumo em um arquivo CSV
+    salvar_resumo_em_csv(tabela, args.output_csv, **saida_area.opcoes_saida(args))
+
+if __name__ == "__main__":
+    main()
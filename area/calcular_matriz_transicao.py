@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Matriz de transição entre classes de dois ou mais rasters co-registrados (ex.: 2020 e 2023).
+
+Os rasters são percorridos juntos, janela a janela, e cada par de anos consecutivos
+é codificado em um único inteiro (classe_origem × classe_destino). A matriz sai de
+um histograma desses códigos, calculado pelo motor de área em uma única passada,
+independentemente do número de classes. Com --estados, a matriz é calculada por estado.
+"""
+
+import os
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.windows import Window
+
+import indice_zonas
+import motor_area
+import saida_area
+
+def verificar_entrada_existente(caminho):
+    """
+    Verifica se o arquivo ou diretório existe.
+    """
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f"Arquivo ou diretório não encontrado: {caminho}")
+
+def verificar_alinhamento(fontes):
+    """
+    Verifica se os rasters estão na mesma grade (CRS, transformação e dimensões).
+    """
+    referencia = fontes[0]
+    for src in fontes[1:]:
+        if (src.crs != referencia.crs or src.transform != referencia.transform or
+                src.width != referencia.width or src.height != referencia.height):
+            raise ValueError(f"Os rasters não estão co-registrados: {referencia.name} e {src.name}")
+
+def intervalo_classes(dtype):
+    """
+    Retorna (menor valor, número de valores possíveis) de um tipo inteiro.
+    """
+    dtype = np.dtype(dtype)
+    if not np.issubdtype(dtype, np.integer):
+        raise ValueError(f"A matriz de transição exige rasters de classes inteiras (tipo encontrado: {dtype})")
+    info = np.iinfo(dtype)
+    return int(info.min), int(info.max) - int(info.min) + 1
+
+def planejar_transicoes(dtypes):
+    """
+    Monta o plano de contagem de cada par de rasters consecutivos.
+
+    O par (origem, destino) vira o código (origem - min_origem) * n_destino + (destino - min_destino),
+    cujo histograma é a matriz de transição achatada. Para tipos pequenos (ex.: uint8), o
+    código cabe em `motor_area.LIMITE_BINCOUNT` e a contagem é um bincount.
+    """
+    pares = []
+    for dtype_origem, dtype_destino in zip(dtypes[:-1], dtypes[1:]):
+        min_origem, n_origem = intervalo_classes(dtype_origem)
+        min_destino, n_destino = intervalo_classes(dtype_destino)
+        if n_origem * n_destino > np.iinfo(np.int64).max:
+            raise ValueError(f"Tipos muito largos para a matriz de transição: {dtype_origem} e {dtype_destino}")
+
+        plano = motor_area.planejar_contagem(np.int64, 0, n_origem * n_destino - 1)
+        if plano["modo"] == "bincount":
+            # Os códigos sempre caem no intervalo; não é preciso mascarar os blocos
+            plano["mascarar"] = False
+        pares.append({"min_origem": min_origem, "min_destino": min_destino, "n_destino": n_destino, "plano": plano})
+    return pares
+
+def codificar_par(origem, destino, par):
+    """
+    Codifica os pixels de dois blocos alinhados no código do par (origem, destino).
+    """
+    return ((origem.astype(np.int64) - par["min_origem"]) * par["n_destino"] +
+            (destino.astype(np.int64) - par["min_destino"]))
+
+def acumular_janela(acumuladores, blocos, pares, pesos_linhas=None, zonas=None):
+    """
+    Soma aos acumuladores de cada par as transições dos blocos de uma janela.
+    """
+    for i, par in enumerate(pares):
+        codigos = codificar_par(blocos[i], blocos[i + 1], par)
+        acumuladores[i] = motor_area.acumular_bloco(acumuladores[i], codigos, par["plano"], pesos_linhas, zonas)
+    return acumuladores
+
+def _contar_faixa(raster_paths, janelas, pares, pesos_linhas, zonas_path=None, n_zonas=0):
+    """
+    Conta as transições de uma faixa de janelas em um processo separado.
+    """
+    acumuladores = [motor_area.novo_acumulador(par["plano"], n_zonas) for par in pares]
+    fontes = [rasterio.open(caminho) for caminho in raster_paths]
+    zonas_src = rasterio.open(zonas_path) if zonas_path else None
+    try:
+        for col_off, row_off, largura, altura in janelas:
+            janela = Window(col_off, row_off, largura, altura)
+            zonas = zonas_src.read(1, window=janela) if zonas_src is not None else None
+            blocos = [src.read(1, window=janela) for src in fontes]
+            acumuladores = acumular_janela(acumuladores, blocos, pares,
+                                           motor_area.pesos_da_janela(pesos_linhas, janela), zonas)
+    finally:
+        for src in fontes:
+            src.close()
+        if zonas_src is not None:
+            zonas_src.close()
+    return acumuladores
+
+def contar_transicoes(fontes, zonas_src=None, n_zonas=0, orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO,
+                      workers=1, pesos_linhas=None):
+    """
+    Conta as transições entre cada par de rasters consecutivos, em uma única passada.
+
+    Parâmetros:
+    - fontes: Datasets co-registrados, em ordem cronológica.
+    - zonas_src: Dataset com o id da zona de cada pixel (opcional).
+    - n_zonas: Maior id de zona.
+    - orcamento_memoria: Memória máxima (em bytes) usada por janela, somando todos os rasters.
+    - workers: Número de processos.
+    - pesos_linhas: Peso inteiro de cada linha (ver `motor_area.definir_area_pixel`), opcional.
+
+    Retorna uma lista, com um item por par, de listas indexadas pelo id da zona de tuplas
+    (classes_origem, classes_destino, contagens).
+    """
+    pares = planejar_transicoes([src.dtypes[0] for src in fontes])
+    if zonas_src is None:
+        n_zonas = 0
+
+    # Cada janela é lida de todos os rasters ao mesmo tempo
+    orcamento_janela = orcamento_memoria // len(fontes)
+
+    if workers > 1:
+        janelas = [(int(j.col_off), int(j.row_off), int(j.width), int(j.height))
+                   for j in motor_area.iterar_janelas(fontes[0], orcamento_janela // workers)]
+        faixas = motor_area.dividir_em_faixas(janelas, workers * motor_area._FAIXAS_POR_PROCESSO)
+        n = len(faixas)
+        raster_paths = [src.name for src in fontes]
+        zonas_path = zonas_src.name if zonas_src is not None else None
+
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexto) as executor:
+            parciais = list(executor.map(_contar_faixa, [raster_paths] * n, faixas, [pares] * n,
+                                         [pesos_linhas] * n, [zonas_path] * n, [n_zonas] * n))
+        acumuladores = [motor_area.combinar_acumuladores([parcial[i] for parcial in parciais], par["plano"], n_zonas)
+                        for i, par in enumerate(pares)]
+    else:
+        acumuladores = [motor_area.novo_acumulador(par["plano"], n_zonas) for par in pares]
+        for janela in motor_area.iterar_janelas(fontes[0], orcamento_janela):
+            zonas = zonas_src.read(1, window=janela) if zonas_src is not None else None
+            blocos = [src.read(1, window=janela) for src in fontes]
+            acumuladores = acumular_janela(acumuladores, blocos, pares,
+                                           motor_area.pesos_da_janela(pesos_linhas, janela), zonas)
+
+    transicoes = []
+    for par, acumulador in zip(pares, acumuladores):
+        por_zona = []
+        for zona in range(n_zonas + 1):
+            codigos, contagens = motor_area.finalizar_contagem(acumulador, par["plano"], zona)
+            origem = codigos // par["n_destino"] + par["min_origem"]
+            destino = codigos % par["n_destino"] + par["min_destino"]
+            por_zona.append((origem, destino, contagens))
+        transicoes.append(por_zona)
+    return transicoes
+
+def calcular_matriz_transicao(raster_paths, pixel_area=None, zonas_path=None, campo=indice_zonas.CAMPO_ZONA_PADRAO,
+                              diretorio_cache=None, orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO, workers=1):
+    """
+    Calcula a área de cada transição de classe entre rasters consecutivos.
+
+    Parâmetros:
+    - raster_paths: Caminhos dos rasters co-registrados, em ordem cronológica.
+    - pixel_area: Área de cada pixel (opcional; ver `motor_area.calcular_area_manchas`).
+    - zonas_path: Shapefile dos estados, para calcular a matriz por estado (opcional).
+    - campo: Atributo com o nome de cada estado.
+    - diretorio_cache: Diretório do cache de índices de zonas (opcional).
+    - orcamento_memoria: Memória máxima (em bytes) usada por janela.
+    - workers: Número de processos.
+
+    Retorna um dicionário com as colunas Estado, Raster_origem, Raster_destino, Classe_origem,
+    Classe_destino, Area_m2 e Area_ha (Estado só aparece com `zonas_path`).
+    """
+    if len(raster_paths) < 2:
+        raise ValueError("A matriz de transição exige pelo menos dois rasters.")
+
+    nomes_rasters = [os.path.splitext(os.path.basename(caminho))[0] for caminho in raster_paths]
+    fontes = [rasterio.open(caminho) for caminho in raster_paths]
+    try:
+        verificar_alinhamento(fontes)
+        pesos_linhas, unidade = motor_area.definir_area_pixel(fontes[0], pixel_area)
+
+        if zonas_path:
+            indice_path, nomes_zonas = indice_zonas.obter_indice_zonas(fontes[0], zonas_path, campo,
+                                                                       diretorio_cache, orcamento_memoria)
+            with rasterio.open(indice_path) as zonas_src:
+                transicoes = contar_transicoes(fontes, zonas_src, len(nomes_zonas), orcamento_memoria,
+                                               workers, pesos_linhas)
+        else:
+            nomes_zonas = []
+            transicoes = contar_transicoes(fontes, None, 0, orcamento_memoria, workers, pesos_linhas)
+    finally:
+        for src in fontes:
+            src.close()
+
+    # Sem estados, a zona 0 é o raster inteiro; com estados, a zona 0 (fora dos estados) é ignorada
+    zonas = [(None, 0)] if not zonas_path else [(nome, i + 1) for i, nome in enumerate(nomes_zonas)]
+
+    matriz = {"Estado": [], "Raster_origem": [], "Raster_destino": [], "Classe_origem": [],
+              "Classe_destino": [], "Area_m2": [], "Area_ha": []}
+    for i, por_zona in enumerate(transicoes):
+        for nome_zona, zona in zonas:
+            origem, destino, contagens = por_zona[zona]
+            areas_m2 = contagens * unidade
+            matriz["Estado"].extend([nome_zona] * len(contagens))
+            matriz["Raster_origem"].extend([nomes_rasters[i]] * len(contagens))
+            matriz["Raster_destino"].extend([nomes_rasters[i + 1]] * len(contagens))
+            matriz["Classe_origem"].extend(origem.tolist())
+            matriz["Classe_destino"].extend(destino.tolist())
+            matriz["Area_m2"].extend(areas_m2.tolist())
+            matriz["Area_ha"].extend((areas_m2 / 10000).tolist())
+
+    if not zonas_path:
+        del matriz["Estado"]
+    return matriz
+
+def salvar_matriz_em_csv(matriz, output_csv, formato_largo=False, **opcoes_saida):
+    """
+    Salva a matriz de transição em um arquivo CSV (ou Parquet/SQLite, conforme a extensão).
+
+    Parâmetros:
+    - matriz: Dicionário retornado por `calcular_matriz_transicao`.
+    - output_csv: Caminho do arquivo CSV de saída.
+    - formato_largo: Se True, salva uma linha por classe de origem e uma coluna (em hectares)
+      por classe de destino, em vez de uma linha por transição.
+    - opcoes_saida: Opções da saída (formato, anexar, tabela).
+    """
+    if formato_largo:
+        df = pd.DataFrame(matriz)
+        indice = [coluna for coluna in ("Estado", "Raster_origem", "Raster_destino", "Classe_origem") if coluna in df]
+        df = df.pivot_table(index=indice, columns="Classe_destino", values="Area_ha", aggfunc="sum", fill_value=0.0)
+        df.columns = [f"Para_{classe}" for classe in df.columns]
+        df = df.reset_index()
+        matriz = {coluna: df[coluna].to_numpy() for coluna in df.columns}
+
+    with saida_area.abrir_saida(output_csv, **opcoes_saida) as escrever:
+        escrever(matriz)
+
+def main():
+    # Configurar os argumentos da linha de comando
+    parser = argparse.ArgumentParser(description="Calcular a matriz de transição de classes entre rasters co-registrados (ex.: anos consecutivos) e salvar em CSV.")
+    parser.add_argument('rasters', type=str, nargs='+', help="Rasters co-registrados, em ordem cronológica (pelo menos dois).")
+    parser.add_argument('output_csv', type=str, help="Caminho do arquivo CSV de saída.")
+    parser.add_argument('--resolucao', type=float, default=None, help="Resolução do pixel em metros (opcional).")
+    parser.add_argument('--largo', action='store_true',
+                        help="Salva a matriz em formato largo (uma coluna, em hectares, por classe de destino).")
+    motor_area.adicionar_argumentos_motor(parser)
+    indice_zonas.adicionar_argumentos_zonais(parser)
+    saida_area.adicionar_argumentos_saida(parser)
+    args = parser.parse_args()
+
+    if len(args.rasters) < 2:
+        parser.error("informe pelo menos dois rasters")
+
+    for raster_path in args.rasters:
+        verificar_entrada_existente(raster_path)
+    if args.estados:
+        verificar_entrada_existente(args.estados)
+
+    # Calcular a área de cada pixel, se a resolução foi informada
+    pixel_area = args.resolucao * args.resolucao if args.resolucao else None
+
+    matriz = calcular_matriz_transicao(args.rasters, pixel_area, args.estados, args.campo, args.cache_zonas,
+                                       **motor_area.opcoes_motor(args))
+
+    # Salvar a matriz em um arquivo CSV
+    salvar_matriz_em_csv(matriz, args.output_csv, args.largo, **saida_area.opcoes_saida(args))
+
+if __name__ == "__main__":
+    main()
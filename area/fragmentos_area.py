@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Divisão de um cálculo de área em fragmentos independentes, para rodar em várias máquinas.
+
+O trabalho tem três etapas:
+
+1. `planejar`: percorre as janelas de leitura do raster (sem ler os pixels) e as divide,
+   de forma determinística, em N fragmentos contíguos de custo parecido (blocos esparsos
+   não contam). O plano é gravado em um manifesto JSON com os parâmetros da contagem.
+   Com `--workers W`, as janelas são planejadas com 1/W do orçamento de memória, para que
+   W processos de um fragmento caibam juntos no orçamento.
+2. `executar --fragmento i/N`: conta só as janelas do fragmento i (de 1 a N), com até W
+   processos, e grava um arquivo parcial pequeno com as contagens inteiras. Pode rodar em qualquer máquina que
+   tenha o raster montado, em qualquer ordem, inclusive vários ao mesmo tempo na mesma.
+3. `juntar`: soma os arquivos parciais e grava as áreas finais (CSV, Parquet ou SQLite).
+
+Como as contagens são inteiras, o resultado é idêntico ao de `calcular_area_total`.
+"""
+
+import os
+import json
+import hashlib
+import argparse
+
+import numpy as np
+import rasterio
+
+import motor_area
+import saida_area
+
+# Versão do formato do manifesto e dos arquivos parciais
+VERSAO_FRAGMENTOS = 1
+
+def verificar_entrada_existente(caminho):
+    """
+    Verifica se o arquivo ou diretório existe.
+    """
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f"Arquivo ou diretório não encontrado: {caminho}")
+
+def gravar_json(caminho, conteudo):
+    """
+    Grava um JSON de forma atômica (arquivo temporário + renomeação), para que um
+    fragmento interrompido não deixe um arquivo parcial corrompido.
+    """
+    temporario = caminho + f".{os.getpid()}.tmp"
+    with open(temporario, "w") as f:
+        json.dump(conteudo, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+def ler_json(caminho):
+    """
+    Lê um JSON gravado por `gravar_json`.
+    """
+    with open(caminho) as f:
+        return json.load(f)
+
+def ler_fragmento(texto):
+    """
+    Converte o texto "i/N" em uma tupla (i, N), com i de 1 a N.
+    """
+    try:
+        indice, total = (int(parte) for parte in texto.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Fragmento inválido (use i/N, ex.: 3/16): {texto}")
+    if not 1 <= indice <= total:
+        raise argparse.ArgumentTypeError(f"O fragmento deve estar entre 1/{total} e {total}/{total}: {texto}")
+    return indice, total
+
+def dividir_por_custo(custos, n_fragmentos):
+    """
+    Divide uma sequência de custos em `n_fragmentos` grupos contíguos de custo total parecido.
+
+    Retorna os índices de início de cada grupo e o fim do último (n_fragmentos + 1 posições).
+    Sempre há exatamente `n_fragmentos` grupos, alguns possivelmente vazios.
+    """
+    acumulado = np.concatenate([[0], np.cumsum(custos, dtype=np.float64)])
+    metas = np.linspace(0, acumulado[-1], n_fragmentos + 1)
+    cortes = np.searchsorted(acumulado, metas[1:-1], side="left")
+    return [0, *cortes.tolist(), len(custos)]
+
+def identificador_plano(manifesto):
+    """
+    Calcula um identificador do plano, gravado nos parciais para não misturar execuções.
+    """
+    conteudo = {chave: valor for chave, valor in manifesto.items() if chave != "id"}
+    return hashlib.sha256(json.dumps(conteudo, sort_keys=True).encode()).hexdigest()[:16]
+
+def planejar(raster_path, manifesto_path, n_fragmentos, pixel_area=None, valor_min=None, valor_max=None,
+             intervalos=None, orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO, workers=1):
+    """
+    Divide as janelas de leitura do raster em fragmentos e grava o manifesto.
+
+    Parâmetros:
+    - raster_path: Caminho do raster, como será visto pelas máquinas que executam os fragmentos.
+    - manifesto_path: Caminho do manifesto JSON.
+    - n_fragmentos: Número de fragmentos.
+    - pixel_area, valor_min, valor_max, intervalos: Ver `motor_area.calcular_area_manchas`.
+      No modo histograma, os limites são definidos aqui, uma vez só, para todos os fragmentos.
+    - orcamento_memoria: Memória máxima (em bytes) usada pelas janelas lidas ao mesmo tempo
+      em um fragmento.
+    - workers: Número máximo de processos por fragmento em `executar`; cada janela recebe
+      1/workers do orçamento, como em `motor_area._contar_em_paralelo`.
+
+    Retorna o manifesto.
+    """
+    with rasterio.open(raster_path) as src:
+        limites = None
+        if intervalos is not None:
+            limites = motor_area.limites_intervalos(src, intervalos, valor_min, valor_max,
+                                                    orcamento_memoria).tolist()
+        _, unidade = motor_area.definir_area_pixel(src, pixel_area)
+
+        # Blocos não gravados não são decodificados e quase não custam nada
+        janelas, custos = [], []
+        for janela in motor_area.iterar_janelas(src, orcamento_memoria // workers):
+            janelas.append((int(janela.col_off), int(janela.row_off), int(janela.width), int(janela.height)))
+            custos.append(0 if motor_area.bloco_esparso(src, janela) else int(janela.width) * int(janela.height))
+
+        manifesto = {
+            "versao": VERSAO_FRAGMENTOS,
+            "raster": raster_path,
+            "tamanho": os.path.getsize(raster_path),
+            "largura": src.width,
+            "altura": src.height,
+            "dtype": src.dtypes[0],
+            "parametros": {"pixel_area": pixel_area, "valor_min": valor_min, "valor_max": valor_max,
+                           "limites": limites},
+            "unidade": unidade,
+            "workers": workers,
+        }
+
+    cortes = dividir_por_custo(custos, n_fragmentos)
+    manifesto["fragmentos"] = [janelas[inicio:fim] for inicio, fim in zip(cortes[:-1], cortes[1:])]
+    manifesto["id"] = identificador_plano(manifesto)
+    gravar_json(manifesto_path, manifesto)
+
+    print(f"INFO: {len(janelas)} janelas de {raster_path} divididas em {n_fragmentos} fragmentos "
+          f"({sum(1 for custo in custos if custo == 0)} blocos esparsos).")
+    print(f"Manifesto salvo em: {manifesto_path}")
+    return manifesto
+
+def caminho_parcial(manifesto_path, indice, total, diretorio=None):
+    """
+    Retorna o caminho do arquivo parcial de um fragmento (padrão: ao lado do manifesto).
+    """
+    base = os.path.splitext(os.path.basename(manifesto_path))[0]
+    diretorio = diretorio or os.path.dirname(os.path.abspath(manifesto_path))
+    largura = len(str(total))
+    return os.path.join(diretorio, f"{base}.parcial-{indice:0{largura}d}-de-{total}.json")
+
+def plano_do_manifesto(manifesto, src):
+    """
+    Recria o plano de contagem a partir dos parâmetros gravados no manifesto.
+    """
+    parametros = manifesto["parametros"]
+    if parametros["limites"] is not None:
+        return motor_area.planejar_intervalos(parametros["limites"], src.nodata)
+    return motor_area.planejar_contagem(src.dtypes[0], parametros["valor_min"], parametros["valor_max"])
+
+def verificar_raster(manifesto, src, raster_path):
+    """
+    Confere se o raster visto por esta máquina é o mesmo do planejamento.
+    """
+    if (os.path.getsize(raster_path) != manifesto["tamanho"] or src.width != manifesto["largura"] or
+            src.height != manifesto["altura"] or src.dtypes[0] != manifesto["dtype"]):
+        raise ValueError(f"O raster {raster_path} não corresponde ao do manifesto ({manifesto['raster']}).")
+
+def executar(manifesto_path, indice, total, raster_path=None, diretorio_parciais=None, workers=None):
+    """
+    Conta os pixels das janelas de um fragmento e grava o arquivo parcial.
+
+    Parâmetros:
+    - manifesto_path: Caminho do manifesto gravado por `planejar`.
+    - indice, total: Fragmento a executar (de 1 a `total`) e número de fragmentos do plano.
+    - raster_path: Caminho do raster nesta máquina (padrão: o do manifesto).
+    - diretorio_parciais: Diretório dos arquivos parciais (padrão: o do manifesto).
+    - workers: Número de processos usados neste fragmento (padrão: o do plano). Não pode
+      passar do número com que o plano foi feito, ou o pico de memória passaria do orçamento.
+
+    Retorna o caminho do arquivo parcial.
+    """
+    manifesto = ler_json(manifesto_path)
+    if manifesto.get("versao") != VERSAO_FRAGMENTOS:
+        raise ValueError(f"Versão de manifesto não suportada: {manifesto_path}")
+    if total != len(manifesto["fragmentos"]):
+        raise ValueError(f"O manifesto tem {len(manifesto['fragmentos'])} fragmentos, não {total}.")
+    workers_plano = manifesto.get("workers", 1)
+    workers = workers or workers_plano
+    if workers > workers_plano:
+        raise ValueError(f"O plano foi feito para até {workers_plano} processo(s) por fragmento, não {workers}; "
+                         f"planeje de novo com --workers {workers}.")
+
+    raster_path = raster_path or manifesto["raster"]
+    verificar_entrada_existente(raster_path)
+    janelas = [tuple(janela) for janela in manifesto["fragmentos"][indice - 1]]
+
+    with rasterio.open(raster_path) as src:
+        verificar_raster(manifesto, src, raster_path)
+        plano = plano_do_manifesto(manifesto, src)
+        pesos_linhas, _ = motor_area.definir_area_pixel(src, manifesto["parametros"]["pixel_area"], informar=False)
+
+    acumulador, pulados = motor_area.contar_janelas(raster_path, janelas, plano, pesos_linhas, workers)
+    valores, contagens = motor_area.finalizar_contagem(acumulador, plano)
+
+    parcial_path = caminho_parcial(manifesto_path, indice, total, diretorio_parciais)
+    gravar_json(parcial_path, {
+        "versao": VERSAO_FRAGMENTOS,
+        "id": manifesto["id"],
+        "fragmento": indice,
+        "valores": valores.tolist(),
+        "contagens": contagens.tolist(),
+    })
+    print(f"INFO: Fragmento {indice}/{total}: {len(janelas)} janelas, {pulados} puladas sem decodificar.")
+    print(f"Parcial salvo em: {parcial_path}")
+    return parcial_path
+
+def juntar(manifesto_path, output_path, diretorio_parciais=None, **opcoes_saida):
+    """
+    Soma os arquivos parciais de todos os fragmentos e grava as áreas finais.
+
+    Parâmetros:
+    - manifesto_path: Caminho do manifesto gravado por `planejar`.
+    - output_path: Caminho da saída (CSV, Parquet ou SQLite).
+    - diretorio_parciais: Diretório dos arquivos parciais (padrão: o do manifesto).
+    - opcoes_saida: Opções da saída (formato, anexar, tabela).
+
+    Retorna o dicionário {valor: (area_m2, area_ha)}.
+    """
+    manifesto = ler_json(manifesto_path)
+    total = len(manifesto["fragmentos"])
+    parciais = [caminho_parcial(manifesto_path, indice, total, diretorio_parciais) for indice in range(1, total + 1)]
+
+    faltando = [indice for indice, caminho in enumerate(parciais, start=1) if not os.path.exists(caminho)]
+    if faltando:
+        raise FileNotFoundError(f"Faltam {len(faltando)} de {total} fragmentos: "
+                                f"{', '.join(f'{indice}/{total}' for indice in faltando)}")
+
+    somas = {}
+    for caminho in parciais:
+        parcial = ler_json(caminho)
+        if parcial.get("id") != manifesto["id"]:
+            raise ValueError(f"O parcial {caminho} é de outro plano; execute o fragmento de novo.")
+        for valor, contagem in zip(parcial["valores"], parcial["contagens"]):
+            somas[valor] = somas.get(valor, 0) + contagem
+
+    # Mesma ordem da contagem direta: valores crescentes, ou a ordem dos intervalos
+    limites = manifesto["parametros"]["limites"]
+    if limites is not None:
+        ordem = {rotulo: i for i, rotulo in enumerate(motor_area.planejar_intervalos(limites)["rotulos"])}
+        valores = np.array(sorted(somas, key=ordem.__getitem__))
+    else:
+        valores = np.array(sorted(somas), dtype=manifesto["dtype"])
+    contagens = np.array([somas[valor] for valor in valores.tolist()], dtype=np.int64)
+    areas_manchas = motor_area.areas_de_contagens(valores, contagens, manifesto["unidade"])
+
+    with saida_area.abrir_saida(output_path, **opcoes_saida) as escrever:
+        escrever(saida_area.colunas_areas(areas_manchas))
+    print(f"INFO: {total} fragmentos somados.")
+    print(f"Áreas salvas em: {output_path}")
+    return areas_manchas
+
+def main():
+    # Configurar os argumentos da linha de comando
+    parser = argparse.ArgumentParser(description="Dividir o cálculo da área das manchas de um raster em fragmentos independentes e juntar os resultados.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    planejar_parser = comandos.add_parser('planejar', help="Divide as janelas do raster em fragmentos e grava o manifesto.")
+    planejar_parser.add_argument('raster_path', type=str, help="Caminho do raster, como visto pelas máquinas que executam os fragmentos.")
+    planejar_parser.add_argument('manifesto', type=str, help="Caminho do manifesto JSON de saída.")
+    planejar_parser.add_argument('--fragmentos', type=int, required=True, help="Número de fragmentos.")
+    planejar_parser.add_argument('--resolucao', type=float, default=None, help="Resolução do pixel em metros (opcional).")
+    planejar_parser.add_argument('--valor-min', type=float, default=None, help="Valor mínimo das manchas (opcional).")
+    planejar_parser.add_argument('--valor-max', type=float, default=None, help="Valor máximo das manchas (opcional).")
+    planejar_parser.add_argument('--memoria-mb', type=float, default=motor_area.ORCAMENTO_MEMORIA_PADRAO / (1024 * 1024),
+                                 help="Orçamento de memória de cada fragmento, em MB (padrão: 256).")
+    planejar_parser.add_argument('--workers', type=int, default=1,
+                                 help="Número máximo de processos por fragmento em executar; o orçamento é dividido entre eles (padrão: 1).")
+    motor_area.adicionar_argumentos_intervalos(planejar_parser)
+
+    executar_parser = comandos.add_parser('executar', help="Conta as janelas de um fragmento e grava o arquivo parcial.")
+    executar_parser.add_argument('manifesto', type=str, help="Caminho do manifesto JSON.")
+    executar_parser.add_argument('--fragmento', '--shard', type=ler_fragmento, required=True, metavar='i/N',
+                                 help="Fragmento a executar, de 1/N a N/N.")
+    executar_parser.add_argument('--raster', type=str, default=None, help="Caminho do raster nesta máquina (padrão: o do manifesto).")
+    executar_parser.add_argument('--parciais', type=str, default=None, help="Diretório dos arquivos parciais (padrão: o do manifesto).")
+    executar_parser.add_argument('--workers', type=int, default=None, help="Número de processos neste fragmento, até o do plano (padrão: o do plano).")
+
+    juntar_parser = comandos.add_parser('juntar', help="Soma os arquivos parciais e grava as áreas finais.")
+    juntar_parser.add_argument('manifesto', type=str, help="Caminho do manifesto JSON.")
+    juntar_parser.add_argument('output_csv', type=str, help="Caminho do arquivo de saída.")
+    juntar_parser.add_argument('--parciais', type=str, default=None, help="Diretório dos arquivos parciais (padrão: o do manifesto).")
+    saida_area.adicionar_argumentos_saida(juntar_parser)
+
+    args = parser.parse_args()
+
+    if args.comando == "planejar":
+        verificar_entrada_existente(args.raster_path)
+        pixel_area = args.resolucao * args.resolucao if args.resolucao else None
+        planejar(args.raster_path, args.manifesto, args.fragmentos, pixel_area, args.valor_min, args.valor_max,
+                 motor_area.opcoes_intervalos(args)["intervalos"], int(args.memoria_mb * 1024 * 1024),
+                 args.workers)
+    elif args.comando == "executar":
+        verificar_entrada_existente(args.manifesto)
+        indice, total = args.fragmento
+        executar(args.manifesto, indice, total, args.raster, args.parciais, args.workers)
+    else:
+        verificar_entrada_existente(args.manifesto)
+        juntar(args.manifesto, args.output_csv, args.parciais, **saida_area.opcoes_saida(args))
+
+if __name__ == "__main__":
+    main()
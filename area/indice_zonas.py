@@ -0,0 +1,573 @@
+#!/usr/bin/env python3
+"""
+Índice de zonas (estados) rasterizado na grade de um raster.
+
+Em vez de cortar o mosaico em um GeoTIFF por estado e reler cada arquivo, os polígonos
+dos estados são rasterizados uma única vez sobre a grade do mosaico, gerando um raster
+de ids de zona. A área de cada classe em cada estado sai de um histograma conjunto
+(zona, classe) calculado em uma única passada pelo mosaico.
+
+O índice rasterizado fica em cache em disco (GeoTIFF em blocos e comprimido), com
+chave formada pela grade do raster (CRS, transformação e dimensões) e pelo hash do
+conteúdo do shapefile. Execuções seguintes sobre qualquer raster com a mesma grade
+reutilizam o índice sem rasterizar de novo.
+
+No modo de cobertura exata, os pixels cortados pelas divisas recebem a fração da
+sua área que cai em cada estado, calculada geometricamente. Os pixels internos
+continuam na contagem inteira, e só os blocos com pixels de divisa são relidos para
+a correção, de modo que a soma dos estados bate com o total do mosaico.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import geopandas as gpd
+import numpy as np
+import rasterio
+import shapely
+from rasterio.features import rasterize
+from rasterio.windows import bounds as limites_janela
+
+import motor_area
+
+# Atributo do shapefile com o nome de cada estado (o mesmo usado em crop_raster_by_state.py)
+CAMPO_ZONA_PADRAO = "nome"
+
+# Entradas do cache sem uso há mais tempo que isso são removidas
+IDADE_MAXIMA_CACHE_DIAS = 30
+
+# Tamanho máximo do cache; acima disso, as entradas usadas há mais tempo são removidas
+TAMANHO_MAXIMO_CACHE = 20 * 1024 ** 3
+
+# Arquivos auxiliares de um shapefile que entram no hash do conteúdo
+_EXTENSOES_SHAPEFILE = (".shx", ".dbf", ".prj", ".cpg")
+
+# Arquivos de uma entrada do cache: índice, metadados e frações dos pixels de divisa
+_EXTENSOES_CACHE = (".tif", ".json", ".bordas.npz")
+
+# Largura (em pixels) dos recortes da geometria usados no cálculo das frações de cobertura
+_COLUNAS_POR_RECORTE = 512
+
+# Contagens corrigidas abaixo disso (em unidades de peso) são resíduo de arredondamento
+_TOLERANCIA_CORRECAO = 1e-9
+
+def tipo_zonas(n_zonas):
+    """
+    Retorna o menor tipo inteiro sem sinal capaz de guardar os ids de `n_zonas` zonas.
+    """
+    for dtype in ("uint8", "uint16", "uint32"):
+        if n_zonas <= np.iinfo(dtype).max:
+            return dtype
+    raise ValueError(f"Número de zonas muito grande: {n_zonas}")
+
+def carregar_zonas(zonas_path, crs, campo=CAMPO_ZONA_PADRAO):
+    """
+    Lê o shapefile de zonas e atribui um id inteiro a cada nome.
+
+    Parâmetros:
+    - zonas_path: Caminho para o shapefile das zonas (ex.: estados).
+    - crs: CRS do raster; as geometrias são reprojetadas para ele se necessário.
+    - campo: Atributo com o nome de cada zona.
+
+    Retorna uma tupla (nomes, formas): `nomes[i]` é o nome da zona de id i + 1 e `formas`
+    é a lista de pares (geometria, id) pronta para `rasterio.features.rasterize`.
+    Feições com o mesmo nome (ex.: ilhas de um estado) recebem o mesmo id.
+    """
+    zonas = gpd.read_file(zonas_path)
+    if campo not in zonas.columns:
+        raise ValueError(f"O atributo '{campo}' não foi encontrado no shapefile: {zonas_path}")
+
+    # Verificar se o shapefile e o raster estão no mesmo sistema de coordenadas
+    if crs is not None and zonas.crs != crs:
+        zonas = zonas.to_crs(crs)
+
+    nomes = list(dict.fromkeys(zonas[campo].astype(str)))
+    ids = {nome: i + 1 for i, nome in enumerate(nomes)}
+    formas = [(geometria, ids[str(nome)]) for geometria, nome in zip(zonas.geometry, zonas[campo])
+              if geometria is not None and not geometria.is_empty]
+    return nomes, formas
+
+def perfil_indice_zonas(src, n_zonas):
+    """
+    Monta o perfil do GeoTIFF do índice de zonas: mesma grade e mesmos blocos de `src`,
+    para que as janelas de leitura dos dois rasters coincidam.
+    """
+    altura_bloco, largura_bloco = src.block_shapes[0]
+    perfil = {
+        "driver": "GTiff",
+        "height": src.height,
+        "width": src.width,
+        "count": 1,
+        "dtype": tipo_zonas(n_zonas),
+        "crs": src.crs,
+        "transform": src.transform,
+        "compress": "DEFLATE",
+        # Blocos inteiramente fora das zonas não são gravados e podem ser pulados na leitura
+        "sparse_ok": True,
+    }
+    if largura_bloco < src.width and largura_bloco % 16 == 0 and altura_bloco % 16 == 0:
+        perfil.update({"tiled": True, "blockxsize": largura_bloco, "blockysize": altura_bloco})
+    else:
+        perfil.update({"blockysize": altura_bloco})
+    return perfil
+
+def rasterizar_zonas(src, formas, n_zonas, destino, orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO):
+    """
+    Rasteriza as zonas sobre a grade de `src`, faixa por faixa, e grava o índice em `destino`.
+
+    Parâmetros:
+    - src: Dataset aberto com `rasterio.open` que define a grade.
+    - formas: Pares (geometria, id) retornados por `carregar_zonas`.
+    - n_zonas: Maior id de zona.
+    - destino: Caminho do GeoTIFF do índice de zonas.
+    - orcamento_memoria: Memória máxima (em bytes) usada por faixa.
+
+    Um pixel pertence à zona que contém o seu centro, como em `rasterio.mask.mask`;
+    onde há sobreposição, vale a última feição do shapefile. Pixels fora de
+    todas as zonas recebem 0.
+    """
+    perfil = perfil_indice_zonas(src, n_zonas)
+    limites = np.array([geometria.bounds for geometria, _ in formas]).reshape(-1, 4)
+
+    with rasterio.open(destino, "w", **perfil) as dst:
+        for janela in motor_area.iterar_faixas(src, orcamento_memoria, np.dtype(perfil["dtype"]).itemsize):
+            esquerda, inferior, direita, superior = limites_janela(janela, src.transform)
+
+            # Rasterizar apenas as geometrias cujo retângulo envolvente toca a faixa
+            tocam = ((limites[:, 0] <= direita) & (limites[:, 2] >= esquerda) &
+                     (limites[:, 1] <= superior) & (limites[:, 3] >= inferior))
+            formas_faixa = [formas[i] for i in np.flatnonzero(tocam)]
+
+            forma_saida = (int(janela.height), int(janela.width))
+            if formas_faixa:
+                zonas = rasterize(formas_faixa, out_shape=forma_saida, transform=src.window_transform(janela),
+                                  fill=0, dtype=perfil["dtype"])
+            else:
+                zonas = np.zeros(forma_saida, dtype=perfil["dtype"])
+            dst.write(zonas, 1, window=janela)
+
+def diretorio_cache_padrao():
+    """
+    Retorna o diretório padrão do cache de índices de zonas.
+
+    Usa a variável de ambiente GEOWRI_CACHE, se definida, ou ~/.cache/geowri.
+    """
+    base = os.environ.get("GEOWRI_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "geowri")
+    return os.path.join(base, "indice_zonas")
+
+def hash_vetor(vetor_path):
+    """
+    Calcula o hash SHA-256 do conteúdo de um arquivo vetorial.
+
+    Para shapefiles, inclui os arquivos auxiliares (.shx, .dbf, .prj, .cpg), já que
+    uma mudança apenas nos atributos também altera as zonas.
+    """
+    base, extensao = os.path.splitext(vetor_path)
+    arquivos = [vetor_path]
+    if extensao.lower() == ".shp":
+        for auxiliar in _EXTENSOES_SHAPEFILE:
+            for candidato in (base + auxiliar, base + auxiliar.upper()):
+                if os.path.exists(candidato):
+                    arquivos.append(candidato)
+                    break
+
+    hash_conteudo = hashlib.sha256()
+    for arquivo in arquivos:
+        hash_conteudo.update(os.path.splitext(arquivo)[1].lower().encode())
+        with open(arquivo, "rb") as f:
+            for pedaco in iter(lambda: f.read(1024 * 1024), b""):
+                hash_conteudo.update(pedaco)
+    return hash_conteudo.hexdigest()
+
+def assinatura_grade(src):
+    """
+    Retorna a assinatura da grade de um raster: CRS, transformação e dimensões.
+    """
+    return {
+        "crs": src.crs.to_wkt() if src.crs is not None else None,
+        "transform": [float(v) for v in tuple(src.transform)[:6]],
+        "largura": src.width,
+        "altura": src.height,
+    }
+
+def chave_indice_zonas(src, hash_zonas, campo):
+    """
+    Calcula a chave do cache para a combinação (grade do raster, conteúdo do shapefile, campo).
+    """
+    assinatura = json.dumps({"grade": assinatura_grade(src), "zonas": hash_zonas, "campo": campo}, sort_keys=True)
+    return hashlib.sha256(assinatura.encode()).hexdigest()[:32]
+
+def _remover_entrada_cache(diretorio_cache, chave):
+    """
+    Remove todos os arquivos de uma entrada do cache.
+    """
+    for extensao in _EXTENSOES_CACHE:
+        caminho = os.path.join(diretorio_cache, chave + extensao)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+def limpar_cache_zonas(diretorio_cache, manter=None, zonas_path=None, hash_zonas=None,
+                       idade_maxima_dias=IDADE_MAXIMA_CACHE_DIAS, tamanho_maximo=TAMANHO_MAXIMO_CACHE):
+    """
+    Remove entradas obsoletas do cache de índices de zonas.
+
+    Parâmetros:
+    - diretorio_cache: Diretório do cache.
+    - manter: Chave que não deve ser removida (a entrada em uso).
+    - zonas_path, hash_zonas: Shapefile em uso e o hash atual do seu conteúdo. Entradas do
+      mesmo shapefile com outro hash foram geradas de uma versão antiga e são removidas.
+    - idade_maxima_dias: Entradas sem uso há mais tempo que isso são removidas.
+    - tamanho_maximo: Tamanho máximo do cache em bytes (remove as menos usadas primeiro).
+
+    Retorna a lista das chaves removidas.
+    """
+    agora = time.time()
+    zonas_path = os.path.abspath(zonas_path) if zonas_path else None
+    removidas = []
+    entradas = []
+
+    for nome in os.listdir(diretorio_cache):
+        caminho = os.path.join(diretorio_cache, nome)
+
+        # Arquivos temporários de gravações interrompidas
+        if nome.endswith(".tmp"):
+            if agora - os.path.getmtime(caminho) > 24 * 3600:
+                os.remove(caminho)
+            continue
+        if not nome.endswith(".json"):
+            continue
+
+        chave = nome[:-len(".json")]
+        indice_path = os.path.join(diretorio_cache, chave + ".tif")
+        try:
+            with open(caminho) as f:
+                metadados = json.load(f)
+            ultimo_uso = os.path.getmtime(indice_path)
+            tamanho = sum(os.path.getsize(os.path.join(diretorio_cache, chave + extensao))
+                          for extensao in _EXTENSOES_CACHE
+                          if os.path.exists(os.path.join(diretorio_cache, chave + extensao)))
+        except (OSError, ValueError):
+            if chave != manter:
+                _remover_entrada_cache(diretorio_cache, chave)
+                removidas.append(chave)
+            continue
+
+        if chave == manter:
+            entradas.append((ultimo_uso, tamanho, chave))
+            continue
+
+        versao_antiga = (zonas_path is not None and metadados.get("zonas_path") == zonas_path
+                         and metadados.get("hash_zonas") != hash_zonas)
+        if versao_antiga or agora - ultimo_uso > idade_maxima_dias * 24 * 3600:
+            _remover_entrada_cache(diretorio_cache, chave)
+            removidas.append(chave)
+        else:
+            entradas.append((ultimo_uso, tamanho, chave))
+
+    # Respeitar o tamanho máximo, removendo as entradas usadas há mais tempo
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, chave in sorted(entradas):
+        if total <= tamanho_maximo:
+            break
+        if chave == manter:
+            continue
+        _remover_entrada_cache(diretorio_cache, chave)
+        removidas.append(chave)
+        total -= tamanho
+
+    return removidas
+
+def _entrada_cache(src, zonas_path, campo, diretorio_cache=None):
+    """
+    Retorna (diretorio_cache, chave, hash_zonas) da entrada do cache para `src` e o shapefile.
+    """
+    diretorio_cache = diretorio_cache or diretorio_cache_padrao()
+    os.makedirs(diretorio_cache, exist_ok=True)
+    hash_zonas = hash_vetor(zonas_path)
+    return diretorio_cache, chave_indice_zonas(src, hash_zonas, campo), hash_zonas
+
+def obter_indice_zonas(src, zonas_path, campo=CAMPO_ZONA_PADRAO, diretorio_cache=None,
+                       orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO):
+    """
+    Obtém o índice de zonas rasterizado na grade de `src`, reutilizando o cache quando possível.
+
+    Parâmetros:
+    - src: Dataset aberto com `rasterio.open` que define a grade.
+    - zonas_path: Caminho para o shapefile das zonas.
+    - campo: Atributo com o nome de cada zona.
+    - diretorio_cache: Diretório do cache (padrão: `diretorio_cache_padrao()`).
+    - orcamento_memoria: Memória máxima (em bytes) usada por faixa na rasterização.
+
+    Retorna uma tupla (indice_path, nomes), em que `nomes[i]` é o nome da zona de id i + 1.
+    """
+    diretorio_cache, chave, hash_zonas = _entrada_cache(src, zonas_path, campo, diretorio_cache)
+    indice_path = os.path.join(diretorio_cache, chave + ".tif")
+    metadados_path = os.path.join(diretorio_cache, chave + ".json")
+
+    metadados = None
+    if os.path.exists(indice_path) and os.path.exists(metadados_path):
+        try:
+            with open(metadados_path) as f:
+                metadados = json.load(f)
+        except ValueError:
+            metadados = None
+
+    if metadados is not None:
+        # Marcar o uso da entrada (a limpeza remove primeiro as usadas há mais tempo)
+        os.utime(indice_path)
+        print(f"INFO: Reutilizando o índice de zonas em cache: {indice_path}")
+    else:
+        nomes, formas = carregar_zonas(zonas_path, src.crs, campo)
+        print(f"INFO: Rasterizando {len(nomes)} zonas de {zonas_path} na grade do raster...")
+
+        # Gravar em arquivos temporários e renomear, para nunca deixar uma entrada pela metade
+        sufixo = f".{os.getpid()}.tmp"
+        rasterizar_zonas(src, formas, len(nomes), indice_path + sufixo, orcamento_memoria)
+        metadados = {
+            "nomes": nomes,
+            "campo": campo,
+            "zonas_path": os.path.abspath(zonas_path),
+            "hash_zonas": hash_zonas,
+            "grade": assinatura_grade(src),
+        }
+        with open(metadados_path + sufixo, "w") as f:
+            json.dump(metadados, f, ensure_ascii=False, indent=2)
+        os.replace(indice_path + sufixo, indice_path)
+        os.replace(metadados_path + sufixo, metadados_path)
+        print(f"INFO: Índice de zonas salvo em cache: {indice_path}")
+
+    limpar_cache_zonas(diretorio_cache, manter=chave, zonas_path=zonas_path, hash_zonas=hash_zonas)
+    return indice_path, metadados["nomes"]
+
+def fracoes_cobertura(geometria, linhas, colunas, transform):
+    """
+    Calcula a fração da área de cada pixel (linha, coluna) coberta pela geometria.
+
+    A geometria é recortada em faixas de `_COLUNAS_POR_RECORTE` colunas antes da interseção,
+    para que cada operação envolva só os vértices próximos dos pixels.
+    """
+    x0 = transform.c + colunas * transform.a
+    y0 = transform.f + linhas * transform.e
+    x1, y1 = x0 + transform.a, y0 + transform.e
+    xmin, xmax = np.minimum(x0, x1), np.maximum(x0, x1)
+    ymin, ymax = np.minimum(y0, y1), np.maximum(y0, y1)
+
+    caixas = shapely.box(xmin, ymin, xmax, ymax)
+    area_pixel = abs(transform.a * transform.e)
+    fracoes = np.empty(caixas.size, dtype=np.float64)
+
+    recortes = colunas // _COLUNAS_POR_RECORTE
+    for recorte in np.unique(recortes):
+        sel = np.flatnonzero(recortes == recorte)
+        trecho = shapely.clip_by_rect(geometria, xmin[sel].min(), ymin[sel].min(), xmax[sel].max(), ymax[sel].max())
+        fracoes[sel] = shapely.area(shapely.intersection(trecho, caixas[sel])) / area_pixel
+    return np.clip(fracoes, 0.0, 1.0)
+
+def calcular_bordas_zonas(src, formas, orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO):
+    """
+    Encontra os pixels cortados pelas divisas das zonas e a fração de cada um dentro de cada zona.
+
+    Os pixels de divisa são os tocados pelo contorno de cada polígono (rasterização das
+    linhas com `all_touched`), faixa por faixa; todos os outros pixels estão inteiramente
+    dentro ou fora da zona.
+
+    Retorna um dicionário de arrays (linhas, colunas, zonas, fracoes), ordenado por linha e coluna.
+    Um pixel cortado por várias zonas aparece uma vez para cada uma.
+    """
+    if src.transform.b != 0 or src.transform.d != 0:
+        raise ValueError(f"A cobertura exata não suporta rasters rotacionados: {src.name}")
+
+    formas = [(geometria if geometria.is_valid else shapely.make_valid(geometria), zona) for geometria, zona in formas]
+    limites = np.array([geometria.bounds for geometria, _ in formas]).reshape(-1, 4)
+    partes = {"linhas": [], "colunas": [], "zonas": [], "fracoes": []}
+
+    for janela in motor_area.iterar_faixas(src, orcamento_memoria, 1):
+        esquerda, inferior, direita, superior = limites_janela(janela, src.transform)
+        tocam = ((limites[:, 0] <= direita) & (limites[:, 2] >= esquerda) &
+                 (limites[:, 1] <= superior) & (limites[:, 3] >= inferior))
+        transform_faixa = src.window_transform(janela)
+        forma_saida = (int(janela.height), int(janela.width))
+
+        for i in np.flatnonzero(tocam):
+            geometria, zona = formas[i]
+            borda = rasterize([(geometria.boundary, 1)], out_shape=forma_saida, transform=transform_faixa,
+                              fill=0, all_touched=True, dtype="uint8")
+            linhas, colunas = np.nonzero(borda)
+            if linhas.size == 0:
+                continue
+
+            fracoes = fracoes_cobertura(geometria, linhas, colunas, transform_faixa)
+            cobertos = fracoes > 0
+            partes["linhas"].append(linhas[cobertos] + int(janela.row_off))
+            partes["colunas"].append(colunas[cobertos] + int(janela.col_off))
+            partes["zonas"].append(np.full(int(cobertos.sum()), zona, dtype=np.uint32))
+            partes["fracoes"].append(fracoes[cobertos])
+
+    tipos = {"linhas": np.int64, "colunas": np.int64, "zonas": np.uint32, "fracoes": np.float64}
+    bordas = {campo: np.concatenate(partes[campo]).astype(tipos[campo]) if partes[campo] else np.empty(0, tipos[campo])
+              for campo in tipos}
+    ordem = np.lexsort((bordas["colunas"], bordas["linhas"]))
+    return {campo: valores[ordem] for campo, valores in bordas.items()}
+
+def obter_bordas_zonas(src, zonas_path, campo=CAMPO_ZONA_PADRAO, diretorio_cache=None,
+                       orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO):
+    """
+    Obtém as frações dos pixels de divisa (ver `calcular_bordas_zonas`), reutilizando o cache.
+
+    As frações ficam na mesma entrada do cache do índice de zonas.
+    """
+    diretorio_cache, chave, _ = _entrada_cache(src, zonas_path, campo, diretorio_cache)
+    bordas_path = os.path.join(diretorio_cache, chave + ".bordas.npz")
+
+    if os.path.exists(bordas_path):
+        os.utime(bordas_path)
+        with np.load(bordas_path) as arquivo:
+            return {campo_borda: arquivo[campo_borda] for campo_borda in arquivo.files}
+
+    _, formas = carregar_zonas(zonas_path, src.crs, campo)
+    print(f"INFO: Calculando a cobertura exata dos pixels de divisa de {zonas_path}...")
+    bordas = calcular_bordas_zonas(src, formas, orcamento_memoria)
+
+    temporario = bordas_path + f".{os.getpid()}.tmp"
+    with open(temporario, "wb") as f:
+        np.savez(f, **bordas)
+    os.replace(temporario, bordas_path)
+    print(f"INFO: {bordas['linhas'].size} frações de pixels de divisa salvas em cache: {bordas_path}")
+    return bordas
+
+def corrigir_bordas(src, zonas_src, bordas, valor_min=None, valor_max=None,
+                    orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO, pesos_linhas=None):
+    """
+    Calcula a correção das contagens por zona para a cobertura exata dos pixels de divisa.
+
+    Cada pixel de divisa sai da zona que contém o seu centro e entra em cada zona que o
+    cobre com a respectiva fração. Só os blocos que contêm pixels de divisa são lidos.
+
+    Retorna um dicionário {(zona, valor): correção}, na mesma unidade das contagens (pesos).
+    """
+    linhas, colunas = bordas["linhas"], bordas["colunas"]
+    zonas_partes, valores_partes, correcoes_partes = [], [], []
+
+    for janela in motor_area.iterar_janelas(src, orcamento_memoria):
+        linha_0, coluna_0 = int(janela.row_off), int(janela.col_off)
+        inicio, fim = np.searchsorted(linhas, [linha_0, linha_0 + int(janela.height)])
+        if inicio == fim:
+            continue
+        sel = inicio + np.flatnonzero((colunas[inicio:fim] >= coluna_0) &
+                                      (colunas[inicio:fim] < coluna_0 + int(janela.width)))
+        if sel.size == 0:
+            continue
+
+        bloco = src.read(1, window=janela)
+        zonas_centro = zonas_src.read(1, window=janela)
+        linhas_bloco, colunas_bloco = linhas[sel] - linha_0, colunas[sel] - coluna_0
+        valores = bloco[linhas_bloco, colunas_bloco]
+        zonas = bordas["zonas"][sel]
+        pesos = np.ones(sel.size) if pesos_linhas is None else pesos_linhas[linhas[sel]].astype(np.float64)
+
+        dentro = np.ones(sel.size, dtype=bool)
+        if valor_min is not None:
+            dentro &= valores >= valor_min
+        if valor_max is not None:
+            dentro &= valores <= valor_max
+
+        # Entra a fração de cada zona que cobre o pixel
+        zonas_partes.append(zonas[dentro])
+        valores_partes.append(valores[dentro])
+        correcoes_partes.append(bordas["fracoes"][sel][dentro] * pesos[dentro])
+
+        # Sai o pixel inteiro da zona do centro (uma vez por pixel, mesmo com várias feições da zona)
+        da_zona_centro = dentro & (zonas == zonas_centro[linhas_bloco, colunas_bloco])
+        pixels = linhas[sel] * src.width + colunas[sel]
+        _, primeiros = np.unique(pixels[da_zona_centro], return_index=True)
+        primeiros = np.flatnonzero(da_zona_centro)[primeiros]
+        zonas_partes.append(zonas[primeiros])
+        valores_partes.append(valores[primeiros])
+        correcoes_partes.append(-pesos[primeiros])
+
+    if not correcoes_partes:
+        return {}
+
+    zonas = np.concatenate(zonas_partes)
+    valores = np.concatenate(valores_partes)
+    correcoes = np.concatenate(correcoes_partes)
+    pares, inverso = np.unique(np.stack([zonas.astype(np.float64), valores.astype(np.float64)]), axis=1,
+                               return_inverse=True)
+    somas = np.bincount(inverso.ravel(), weights=correcoes, minlength=pares.shape[1])
+
+    # float64 representa exatamente os valores do raster; voltar ao tipo original
+    valores_pares = pares[1].astype(valores.dtype)
+    return {(int(zona), valor.item()): soma for zona, valor, soma in zip(pares[0], valores_pares, somas)}
+
+def aplicar_correcoes(contagens, correcoes, dtype):
+    """
+    Soma as correções de `corrigir_bordas` às contagens por zona de `motor_area.contar_pixels_por_zona`.
+
+    Retorna a mesma estrutura, com contagens fracionárias; valores cuja contagem corrigida
+    se anula deixam de aparecer.
+    """
+    por_zona = [dict(zip(valores.tolist(), contagens_zona.astype(np.float64).tolist()))
+                for valores, contagens_zona in contagens]
+    for (zona, valor), correcao in correcoes.items():
+        por_zona[zona][valor] = por_zona[zona].get(valor, 0.0) + correcao
+
+    corrigidas = []
+    for contagens_zona in por_zona:
+        valores = sorted(valor for valor, contagem in contagens_zona.items() if contagem > _TOLERANCIA_CORRECAO)
+        corrigidas.append((np.array(valores, dtype=dtype),
+                           np.array([contagens_zona[valor] for valor in valores], dtype=np.float64)))
+    return corrigidas
+
+def calcular_area_manchas_por_zona(raster_path, zonas_path, campo=CAMPO_ZONA_PADRAO, pixel_area=None,
+                                   valor_min=None, valor_max=None, diretorio_cache=None, cobertura_exata=False,
+                                   orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO, workers=1):
+    """
+    Calcula a área das manchas de cada zona diretamente do mosaico, sem cortar um raster por zona.
+
+    Parâmetros:
+    - raster_path: Caminho para o mosaico.
+    - zonas_path: Caminho para o shapefile das zonas (ex.: estados).
+    - campo: Atributo com o nome de cada zona.
+    - diretorio_cache: Diretório do cache de índices de zonas (opcional).
+    - cobertura_exata: Se True, os pixels de divisa são repartidos entre as zonas pela fração
+      da área coberta, em vez de irem inteiros para a zona que contém o centro.
+    - pixel_area, valor_min, valor_max, orcamento_memoria, workers: Ver `motor_area.calcular_area_manchas`.
+
+    Retorna um dicionário {nome_da_zona: {valor: (area_m2, area_ha)}}, na ordem do shapefile.
+    """
+    with rasterio.open(raster_path) as src:
+        indice_path, nomes = obter_indice_zonas(src, zonas_path, campo, diretorio_cache, orcamento_memoria)
+        pesos_linhas, unidade = motor_area.definir_area_pixel(src, pixel_area)
+
+        with rasterio.open(indice_path) as zonas_src:
+            contagens = motor_area.contar_pixels_por_zona(src, zonas_src, len(nomes), valor_min, valor_max,
+                                                          orcamento_memoria, workers, pesos_linhas,
+                                                          ignorar_zona_zero=True)
+
+            if cobertura_exata:
+                bordas = obter_bordas_zonas(src, zonas_path, campo, diretorio_cache, orcamento_memoria)
+                correcoes = corrigir_bordas(src, zonas_src, bordas, valor_min, valor_max, orcamento_memoria,
+                                            pesos_linhas)
+                contagens = aplicar_correcoes(contagens, correcoes, src.dtypes[0])
+
+    return {nome: motor_area.areas_de_contagens(*contagens[i + 1], unidade) for i, nome in enumerate(nomes)}
+
+def adicionar_argumentos_zonais(parser, cobertura=False):
+    """
+    Adiciona ao parser os argumentos do modo zonal dos scripts `calcular_area_por_estado*`.
+
+    Com `cobertura=True`, inclui também a opção --cobertura-exata.
+    """
+    parser.add_argument('--estados', type=str,
+                        help="Shapefile dos estados. Com esta opção, o primeiro argumento é o mosaico, "
+                             "que é lido uma única vez, sem cortes por estado.")
+    parser.add_argument('--campo', type=str, default=CAMPO_ZONA_PADRAO,
+                        help=f"Atributo do shapefile com o nome do estado (padrão: {CAMPO_ZONA_PADRAO}).")
+    parser.add_argument('--cache-zonas', type=str, default=None,
+                        help="Diretório do cache de índices de zonas (padrão: $GEOWRI_CACHE ou ~/.cache/geowri).")
+    if cobertura:
+        parser.add_argument('--cobertura-exata', action='store_true',
+                            help="Reparte os pixels de divisa entre os estados pela fração exata da área coberta.")
+    return parser
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Leitura antecipada de blocos de raster em threads, sobrepondo a leitura do disco e a
+descompressão (DEFLATE, LZW) ao processamento.
+
+Enquanto o bloco k é processado, os blocos k+1..k+n já estão sendo lidos por um pool
+de threads; o GDAL libera o GIL durante a leitura e a decodificação, então as threads
+trabalham de fato em paralelo. Cada thread abre os seus próprios datasets (handles do
+rasterio não podem ser compartilhados entre threads) e lê em um anel de n+1 buffers
+pré-alocados, reaproveitados de bloco em bloco.
+
+Usado pelo motor de área e pelo corte por estado.
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import rasterio
+
+# Quantos blocos são lidos à frente do bloco em processamento
+ANTECIPACAO_PADRAO = 4
+
+def buffer_do_anel(posicao, chave, forma, dtype):
+    """
+    Retorna um array com a forma pedida, apoiado em um buffer pré-alocado de uma posição do anel.
+
+    Parâmetros:
+    - posicao: Dicionário da posição do anel (recebido pela função de leitura).
+    - chave: Nome do buffer dentro da posição (ex.: "raster", "zonas").
+    - forma: Forma do array (ex.: (altura, largura)).
+    - dtype: Tipo de dado.
+
+    O buffer só é realocado se for menor que o pedido ou de outro tipo; blocos de borda,
+    menores, usam o início do mesmo buffer. O array é contíguo, como exige o `out=` do rasterio.
+    """
+    n = int(np.prod(forma))
+    buffer = posicao.get(chave)
+    if buffer is None or buffer.size < n or buffer.dtype != np.dtype(dtype):
+        buffer = posicao[chave] = np.empty(n, dtype=dtype)
+    return buffer[:n].reshape(forma)
+
+def iterar_leituras(caminhos, janelas, ler, antecipacao=ANTECIPACAO_PADRAO, opcoes=None):
+    """
+    Aplica `ler` a cada janela em um pool de threads, até `antecipacao` janelas à frente.
+
+    Parâmetros:
+    - caminhos: Caminhos dos rasters abertos por cada thread (ex.: o raster e o índice de zonas).
+    - janelas: Janelas a ler, na ordem de processamento.
+    - ler: Função `ler(fontes, janela, posicao)` executada na thread, com a lista de datasets
+      da thread e a posição do anel (ver `buffer_do_anel`); retorna o que foi lido.
+    - antecipacao: Número de leituras à frente. Com 0, lê na própria thread, sem antecipar.
+    - opcoes: Opções de `rasterio.open` de cada caminho (ex.: `src.options`, com o nível de overview).
+
+    Gera tuplas (janela, lido), na ordem de `janelas`. Os arrays de uma posição do anel são
+    reaproveitados: o que foi gerado só vale até a próxima iteração.
+    """
+    janelas = list(janelas)
+    opcoes = opcoes or [{}] * len(caminhos)
+
+    def abrir():
+        return [rasterio.open(caminho, **opcoes_caminho) for caminho, opcoes_caminho in zip(caminhos, opcoes)]
+
+    if antecipacao <= 0:
+        fontes = abrir()
+        try:
+            posicao = {}
+            for janela in janelas:
+                yield janela, ler(fontes, janela, posicao)
+        finally:
+            for fonte in fontes:
+                fonte.close()
+        return
+
+    anel = [{} for _ in range(antecipacao + 1)]
+    local = threading.local()
+    abertos = []
+    trava = threading.Lock()
+
+    def fontes_da_thread():
+        if not hasattr(local, "fontes"):
+            local.fontes = abrir()
+            with trava:
+                abertos.extend(local.fontes)
+        return local.fontes
+
+    def tarefa(i):
+        return ler(fontes_da_thread(), janelas[i], anel[i % len(anel)])
+
+    executor = ThreadPoolExecutor(max_workers=antecipacao)
+    pendentes = deque()
+    try:
+        for i in range(min(antecipacao, len(janelas))):
+            pendentes.append(executor.submit(tarefa, i))
+        for i, janela in enumerate(janelas):
+            lido = pendentes.popleft().result()
+            # A posição do anel da janela i - 1 já foi liberada pelo consumidor
+            if i + antecipacao < len(janelas):
+                pendentes.append(executor.submit(tarefa, i + antecipacao))
+            yield janela, lido
+    finally:
+        for futuro in pendentes:
+            futuro.cancel()
+        executor.shutdown(wait=True)
+        for fonte in abertos:
+            fonte.close()
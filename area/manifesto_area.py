@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Manifesto de resultados por raster para o recálculo incremental das áreas.
+
+Ao lado do arquivo de saída fica um manifesto JSON com, para cada raster processado,
+o tamanho, a data de modificação, o hash do conteúdo (opcional), os parâmetros que
+afetam o resultado (área do pixel, intervalo de valores) e o histograma de áreas
+calculado. Em uma nova execução, os rasters que não mudaram são lidos do manifesto;
+só os novos ou alterados são recalculados, e os que foram apagados saem do manifesto.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import rasterio
+
+# Sufixo do manifesto, gravado ao lado do arquivo de saída
+SUFIXO_MANIFESTO = ".manifesto.json"
+
+# Versão do formato; manifestos de outra versão são ignorados
+VERSAO_MANIFESTO = 1
+
+def caminho_manifesto(output_path):
+    """
+    Retorna o caminho do manifesto associado a um arquivo (ou diretório) de saída.
+    """
+    return os.path.normpath(output_path) + SUFIXO_MANIFESTO
+
+def carregar_manifesto(manifesto_path):
+    """
+    Lê o manifesto. Retorna um manifesto vazio se o arquivo não existir ou for inválido.
+    """
+    vazio = {"versao": VERSAO_MANIFESTO, "rasters": {}}
+    if not os.path.exists(manifesto_path):
+        return vazio
+    try:
+        with open(manifesto_path) as f:
+            manifesto = json.load(f)
+    except ValueError:
+        print(f"AVISO: Manifesto inválido, recalculando tudo: {manifesto_path}")
+        return vazio
+    if manifesto.get("versao") != VERSAO_MANIFESTO:
+        return vazio
+    return manifesto
+
+def salvar_manifesto(manifesto_path, manifesto):
+    """
+    Grava o manifesto de forma atômica (arquivo temporário + renomeação).
+    """
+    temporario = manifesto_path + f".{os.getpid()}.tmp"
+    with open(temporario, "w") as f:
+        json.dump(manifesto, f, ensure_ascii=False)
+    os.replace(temporario, manifesto_path)
+
+def hash_arquivo(caminho):
+    """
+    Calcula o hash SHA-256 do conteúdo de um arquivo.
+    """
+    hash_conteudo = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for pedaco in iter(lambda: f.read(4 * 1024 * 1024), b""):
+            hash_conteudo.update(pedaco)
+    return hash_conteudo.hexdigest()
+
+def arquivos_do_raster(raster_path):
+    """
+    Retorna os arquivos de que o resultado de um raster depende: o próprio arquivo e, em um
+    VRT (ex.: os recortes virtuais de `crop_raster_by_state.py --vrt`), os rasters de origem.
+    """
+    if not raster_path.lower().endswith(".vrt"):
+        return [raster_path]
+    with rasterio.open(raster_path) as src:
+        return src.files
+
+def estado_raster(raster_path):
+    """
+    Retorna uma tupla (tamanho, mtime_ns) do raster: a soma dos tamanhos e a modificação
+    mais recente entre os arquivos de que ele depende.
+    """
+    estados = [os.stat(caminho) for caminho in arquivos_do_raster(raster_path)]
+    return sum(estado.st_size for estado in estados), max(estado.st_mtime_ns for estado in estados)
+
+def hash_raster(raster_path):
+    """
+    Calcula o hash do conteúdo do raster (e dos arquivos de origem, em um VRT).
+    """
+    arquivos = arquivos_do_raster(raster_path)
+    if len(arquivos) == 1:
+        return hash_arquivo(raster_path)
+    return hashlib.sha256("".join(hash_arquivo(caminho) for caminho in arquivos).encode()).hexdigest()
+
+def _normalizar(parametros):
+    """
+    Passa os parâmetros por JSON, para compará-los com os lidos do manifesto.
+    """
+    return json.loads(json.dumps(parametros))
+
+def entrada_valida(entrada, raster_path, parametros, usar_hash=False):
+    """
+    Verifica se a entrada do manifesto ainda vale para o raster.
+
+    A entrada vale se os parâmetros forem os mesmos e o arquivo não tiver mudado de
+    tamanho e data de modificação. Com `usar_hash`, um arquivo com outra data mas o
+    mesmo conteúdo (ex.: copiado de novo) também é aceito, e a entrada é atualizada.
+    """
+    if entrada is None or entrada.get("parametros") != _normalizar(parametros):
+        return False
+
+    tamanho, mtime_ns = estado_raster(raster_path)
+    if entrada["tamanho"] == tamanho and entrada["mtime_ns"] == mtime_ns:
+        if usar_hash and not entrada.get("hash"):
+            entrada["hash"] = hash_raster(raster_path)
+        return True
+
+    if usar_hash and entrada.get("hash") and entrada["tamanho"] == tamanho:
+        if hash_raster(raster_path) == entrada["hash"]:
+            entrada["mtime_ns"] = mtime_ns
+            return True
+    return False
+
+def nova_entrada(raster_path, parametros, areas_manchas, usar_hash=False):
+    """
+    Monta a entrada do manifesto de um raster a partir do dicionário {valor: (area_m2, area_ha)}.
+    """
+    tamanho, mtime_ns = estado_raster(raster_path)
+    valores = np.array(list(areas_manchas.keys()))
+    areas = np.array(list(areas_manchas.values()), dtype=np.float64).reshape(len(areas_manchas), 2)
+    return {
+        "tamanho": tamanho,
+        "mtime_ns": mtime_ns,
+        "hash": hash_raster(raster_path) if usar_hash else None,
+        "parametros": _normalizar(parametros),
+        "dtype": str(valores.dtype),
+        "valores": valores.tolist(),
+        "area_m2": areas[:, 0].tolist(),
+        "area_ha": areas[:, 1].tolist(),
+    }
+
+def areas_da_entrada(entrada):
+    """
+    Reconstrói o dicionário {valor: (area_m2, area_ha)} guardado em uma entrada do manifesto.
+    """
+    valores = np.array(entrada["valores"], dtype=entrada["dtype"])
+    areas_m2 = np.array(entrada["area_m2"], dtype=np.float64)
+    areas_ha = np.array(entrada["area_ha"], dtype=np.float64)
+    return dict(zip(valores, zip(areas_m2, areas_ha)))
+
+def calcular_areas_com_manifesto(rasters, output_path, calcular, parametros, usar_hash=False, usar_manifesto=True):
+    """
+    Calcula as áreas de cada raster, reaproveitando do manifesto os que não mudaram.
+
+    Parâmetros:
+    - rasters: Caminhos dos rasters.
+    - output_path: Arquivo de saída; o manifesto fica ao lado dele.
+    - calcular: Função que recebe o caminho de um raster e retorna {valor: (area_m2, area_ha)}.
+    - parametros: Dicionário com os parâmetros que afetam o resultado (ex.: pixel_area, valor_min).
+    - usar_hash: Se True, guarda e compara também o hash do conteúdo de cada raster.
+    - usar_manifesto: Se False, recalcula tudo e não grava o manifesto.
+
+    Gera tuplas (raster_path, areas_manchas), na ordem de `rasters`. O manifesto é gravado
+    após cada raster recalculado, para que uma execução interrompida não perca o que já foi feito.
+    """
+    if not usar_manifesto:
+        for raster_path in rasters:
+            yield raster_path, calcular(raster_path)
+        return
+
+    manifesto_path = caminho_manifesto(output_path)
+    base = os.path.dirname(os.path.abspath(manifesto_path))
+    anterior = carregar_manifesto(manifesto_path)["rasters"]
+
+    # Só os rasters atuais entram no novo manifesto; os apagados são descartados
+    manifesto = {"versao": VERSAO_MANIFESTO, "rasters": {}}
+    reaproveitados = recalculados = 0
+
+    for raster_path in rasters:
+        chave = os.path.relpath(os.path.abspath(raster_path), base)
+        entrada = anterior.get(chave)
+
+        if entrada_valida(entrada, raster_path, parametros, usar_hash):
+            areas_manchas = areas_da_entrada(entrada)
+            manifesto["rasters"][chave] = entrada
+            reaproveitados += 1
+        else:
+            areas_manchas = calcular(raster_path)
+            manifesto["rasters"][chave] = nova_entrada(raster_path, parametros, areas_manchas, usar_hash)
+            recalculados += 1
+            salvar_manifesto(manifesto_path, {"versao": VERSAO_MANIFESTO,
+                                              "rasters": {**anterior, **manifesto["rasters"]}})
+        yield raster_path, areas_manchas
+
+    salvar_manifesto(manifesto_path, manifesto)
+    print(f"INFO: {reaproveitados} raster(s) reaproveitado(s) do manifesto e {recalculados} recalculado(s).")
+
+def adicionar_argumentos_manifesto(parser):
+    """
+    Adiciona ao parser os argumentos do manifesto de resultados.
+    """
+    parser.add_argument('--sem-manifesto', action='store_true',
+                        help="Recalcula todos os rasters, sem ler nem gravar o manifesto ao lado da saída.")
+    parser.add_argument('--hash', action='store_true',
+                        help="Compara também o hash do conteúdo de cada raster (mais lento, mais seguro).")
+    return parser
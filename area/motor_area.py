@@ -0,0 +1,1010 @@
+#!/usr/bin/env python3
+"""
+Motor compartilhado de cálculo de áreas por classe (mancha) em rasters.
+
+Todos os scripts `calcular_area_*` delegam a contagem de pixels para este módulo.
+Em vez de ler a banda inteira com `src.read(1)`, o raster é percorrido bloco a
+bloco (`src.block_windows(1)`), acumulando o histograma de valores. O pico de
+memória fica limitado por um orçamento configurável, o que permite processar
+mosaicos nacionais sem estourar a RAM.
+
+Blocos que não estão gravados no arquivo (tiles esparsos de um GeoTIFF com SPARSE_OK,
+como as áreas sem dado do mosaico) não são decodificados: os seus pixels vão direto
+para a classe de nodata. No modo zonal, os blocos inteiramente fora das zonas também
+são pulados.
+
+Em rasters com CRS geográfico (ex.: EPSG:4326), a área de cada pixel depende da
+latitude. Nesse caso o motor pré-calcula a área elipsoidal de cada linha e pondera
+as contagens linha a linha durante a própria leitura, sem reprojetar o raster.
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import rasterio
+from pyproj import CRS
+from rasterio.enums import Resampling
+from rasterio.transform import Affine
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window
+
+import leitura_antecipada
+
+# Orçamento padrão de memória para a leitura de cada janela (em bytes)
+ORCAMENTO_MEMORIA_PADRAO = 256 * 1024 * 1024
+
+# Bytes de trabalho estimados por pixel, além do próprio dado lido
+# (máscaras, índices e pesos temporários da contagem)
+_BYTES_TRABALHO_POR_PIXEL = 24
+
+# Fração da memória disponível que uma leitura inteira (em memória) pode ocupar
+_FRACAO_MEMORIA_DISPONIVEL = 0.5
+
+# Maior número de classes contadas com np.bincount; acima disso usa-se a ordenação
+LIMITE_BINCOUNT = 1 << 20
+
+# Quantas faixas de blocos cada processo recebe, em média, no modo paralelo
+# (faixas menores equilibram melhor a carga entre os processos)
+_FAIXAS_POR_PROCESSO = 4
+
+# Algarismos significativos dos pesos inteiros de área por linha (rasters geográficos).
+# Pesos inteiros tornam a soma exata e independente da ordem dos blocos.
+_DIGITOS_PESO = 7
+
+# Maior soma de inteiros representada exatamente em float64 (usada pelo bincount com pesos)
+_LIMITE_SOMA_EXATA = 2 ** 53
+
+# Valor crítico da normal para os limites de erro do modo aproximado (95% de confiança)
+_Z_CONFIANCA = 1.96
+
+# Classes com fração da área abaixo disso não decidem o nível de leitura do modo aproximado
+FRACAO_MINIMA_APROX = 0.001
+
+# Fatores das overviews construídas com --construir-overviews (e da leitura decimada sem overviews)
+FATORES_OVERVIEW_PADRAO = (2, 4, 8, 16, 32, 64)
+
+def bytes_por_pixel(dtype):
+    """
+    Estima quantos bytes cada pixel ocupa durante a contagem.
+    """
+    return np.dtype(dtype).itemsize + _BYTES_TRABALHO_POR_PIXEL
+
+def iterar_janelas(src, orcamento_memoria=ORCAMENTO_MEMORIA_PADRAO):
+    """
+    Percorre as janelas de leitura da primeira banda respeitando o orçamento de memória.
+
+    Parâmetros:
+    - src: Dataset aberto com `rasterio.open`.
+    - orcamento_memoria: Memória máxima (em bytes) usada por janela.
+
+    Gera as janelas de `src.block_windows(1)`. Blocos que não cabem no orçamento
+    (por exemplo, rasters sem tiles com faixas gigantes) são divididos em faixas de linhas.
+    """
+    max_pixels = max(1, int(orcamento_memoria // bytes_por_pixel(src.dtypes[0])))
+
+    for _, janela in src.block_windows(1):
+        altura, largura = int(janela.height), int(janela.width)
+        if altura * largura <= max_pixels:
+            yield janela
+            continue
+
+        # Dividir o bloco em faixas de linhas que caibam no orçamento
+        linhas_por_faixa = max(1, max_pixels // largura)
+        for deslocamento in range(0, altura, linhas_por_faixa):
+            yield Window(janela.col_off, janela.row_off + deslocamento,
+                         largura, min(linhas_por_faixa, altura - deslocamento))
+
+def iterar_faixas(src, orcamento_memoria=ORCAMENTO_MEMORIA_PADRAO, bytes_pixel=None, janela=None):
+    """
+    Percorre o raster em faixas de linhas com a largura inteira, alinhadas à altura dos blocos.
+
+    Parâmetros:
+    - src: Dataset aberto com `rasterio.open`.
+    - orcamento_memoria: Memória máxima (em bytes) usada por faixa.
+    - bytes_pixel: Bytes por pixel usados na estimativa (padrão: `bytes_por_pixel` do dtype).
+    - janela: Percorre só esta janela, com a largura dela (padrão: o raster inteiro).
+
+    Útil quando o processamento precisa de linhas completas (rasterização, vizinhança entre linhas).
+    """
+    if bytes_pixel is None:
+        bytes_pixel = bytes_por_pixel(src.dtypes[0])
+    if janela is None:
+        janela = Window(0, 0, src.width, src.height)
+    col_off, row_off = int(janela.col_off), int(janela.row_off)
+    largura, fim = int(janela.width), int(janela.row_off) + int(janela.height)
+
+    altura_bloco = src.block_shapes[0][0]
+    linhas = max(1, int(orcamento_memoria // bytes_pixel) // max(1, largura))
+    if linhas >= altura_bloco:
+        linhas -= linhas % altura_bloco
+
+    # Os cortes caem em múltiplos de `linhas` contados do topo do raster (bordas de bloco)
+    for inicio in range(row_off - row_off % linhas, fim, linhas):
+        topo = max(inicio, row_off)
+        yield Window(col_off, topo, largura, min(inicio + linhas, fim) - topo)
+
+def memoria_disponivel():
+    """
+    Retorna a memória disponível no sistema, em bytes, ou None se não for possível saber.
+
+    Usa o MemAvailable do /proc/meminfo (Linux), que inclui o cache de páginas liberável;
+    nos demais sistemas, as páginas livres informadas por `os.sysconf`.
+    """
+    try:
+        with open("/proc/meminfo") as f:
+            for linha in f:
+                if linha.startswith("MemAvailable:"):
+                    return int(linha.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def escolher_leitura(largura, altura, dtype, bandas=1, orcamento_memoria=ORCAMENTO_MEMORIA_PADRAO, descricao=None):
+    """
+    Decide se uma janela pode ser lida inteira em memória ou se deve ser percorrida em partes.
+
+    Parâmetros:
+    - largura, altura: Dimensões da janela, em pixels.
+    - dtype: Tipo de dado das bandas.
+    - bandas: Número de bandas lidas (contando índices auxiliares, como o de zonas).
+    - orcamento_memoria: Memória máxima (em bytes) permitida para a leitura.
+    - descricao: Texto identificando a leitura no log (opcional).
+
+    A memória estimada é largura x altura x (bandas x bytes do dtype + bytes de trabalho), e o
+    limite é o orçamento ou metade da memória disponível, o que for menor. A decisão é registrada
+    no log. Retorna True para a leitura inteira em memória.
+    """
+    necessario = int(largura) * int(altura) * (bandas * np.dtype(dtype).itemsize + _BYTES_TRABALHO_POR_PIXEL)
+    limite = orcamento_memoria
+    disponivel = memoria_disponivel()
+    if disponivel is not None:
+        limite = min(limite, int(disponivel * _FRACAO_MEMORIA_DISPONIVEL))
+
+    em_memoria = necessario <= limite
+    mb = 1024 * 1024
+    print(f"INFO: {descricao + ': ' if descricao else ''}{necessario / mb:.1f} MB estimados para "
+          f"{int(largura)} x {int(altura)} pixels (limite de {limite / mb:.4g} MB); "
+          f"{'leitura inteira em memória' if em_memoria else 'leitura em janelas'}.")
+    return em_memoria
+
+def planejar_contagem(dtype, valor_min=None, valor_max=None):
+    """
+    Escolhe a estratégia de contagem de acordo com o tipo de dado e o intervalo de valores.
+
+    Parâmetros:
+    - dtype: Tipo de dado da banda (ex.: 'uint8', 'int16', 'float32').
+    - valor_min: Valor mínimo a ser contado (opcional).
+    - valor_max: Valor máximo a ser contado (opcional).
+
+    Retorna um dicionário com o plano de contagem. Rasters inteiros cujo intervalo
+    cabe em LIMITE_BINCOUNT usam `np.bincount` (O(N), uma passada); rasters de ponto
+    flutuante ou com intervalos muito largos usam a ordenação de `np.unique`.
+    """
+    dtype = np.dtype(dtype)
+    plano = {"dtype": dtype, "valor_min": valor_min, "valor_max": valor_max, "modo": "ordenacao"}
+
+    if not np.issubdtype(dtype, np.integer):
+        return plano
+
+    info = np.iinfo(dtype)
+    inicio = info.min if valor_min is None else max(info.min, int(np.ceil(valor_min)))
+    fim = info.max if valor_max is None else min(info.max, int(np.floor(valor_max)))
+
+    if fim - inicio + 1 <= LIMITE_BINCOUNT:
+        # Contagem direta no intervalo pedido
+        plano.update({"modo": "bincount", "inicio": inicio, "fim": fim})
+
+        # Para tipos pequenos (uint8, uint16, int16) é mais barato contar o tipo inteiro
+        # e recortar o intervalo do que montar uma máscara por bloco
+        if int(info.max) - int(info.min) + 1 <= LIMITE_BINCOUNT:
+            plano["deslocamento"] = int(info.min)
+            plano["tamanho"] = int(info.max) - int(info.min) + 1
+            plano["mascarar"] = False
+        else:
+            plano["deslocamento"] = inicio
+            plano["tamanho"] = max(0, fim - inicio + 1)
+            plano["mascarar"] = True
+
+    return plano
+
+def planejar_intervalos(limites, nodata=None):
+    """
+    Monta o plano de contagem por intervalos de valores (histograma), para rasters contínuos.
+
+    Parâmetros:
+    - limites: Limites dos intervalos, em ordem crescente. Cada intervalo inclui o limite
+      inferior e exclui o superior, exceto o último, que inclui os dois.
+    - nodata: Valor de nodata da banda, que não entra em nenhum intervalo (opcional).
+
+    O plano reaproveita a contagem direta do bincount sobre o índice do intervalo de cada
+    pixel; os valores retornados pela contagem são os rótulos dos intervalos.
+    """
+    limites = np.asarray(limites, dtype=np.float64)
+    if limites.size < 2 or not np.all(np.diff(limites) > 0):
+        raise ValueError("Os limites dos intervalos devem ter pelo menos dois valores, em ordem crescente.")
+
+    n = limites.size - 1
+    rotulos = [f"[{inferior:g}, {superior:g}{']' if i == n - 1 else ')'}"
+               for i, (inferior, superior) in enumerate(zip(limites[:-1], limites[1:]))]
+    return {"dtype": np.dtype(np.intp), "valor_min": None, "valor_max": None, "modo": "bincount",
+            "inicio": 0, "fim": n - 1, "deslocamento": 0, "tamanho": n, "mascarar": True,
+            "limites": limites, "nodata": nodata, "rotulos": np.array(rotulos)}
+
+def indices_intervalos(dados, plano):
+    """
+    Converte os valores no índice do intervalo de cada pixel; valores fora dos intervalos,
+    NaN e nodata recebem um índice fora do plano, descartado pela máscara da contagem.
+    """
+    limites = plano["limites"]
+    indices = np.searchsorted(limites, dados, side="right") - 1
+    indices[dados == limites[-1]] = limites.size - 2
+    if plano["nodata"] is not None:
+        indices[dados == plano["nodata"]] = -1
+    return indices
+
+def novo_acumulador(plano, n_zonas=0):
+    """
+    Cria o acumulador vazio correspondente ao plano de contagem.
+
+    O acumulador tem uma entrada por zona (0 = fora de qualquer zona). Sem zonas,
+    existe apenas a entrada 0, que representa o raster inteiro.
+    """
+    if plano["modo"] == "bincount":
+        return np.zeros((n_zonas + 1, max(0, plano["fim"] - plano["inicio"] + 1)), dtype=np.int64)
+    return [{} for _ in range(n_zonas + 1)]
+
+def _bincount(indices, pesos, tamanho):
+    """
+    Executa o np.bincount, com ou sem pesos inteiros, retornando contagens int64.
+    """
+    if pesos is None:
+        return np.bincount(indices, minlength=tamanho)
+    return np.rint(np.bincount(indices, weights=pesos, minlength=tamanho)).astype(np.int64)
+
+def _indices_bincount(dados, plano):
+    """
+    Desloca os valores para que o menor valor possível do plano vire o índice 0.
+    """
+    if plano["deslocamento"] != 0 or not np.can_cast(dados.dtype, np.intp):
+        return dados.astype(np.intp) - plano["deslocamento"]
+    return dados
+
+def _acumular_valores(acumulador_zona, dados, pesos, plano):
+    """
+    Soma a contagem de um conjunto de pixels (já filtrados) ao acumulador de uma zona.
+    """
+    if plano["modo"] == "bincount":
+        contagem = _bincount(_indices_bincount(dados, plano), pesos, plano["tamanho"])
+        inicio = plano["inicio"] - plano["deslocamento"]
+        acumulador_zona += contagem[inicio:inicio + acumulador_zona.size]
+        return
+
+    if pesos is None:
+        valores_bloco, contagem_bloco = np.unique(dados, return_counts=True)
+    else:
+        valores_bloco, inverso = np.unique(dados, return_inverse=True)
+        contagem_bloco = _bincount(inverso.ravel(), pesos, valores_bloco.size)
+
+    for valor, contagem in zip(valores_bloco, contagem_bloco):
+        acumulador_zona[valor] = acumulador_zona.get(valor, 0) + int(contagem)
+
+def acumular_bloco(acumulador, bloco, plano, pesos_linhas=None, zonas=None):
+    """
+    Soma ao acumulador a contagem de pixels de um bloco, já aplicando o filtro de intervalo.
+
+    Parâmetros:
+    - acumulador: Acumulador criado por `novo_acumulador`.
+    - bloco: Array 2D lido do raster.
+    - plano: Plano de contagem criado por `planejar_contagem`.
+    - pesos_linhas: Peso inteiro de cada linha do bloco (rasters geográficos). Sem pesos,
+      cada pixel conta 1.
+    - zonas: Array 2D, alinhado ao bloco, com o id da zona de cada pixel (opcional).
+
+    Retorna o acumulador atualizado.
+    """
+    pesos = None
+    if pesos_linhas is not None:
+        # O bincount com pesos soma em float64: dividir o bloco mantém as somas
+        # parciais abaixo de 2**53, onde a soma de inteiros continua exata
+        altura, largura = bloco.shape
+        linhas_max = max(1, _LIMITE_SOMA_EXATA // max(1, largura * int(pesos_linhas.max(initial=1))))
+        if altura > linhas_max:
+            for inicio in range(0, altura, linhas_max):
+                fim = inicio + linhas_max
+                acumulador = acumular_bloco(acumulador, bloco[inicio:fim], plano, pesos_linhas[inicio:fim],
+                                            None if zonas is None else zonas[inicio:fim])
+            return acumulador
+        pesos = np.repeat(pesos_linhas, largura)
+
+    if plano["modo"] == "bincount" and acumulador.shape[1] == 0:
+        return acumulador
+
+    dados = bloco.ravel()
+    zonas = None if zonas is None else zonas.ravel()
+    if "limites" in plano:
+        dados = indices_intervalos(dados, plano)
+
+    # Filtrar o intervalo de valores antes de contar
+    dentro = None
+    if plano["modo"] == "bincount":
+        if plano["mascarar"]:
+            dentro = (dados >= plano["inicio"]) & (dados <= plano["fim"])
+    elif plano["valor_min"] is not None or plano["valor_max"] is not None:
+        dentro = np.ones(dados.shape, dtype=bool)
+        if plano["valor_min"] is not None:
+            dentro &= dados >= plano["valor_min"]
+        if plano["valor_max"] is not None:
+            dentro &= dados <= plano["valor_max"]
+
+    if dentro is not None:
+        dados = dados[dentro]
+        pesos = None if pesos is None else pesos[dentro]
+        zonas = None if zonas is None else zonas[dentro]
+
+    if zonas is None:
+        _acumular_valores(acumulador[0], dados, pesos, plano)
+        return acumulador
+
+    # Zonas presentes no bloco (a maioria dos blocos cai inteira em uma só zona)
+    presentes = np.flatnonzero(np.bincount(zonas, minlength=1))
+    if presentes.size == 1:
+        _acumular_valores(acumulador[presentes[0]], dados, pesos, plano)
+        return acumulador
+
+    if plano["modo"] == "bincount":
+        # Histograma conjunto (zona, valor) em um único bincount, com as zonas
+        # presentes renumeradas de forma compacta
+        compacta = np.zeros(int(presentes[-1]) + 1, dtype=np.intp)
+        compacta[presentes] = np.arange(presentes.size)
+        indices = compacta[zonas] * plano["tamanho"] + _indices_bincount(dados, plano)
+        contagem = _bincount(indices, pesos, presentes.size * plano["tamanho"])
+        inicio = plano["inicio"] - plano["deslocamento"]
+        acumulador[presentes] += contagem.reshape(presentes.size, plano["tamanho"])[:, inicio:inicio + acumulador.shape[1]]
+        return acumulador
+
+    for zona in presentes:
+        na_zona = zonas == zona
+        _acumular_valores(acumulador[zona], dados[na_zona], None if pesos is None else pesos[na_zona], plano)
+    return acumulador
+
+def finalizar_contagem(acumulador, plano, zona=0):
+    """
+    Converte o acumulador de uma zona em uma tupla (valores, contagens), em ordem crescente de valor.
+    """
+    if plano["modo"] == "bincount":
+        indices = np.flatnonzero(acumulador[zona])
+        if "rotulos" in plano:
+            return plano["rotulos"][indices], acumulador[zona][indices]
+        valores = (indices + plano["inicio"]).astype(plano["dtype"])
+        return valores, acumulador[zona][indices]
+
+    contagens = acumulador[zona]
+    valores = np.array(sorted(contagens), dtype=plano["dtype"])
+    return valores, np.array([contagens[valor] for valor in valores], dtype=np.int64)
+
+def combinar_acumuladores(acumuladores, plano, n_zonas=0):
+    """
+    Soma acumuladores parciais (de faixas ou processos diferentes) em um único acumulador.
+    """
+    total = novo_acumulador(plano, n_zonas)
+    for parcial in acumuladores:
+        if plano["modo"] == "bincount":
+            total += parcial
+            continue
+        for total_zona, parcial_zona in zip(total, parcial):
+            for valor, contagem in parcial_zona.items():
+                total_zona[valor] = total_zona.get(valor, 0) + contagem
+    return total
+
+def area_pixel_por_linha(src):
+    """
+    Calcula a área elipsoidal, em metros quadrados, dos pixels de cada linha de um raster geográfico.
+
+    Usa a área exata da célula delimitada por dois paralelos e dois meridianos no elipsoide
+    do CRS do raster, dispensando a reprojeção para um CRS de áreas iguais.
+
+    Retorna um array com uma área por linha do raster.
+    """
+    transform = src.transform
+    if transform.b != 0 or transform.d != 0:
+        raise ValueError(f"Rasters rotacionados não são suportados no cálculo geodésico: {src.name}")
+
+    crs = CRS.from_wkt(src.crs.to_wkt())
+    semi_eixo_maior = crs.ellipsoid.semi_major_metre
+    achatamento = 1 / crs.ellipsoid.inverse_flattening if crs.ellipsoid.inverse_flattening else 0.0
+    semi_eixo_menor = semi_eixo_maior * (1 - achatamento)
+    e2 = achatamento * (2 - achatamento)
+
+    # Converter as coordenadas do CRS (normalmente graus) para radianos
+    radianos = crs.axis_info[0].unit_conversion_factor
+    latitudes = np.clip((transform.f + transform.e * np.arange(src.height + 1)) * radianos, -np.pi / 2, np.pi / 2)
+    seno = np.sin(latitudes)
+
+    # Área do elipsoide entre o equador e cada latitude (por radiano de longitude), a menos de b²/2
+    if e2 > 0:
+        e = np.sqrt(e2)
+        q = seno / (1 - e2 * seno ** 2) + np.log((1 + e * seno) / (1 - e * seno)) / (2 * e)
+    else:
+        q = 2 * seno
+
+    return np.abs(transform.a * radianos) * semi_eixo_menor ** 2 / 2 * np.abs(np.diff(q))
+
+def definir_area_pixel(src, pixel_area=None, informar=True):
+    """
+    Define como a área dos pixels será calculada para o raster.
+
+    Parâmetros:
+    - src: Dataset aberto com `rasterio.open`.
+    - pixel_area: Área de cada pixel informada pelo usuário (opcional).
+    - informar: Se False, não avisa que o CRS é geográfico (ex.: nos níveis do modo aproximado).
+
+    Retorna uma tupla (pesos_linhas, unidade). Com área fixa (informada ou vinda da
+    resolução de um CRS projetado), `pesos_linhas` é None e `unidade` é a área do pixel.
+    Em CRS geográfico, `pesos_linhas` traz a área de cada linha como inteiro e `unidade`
+    é a área, em m², representada por 1 unidade de peso.
+    """
+    if pixel_area is not None:
+        return None, pixel_area
+
+    if src.crs is not None and src.crs.is_geographic:
+        areas_linhas = area_pixel_por_linha(src)
+        maior_area = float(areas_linhas.max(initial=0))
+        if maior_area <= 0:
+            return None, 0.0
+
+        unidade = 10.0 ** (np.ceil(np.log10(maior_area)) - _DIGITOS_PESO)
+        if informar:
+            print(f"INFO: CRS geográfico detectado em {src.name}; usando a área elipsoidal de cada linha.")
+        return np.rint(areas_linhas / unidade).astype(np.int64), unidade
+
+    return None, src.res[0] * src.res[1]  # Área de cada pixel em unidades do CRS
+
+def pesos_da_janela(pesos_linhas, janela):
+    """
+    Recorta os pesos por linha correspondentes às linhas de uma janela.
+    """
+    if pesos_linhas is None:
+        return None
+    inicio = int(janela.row_off)
+    return pesos_linhas[inicio:inicio + int(janela.height)]
+
+def blocos_da_janela(src, janela):
+    """
+    Divide uma janela qualquer nas partes que caem em cada bloco de `src`, linha de blocos por linha de blocos.
+    """
+    altura_bloco, largura_bloco = src.block_shapes[0]
+    linha_ini, col_ini = int(janela.row_off), int(janela.col_off)
+    linha_fim, col_fim = linha_ini + int(janela.height), col_ini + int(janela.width)
+
+    for linha_bloco in range(linha_ini - linha_ini % altura_bloco, linha_fim, altura_bloco):
+        for col_bloco in range(col_ini - col_ini % largura_bloco, col_fim, largura_bloco):
+            linha, col = max(linha_bloco, linha_ini), max(col_bloco, col_ini)
+            yield Window(col, linha, min(col_bloco + largura_bloco, col_fim) - col,
+                         min(linha_bloco + altura_bloco, linha_fim) - linha)
+
+def valor_bloco_vazio(src):
+    """
+    Retorna o valor que o GDAL devolve na leitura de um bloco não gravado: o nodata da
+    banda ou 0. Retorna None se esse valor for NaN, caso em que nenhum bloco é pulado.
+    """
+    valor = src.nodata if src.nodata is not None else 0
+    return None if np.isnan(valor) else valor
+
+def bloco_esparso(src, janela):
+    """
+    Verifica, sem decodificar, se o bloco que contém a janela não está gravado no arquivo.
+
+    Em um GeoTIFF criado com SPARSE_OK, os blocos vazios não ocupam espaço e o GDAL não
+    informa o deslocamento deles no arquivo. Vale para janelas contidas em um único bloco,
+    como as de `iterar_janelas`.
+    """
+    if src.driver != "GTiff":
+        return False
+    altura_bloco, largura_bloco = src.block_shapes[0]
+    linha, coluna = int(janela.row_off) // altura_bloco, int(janela.col_off) // largura_bloco
+    return src.get_tag_item(f"BLOCK_OFFSET_{coluna}_{linha}", "TIFF", bidx=1) is None
+
+def ler_janela(src, janela, zonas_src=None, ignorar_zona_zero=False, posicao=None):
+    """
+    Lê uma janela do raster (e do índice de zonas), pulando os blocos que não precisam ser decodificados.
+
+    Parâmetros:
+    - src: Dataset aberto com `rasterio.open`.
+    - janela: Janela de `iterar_janelas`.
+    - zonas_src: Dataset com o índice de zonas, na mesma grade de `src` (opcional).
+    - ignorar_zona_zero: Se True, não lê do raster as janelas inteiramente fora das zonas (id 0).
+    - posicao: Posição do anel de buffers da leitura antecipada (ver `leitura_antecipada`), opcional.
+
+    Retorna uma tupla (bloco, zonas). `bloco` é None se o bloco do raster não foi lido
+    (não gravado no arquivo ou fora das zonas); `zonas` é None sem índice de zonas.
+    """
+    forma = (int(janela.height), int(janela.width))
+    zonas = None
+    if zonas_src is not None:
+        saida = None if posicao is None else leitura_antecipada.buffer_do_anel(posicao, "zonas", forma,
+                                                                                 zonas_src.dtypes[0])
+        zonas = zonas_src.read(1, window=janela, out=saida)
+        if ignorar_zona_zero and not zonas.any():
+            return None, zonas
+
+    if valor_bloco_vazio(src) is not None and bloco_esparso(src, janela):
+        return None, zonas
+    saida = None if posicao is None else leitura_antecipada.buffer_do_anel(posicao, "raster", forma, src.dtypes[0])
+    return src.read(1, window=janela, out=saida), zonas
+
+def acumular_janela(acumulador, src, janela, plano, pesos_linhas=None, zonas_src=None, ignorar_zona_zero=False,
+                    lido=None):
+    """
+    Lê uma janela do raster (e do índice de zonas) e soma a sua contagem ao acumulador.
+
+    Parâmetros:
+    - acumulador, plano: Ver `acumular_bloco`.
+    - src: Dataset aberto com `rasterio.open`.
+    - janela: Janela de `iterar_janelas`.
+    - pesos_linhas: Peso inteiro de cada linha do raster (opcional).
+    - zonas_src: Dataset com o índice de zonas, na mesma grade de `src` (opcional).
+    - ignorar_zona_zero: Se True, as janelas inteiramente fora das zonas (id 0) não são
+      lidas do raster; a contagem da zona 0 fica incompleta.
+    - lido: Tupla (bloco, zonas) já lida por `ler_janela` (ex.: na leitura antecipada), opcional.
+
+    Retorna uma tupla (acumulador, pulado), com `pulado` True se o bloco do raster não foi decodificado.
+    """
+    bloco, zonas = lido if lido is not None else ler_janela(src, janela, zonas_src, ignorar_zona_zero)
+    pesos = pesos_da_janela(pesos_linhas, janela)
+    if bloco is not None:
+        return acumular_bloco(acumulador, bloco, plano, pesos, zonas), False
+    if ignorar_zona_zero and zonas is not None and not zonas.any():
+        return acumulador, True
+
+    # Bloco não gravado: todos os pixels valem o nodata
+    vazio = valor_bloco_vazio(src)
+    altura, largura = int(janela.height), int(janela.width)
+    if zonas is not None:
+        bloco = np.full((altura, largura), vazio, dtype=src.dtypes[0])
+        return acumular_bloco(acumulador, bloco, plano, pesos, zonas), True
+
+    # Sem zonas, basta uma coluna com o peso de cada linha inteira
+    pesos = np.full(altura, largura, dtype=np.int64) if pesos is None else pesos * largura
+    bloco = np.full((altura, 1), vazio, dtype=src.dtypes[0])
+    return acumular_bloco(acumulador, bloco, plano, pesos), True
+
+def dividir_em_faixas(janelas, n_faixas):
+    """
+    Divide a lista de janelas em até `n_faixas` grupos contíguos (faixas de blocos).
+    """
+    n_faixas = max(1, min(n_faixas, len(janelas)))
+    limites = np.linspace(0, len(janelas), n_faixas + 1).astype(int)
+    return [janelas[inicio:fim] for inicio, fim in zip(limites[:-1], limites[1:])]
+
+def _contar_faixa(raster_path, janelas, plano, pesos_linhas, zonas_path=None, n_zonas=0, ignorar_zona_zero=False):
+    """
+    Conta os pixels de uma faixa de janelas em um processo separado.
+
+    Cada processo abre o seu próprio dataset, já que handles do rasterio não podem ser
+    compartilhados entre processos. As janelas chegam como tuplas (col_off, row_off, largura, altura).
+
+    Retorna uma tupla (acumulador, blocos_pulados).
+    """
+    acumulador = novo_acumulador(plano, n_zonas)
+    pulados = 0
+    with rasterio.open(raster_path) as src:
+        zonas_src = rasterio.open(zonas_path) if zonas_path else None
+        try:
+            for col_off, row_off, largura, altura in janelas:
+                acumulador, pulado = acumular_janela(acumulador, src, Window(col_off, row_off, largura, altura),
+                                                     plano, pesos_linhas, zonas_src, ignorar_zona_zero)
+                pulados += pulado
+        finally:
+            if zonas_src is not None:
+                zonas_src.close()
+    return acumulador, pulados
+
+def contar_janelas(raster_path, janelas, plano, pesos_linhas=None, workers=1, zonas_path=None, n_zonas=0,
+                   ignorar_zona_zero=False):
+    """
+    Conta os pixels de uma lista de janelas, em série ou distribuindo faixas de janelas
+    entre `workers` processos, e reduz os acumuladores parciais.
+
+    Parâmetros:
+    - raster_path: Caminho para o raster.
+    - janelas: Lista de tuplas (col_off, row_off, largura, altura).
+    - plano, pesos_linhas: Ver `acumular_bloco`.
+    - workers: Número de processos.
+    - zonas_path, n_zonas, ignorar_zona_zero: Índice de zonas (ver `contar_pixels_por_zona`), opcional.
+
+    Retorna uma tupla (acumulador, blocos_pulados).
+    """
+    if workers <= 1:
+        return _contar_faixa(raster_path, janelas, plano, pesos_linhas, zonas_path, n_zonas, ignorar_zona_zero)
+
+    faixas = dividir_em_faixas(janelas, workers * _FAIXAS_POR_PROCESSO)
+    n = len(faixas)
+
+    # Usar "spawn" para não herdar o estado interno do GDAL do processo pai
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=contexto) as executor:
+        parciais = list(executor.map(_contar_faixa, [raster_path] * n, faixas, [plano] * n, [pesos_linhas] * n,
+                                     [zonas_path] * n, [n_zonas] * n, [ignorar_zona_zero] * n))
+    acumulador = combinar_acumuladores([parcial for parcial, _ in parciais], plano, n_zonas)
+    return acumulador, sum(pulados for _, pulados in parciais)
+
+def _contar_em_paralelo(src, plano, orcamento_memoria, workers, pesos_linhas, zonas_path=None, n_zonas=0,
+                        ignorar_zona_zero=False):
+    """
+    Distribui as faixas de blocos entre `workers` processos e reduz os acumuladores parciais.
+
+    O orçamento de memória é dividido entre os processos, de modo que o pico total
+    continue limitado por `orcamento_memoria`.
+
+    Retorna uma tupla (acumulador, blocos_pulados, total_blocos).
+    """
+    janelas = [(int(j.col_off), int(j.row_off), int(j.width), int(j.height))
+               for j in iterar_janelas(src, orcamento_memoria // workers)]
+    acumulador, pulados = contar_janelas(src.name, janelas, plano, pesos_linhas, workers, zonas_path, n_zonas,
+                                         ignorar_zona_zero)
+    return acumulador, pulados, len(janelas)
+
+def contar_pixels_por_zona(src, zonas_src, n_zonas, valor_min=None, valor_max=None,
+                           orcamento_memoria=ORCAMENTO_MEMORIA_PADRAO, workers=1, pesos_linhas=None,
+                           ignorar_zona_zero=False, limites=None):
+    """
+    Conta os pixels de cada valor em cada zona, em uma única passada sobre o raster.
+
+    Em série, rasters que cabem no orçamento (ver `escolher_leitura`) são lidos de uma vez;
+    os demais são percorridos bloco a bloco.
+
+    Parâmetros:
+    - src: Dataset aberto com `rasterio.open`.
+    - zonas_src: Dataset, na mesma grade de `src`, com o id da zona de cada pixel (0 = sem zona),
+      ou None para contar o raster inteiro como uma zona só.
+    - n_zonas: Maior id de zona.
+    - valor_min, valor_max, orcamento_memoria, workers, pesos_linhas: Ver `contar_pixels`.
+    - ignorar_zona_zero: Se True, não lê os blocos inteiramente fora das zonas; a contagem
+      da zona 0 fica incompleta (use quando ela for descartada).
+    - limites: Limites dos intervalos do modo histograma (ver `planejar_intervalos`), opcional.
+
+    Retorna uma lista, indexada pelo id da zona, de tuplas (valores, contagens).
+    """
+    if limites is not None:
+        plano = planejar_intervalos(limites, src.nodata)
+    else:
+        plano = planejar_contagem(src.dtypes[0], valor_min, valor_max)
+    if zonas_src is None:
+        n_zonas = 0
+
+    if workers > 1:
+        zonas_path = zonas_src.name if zonas_src is not None else None
+        acumulador, pulados, total = _contar_em_paralelo(src, plano, orcamento_memoria, workers, pesos_linhas,
+                                                         zonas_path, n_zonas, ignorar_zona_zero)
+    elif escolher_leitura(src.width, src.height, src.dtypes[0], 1 if zonas_src is None else 2, orcamento_memoria,
+                          src.name):
+        # Cabe no orçamento: uma única leitura evita o custo por bloco
+        zonas = zonas_src.read(1) if zonas_src is not None else None
+        acumulador = acumular_bloco(novo_acumulador(plano, n_zonas), src.read(1), plano, pesos_linhas, zonas)
+        pulados, total = 0, 1
+    else:
+        # Os blocos seguintes são lidos em threads enquanto o atual é contado; o orçamento
+        # é dividido entre as posições do anel de buffers da leitura antecipada
+        antecipacao = leitura_antecipada.ANTECIPACAO_PADRAO
+        janelas = iterar_janelas(src, orcamento_memoria // (antecipacao + 1))
+        if type(src) is rasterio.io.DatasetReader:
+            caminhos, opcoes = [src.name], [src.options]
+            if zonas_src is not None:
+                caminhos, opcoes = caminhos + [zonas_src.name], opcoes + [zonas_src.options]
+
+            def ler(fontes, janela, posicao):
+                return ler_janela(fontes[0], janela, fontes[-1] if zonas_src else None, ignorar_zona_zero, posicao)
+
+            leituras = leitura_antecipada.iterar_leituras(caminhos, janelas, ler, antecipacao, opcoes)
+        else:
+            # Datasets que não podem ser reabertos pelo caminho (ex.: WarpedVRT) são lidos aqui mesmo
+            leituras = ((janela, None) for janela in janelas)
+
+        acumulador = novo_acumulador(plano, n_zonas)
+        pulados = total = 0
+        for janela, lido in leituras:
+            acumulador, pulado = acumular_janela(acumulador, src, janela, plano, pesos_linhas, zonas_src,
+                                                 ignorar_zona_zero, lido)
+            pulados += pulado
+            total += 1
+
+    if pulados:
+        print(f"INFO: {pulados} de {total} blocos de {src.name} pulados sem decodificar (vazios ou fora das zonas).")
+
+    return [finalizar_contagem(acumulador, plano, zona) for zona in range(n_zonas + 1)]
+
+def contar_pixels(src, valor_min=None, valor_max=None, orcamento_memoria=ORCAMENTO_MEMORIA_PADRAO, workers=1,
+                  pesos_linhas=None, limites=None):
+    """
+    Conta os pixels de cada valor da primeira banda, bloco a bloco.
+
+    Parâmetros:
+    - src: Dataset aberto com `rasterio.open`.
+    - valor_min: Valor mínimo a ser contado (opcional).
+    - valor_max: Valor máximo a ser contado (opcional).
+    - orcamento_memoria: Memória máxima (em bytes) usada por janela.
+    - workers: Número de processos. Com mais de um, as faixas de blocos são contadas em paralelo.
+    - pesos_linhas: Peso inteiro de cada linha do raster (ver `definir_area_pixel`), opcional.
+    - limites: Limites dos intervalos; com eles, conta pixels por intervalo em vez de por valor.
+
+    Retorna uma tupla (valores, contagens) com os valores (ou rótulos dos intervalos) encontrados
+    em ordem crescente. Com pesos, as contagens são a soma dos pesos. Em ambos os casos são
+    inteiras, portanto o resultado paralelo é idêntico ao serial.
+    """
+    return contar_pixels_por_zona(src, None, 0, valor_min, valor_max, orcamento_memoria, workers, pesos_linhas,
+                                  limites=limites)[0]
+
+def minimo_maximo(src, orcamento_memoria=ORCAMENTO_MEMORIA_PADRAO):
+    """
+    Calcula, em uma passada bloco a bloco, o menor e o maior valor válido da primeira banda
+    (sem nodata e NaN). Blocos não gravados são pulados sem leitura.
+
+    Retorna uma tupla (minimo, maximo), ou (None, None) se não houver valores válidos.
+    """
+    minimo, maximo = np.inf, -np.inf
+    flutuante = np.issubdtype(np.dtype(src.dtypes[0]), np.floating)
+    for janela in iterar_janelas(src, orcamento_memoria):
+        if bloco_esparso(src, janela):
+            continue
+        dados = src.read(1, window=janela)
+        validos = ~np.isnan(dados) if flutuante else np.ones(dados.shape, dtype=bool)
+        if src.nodata is not None:
+            validos &= dados != src.nodata
+        if validos.any():
+            dados = dados[validos]
+            minimo, maximo = min(minimo, float(dados.min())), max(maximo, float(dados.max()))
+
+    if minimo > maximo:
+        return None, None
+    return minimo, maximo
+
+def limites_intervalos(src, intervalos, valor_min=None, valor_max=None,
+                       orcamento_memoria=ORCAMENTO_MEMORIA_PADRAO):
+    """
+    Define os limites dos intervalos do modo histograma.
+
+    Parâmetros:
+    - src: Dataset aberto com `rasterio.open`.
+    - intervalos: Número de intervalos de mesma largura, ou a lista dos limites.
+    - valor_min, valor_max: Extremos dos intervalos de mesma largura. Os que faltarem saem
+      de uma passada exata de mínimo e máximo pelo raster (`minimo_maximo`).
+
+    Retorna o array de limites.
+    """
+    if not np.isscalar(intervalos):
+        return np.asarray(intervalos, dtype=np.float64)
+
+    if valor_min is None or valor_max is None:
+        minimo, maximo = minimo_maximo(src, orcamento_memoria)
+        if minimo is None:
+            raise ValueError(f"O raster não tem valores válidos para definir os intervalos: {src.name}")
+        print(f"INFO: Valores de {src.name} entre {minimo:g} e {maximo:g}.")
+        valor_min = minimo if valor_min is None else valor_min
+        valor_max = maximo if valor_max is None else valor_max
+    if valor_max <= valor_min:
+        valor_max = valor_min + 1
+    return np.linspace(valor_min, valor_max, int(intervalos) + 1)
+
+def areas_de_contagens(valores, contagens, unidade):
+    """
+    Converte contagens (ou pesos) em um dicionário {valor: (area_m2, area_ha)}.
+    """
+    areas_m2 = contagens * unidade
+    areas_ha = areas_m2 / 10000
+    return dict(zip(valores, zip(areas_m2, areas_ha)))
+
+def construir_overviews(raster_path, fatores=FATORES_OVERVIEW_PADRAO):
+    """
+    Constrói overviews internas no raster, reamostradas pelo vizinho mais próximo.
+
+    Com o vizinho mais próximo, cada pixel da overview é uma amostra sistemática do raster
+    original, que é o que o modo aproximado pressupõe; 'average' ou 'mode' enviesariam as classes.
+    """
+    with rasterio.open(raster_path, "r+") as src:
+        src.build_overviews(list(fatores), Resampling.nearest)
+        src.update_tags(ns="rio_overview", resampling="nearest")
+    print(f"INFO: Overviews {list(fatores)} construídas em {raster_path}")
+
+def niveis_aproximacao(src):
+    """
+    Lista os níveis de leitura reduzida do raster, do mais grosseiro ao mais fino.
+
+    Retorna tuplas (fator, overview_level): `overview_level` é o índice da overview no
+    arquivo, ou None para uma leitura decimada quando o raster não tem overviews.
+    """
+    fatores = src.overviews(1)
+    if fatores:
+        niveis = [(fator, i) for i, fator in enumerate(fatores)]
+    else:
+        niveis = [(fator, None) for fator in FATORES_OVERVIEW_PADRAO if fator < min(src.width, src.height)]
+    return sorted(niveis, reverse=True)
+
+@contextmanager
+def abrir_nivel(src, fator, overview_level=None):
+    """
+    Abre um nível reduzido do raster como dataset: a overview do arquivo ou, sem overviews,
+    uma leitura decimada pelo vizinho mais próximo (WarpedVRT na mesma extensão).
+    """
+    if overview_level is not None:
+        with rasterio.open(src.name, overview_level=overview_level) as nivel:
+            yield nivel
+        return
+
+    largura, altura = max(1, src.width // fator), max(1, src.height // fator)
+    transform = src.transform * Affine.scale(src.width / largura, src.height / altura)
+    with WarpedVRT(src, crs=src.crs, transform=transform, width=largura, height=altura,
+                   resampling=Resampling.nearest) as nivel:
+        yield nivel
+
+def limites_erro(contagens, total, n_amostras):
+    """
+    Calcula o limite de erro (95% de confiança) das contagens estimadas por amostragem.
+
+    Cada pixel do nível reduzido é tratado como uma amostra do raster; a fração p de cada
+    classe tem erro padrão sqrt(p(1 - p) / n), uma aproximação conservadora para a amostra
+    sistemática de uma overview.
+
+    Retorna os limites na mesma unidade das contagens.
+    """
+    fracoes = contagens / total
+    return _Z_CONFIANCA * np.sqrt(fracoes * (1 - fracoes) / n_amostras) * total
+
+def estimar_contagens(src, tolerancia, pixel_area=None, valor_min=None, valor_max=None,
+                      orcamento_memoria=ORCAMENTO_MEMORIA_PADRAO, limites=None):
+    """
+    Estima as contagens a partir do nível reduzido mais grosseiro que atende à tolerância.
+
+    Parâmetros:
+    - src: Dataset aberto com `rasterio.open`.
+    - tolerancia: Erro relativo máximo aceito na área de cada classe (ex.: 0.01 para 1%),
+      considerando as classes com pelo menos FRACAO_MINIMA_APROX da área.
+    - pixel_area, valor_min, valor_max, orcamento_memoria: Ver `calcular_area_manchas`.
+    - limites: Limites dos intervalos do modo histograma (opcional).
+
+    Começa pelo nível mais grosseiro e, com as frações observadas, salta direto para o
+    nível com pixels suficientes. Retorna uma tupla (valores, contagens, erros, unidade, descricao),
+    ou None se nenhum nível reduzido bastar.
+    """
+    necessarios = 0
+    for fator, overview_level in niveis_aproximacao(src):
+        if (src.width // fator) * (src.height // fator) < necessarios:
+            continue
+
+        with abrir_nivel(src, fator, overview_level) as nivel:
+            if pixel_area is not None:
+                pesos_linhas, unidade = None, pixel_area * (src.width / nivel.width) * (src.height / nivel.height)
+            else:
+                pesos_linhas, unidade = definir_area_pixel(nivel, informar=False)
+            valores, contagens = contar_pixels(nivel, valor_min, valor_max, orcamento_memoria, 1, pesos_linhas,
+                                               limites)
+            n_amostras = nivel.width * nivel.height
+            total = n_amostras if pesos_linhas is None else int(pesos_linhas.sum()) * nivel.width
+
+        erros = limites_erro(contagens, total, n_amostras)
+        fracoes = contagens / total
+        relevantes = fracoes >= FRACAO_MINIMA_APROX
+        if not relevantes.any():
+            continue
+
+        descricao = f"{'overview' if overview_level is not None else 'leitura decimada'} 1:{fator}, {n_amostras} pixels"
+        if (erros[relevantes] / contagens[relevantes]).max() <= tolerancia:
+            return valores, contagens, erros, unidade, descricao
+
+        # Pixels necessários para que a pior classe relevante atenda à tolerância
+        p = fracoes[relevantes]
+        necessarios = max(necessarios, int(np.ceil((_Z_CONFIANCA ** 2 * (1 - p) / (p * tolerancia ** 2)).max())))
+    return None
+
+def calcular_area_manchas(raster_path, pixel_area=None, valor_min=None, valor_max=None,
+                          orcamento_memoria=ORCAMENTO_MEMORIA_PADRAO, workers=1, tolerancia=None,
+                          construir_overviews_ausentes=False, intervalos=None):
+    """
+    Calcula a área das manchas no raster percorrendo-o em blocos.
+
+    Parâmetros:
+    - raster_path: Caminho para o raster.
+    - pixel_area: Área de cada pixel. Se não for informada, usa a resolução do raster
+      (CRS projetado) ou a área elipsoidal de cada linha (CRS geográfico).
+    - valor_min: Valor mínimo do intervalo de manchas (opcional).
+    - valor_max: Valor máximo do intervalo de manchas (opcional).
+    - orcamento_memoria: Memória máxima (em bytes) usada por janela.
+    - workers: Número de processos usados na contagem.
+    - tolerancia: Se informada, estima as áreas a partir de uma overview (ou leitura decimada)
+      com erro relativo até a tolerância (ex.: 0.01), mostrando os limites de erro.
+    - construir_overviews_ausentes: No modo aproximado, constrói as overviews antes, se o
+      raster não tiver nenhuma.
+    - intervalos: Modo histograma, para rasters contínuos: número de intervalos de mesma
+      largura (entre valor_min e valor_max, ou o mínimo e o máximo do raster) ou a lista dos limites.
+
+    Retorna um dicionário {valor: (area_m2, area_ha)}; no modo histograma, as chaves são
+    os rótulos dos intervalos (ex.: "[0, 10)").
+    """
+    limites = None
+    if intervalos is not None:
+        with rasterio.open(raster_path) as src:
+            limites = limites_intervalos(src, intervalos, valor_min, valor_max, orcamento_memoria)
+
+    if tolerancia is not None:
+        with rasterio.open(raster_path) as src:
+            sem_overviews = not src.overviews(1)
+        if sem_overviews and construir_overviews_ausentes:
+            construir_overviews(raster_path)
+        elif sem_overviews:
+            print(f"AVISO: {raster_path} não tem overviews; usando leitura decimada "
+                  "(use --construir-overviews para acelerar as próximas execuções).")
+
+        with rasterio.open(raster_path) as src:
+            estimativa = estimar_contagens(src, tolerancia, pixel_area, valor_min, valor_max, orcamento_memoria,
+                                           limites)
+        if estimativa is not None:
+            valores, contagens, erros, unidade, descricao = estimativa
+            print(f"INFO: Áreas estimadas de {raster_path} ({descricao}); limites de erro com 95% de confiança:")
+            for valor, contagem, erro in zip(valores, contagens, erros):
+                print(f"  Mancha {valor}: {contagem * unidade / 10000:.2f} ha ± {erro * unidade / 10000:.2f} ha "
+                      f"({erro / contagem:.2%})")
+            return areas_de_contagens(valores, contagens, unidade)
+        print(f"INFO: Nenhum nível reduzido atende à tolerância de {tolerancia:.2%}; lendo a resolução completa.")
+
+    with rasterio.open(raster_path) as src:
+        pesos_linhas, unidade = definir_area_pixel(src, pixel_area)
+        valores, contagens = contar_pixels(src, valor_min, valor_max, orcamento_memoria, workers, pesos_linhas,
+                                           limites)
+
+    # Calcular a área para cada valor (mancha)
+    return areas_de_contagens(valores, contagens, unidade)
+
+def adicionar_argumentos_motor(parser):
+    """
+    Adiciona ao parser os argumentos opcionais comuns a todos os scripts de área.
+    """
+    parser.add_argument('--memoria-mb', type=float, default=ORCAMENTO_MEMORIA_PADRAO / (1024 * 1024),
+                        help='Orçamento de memória por janela de leitura, em MB (padrão: 256).')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Número de processos para contar os blocos em paralelo (padrão: 1).')
+    return parser
+
+def adicionar_argumentos_aproximacao(parser):
+    """
+    Adiciona ao parser os argumentos do modo aproximado (estimativa por overviews).
+    """
+    parser.add_argument('--approx', type=float, default=None, metavar='TOLERANCIA',
+                        help='Estima as áreas a partir de overviews, com erro relativo até TOLERANCIA (ex.: 0.01).')
+    parser.add_argument('--construir-overviews', action='store_true',
+                        help='No modo --approx, constrói as overviews (vizinho mais próximo) se o raster não tiver.')
+    return parser
+
+def opcoes_aproximacao(args):
+    """
+    Converte os argumentos do modo aproximado nos parâmetros de `calcular_area_manchas`.
+    """
+    return {"tolerancia": args.approx, "construir_overviews_ausentes": args.construir_overviews}
+
+def adicionar_argumentos_intervalos(parser):
+    """
+    Adiciona ao parser os argumentos do modo histograma (intervalos de valores).
+    """
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument('--intervalos', type=int, default=None, metavar='N',
+                       help='Conta a área por N intervalos de mesma largura (rasters contínuos). Sem valor mínimo e '
+                            'máximo, os extremos saem de uma passada exata pelo raster.')
+    grupo.add_argument('--limites-intervalos', type=float, nargs='+', default=None, metavar='LIMITE',
+                       help='Conta a área pelos intervalos definidos por estes limites, em ordem crescente.')
+    return parser
+
+def opcoes_intervalos(args):
+    """
+    Converte os argumentos do modo histograma nos parâmetros de `calcular_area_manchas`.
+    """
+    return {"intervalos": args.limites_intervalos if args.limites_intervalos else args.intervalos}
+
+def opcoes_motor(args):
+    """
+    Converte os argumentos comuns do parser nos parâmetros do motor de área.
+    """
+    return {"orcamento_memoria": int(args.memoria_mb * 1024 * 1024), "workers": args.workers}
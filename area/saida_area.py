@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Camada de saída compartilhada dos scripts de área.
+
+Os resultados são montados como colunas (arrays) direto das contagens, sem criar um
+DataFrame por linha, e gravados em CSV, Parquet ou em uma tabela SQLite com uma
+chamada vetorizada por lote. A saída é aberta uma vez e recebe os lotes conforme
+cada raster é processado, o que permite anexar resultados a um mesmo conjunto de
+dados sem montar tudo em memória antes.
+
+O formato é escolhido pela extensão do arquivo de saída (.csv, .parquet, .sqlite/.db)
+ou pela opção --formato.
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# Extensões reconhecidas de cada formato de saída
+FORMATOS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".sqlite": "sqlite",
+    ".sqlite3": "sqlite",
+    ".db": "sqlite",
+}
+
+# Nome padrão da tabela na saída SQLite
+TABELA_PADRAO = "areas"
+
+def formato_saida(caminho, formato=None):
+    """
+    Determina o formato de saída pela opção explícita ou pela extensão do caminho.
+
+    Um diretório (existente ou terminado em separador) é tratado como um conjunto de
+    dados Parquet, com um arquivo por execução.
+    """
+    if formato:
+        return formato
+    if os.path.isdir(caminho) or caminho.endswith(os.sep):
+        return "parquet"
+    return FORMATOS.get(os.path.splitext(caminho)[1].lower(), "csv")
+
+def colunas_areas(areas_manchas, **fixas):
+    """
+    Converte um dicionário {valor: (area_m2, area_ha)} em colunas prontas para a saída.
+
+    Parâmetros:
+    - areas_manchas: Dicionário retornado por `motor_area.calcular_area_manchas`.
+    - fixas: Colunas com um valor constante (ex.: Estado="PA"), colocadas antes das demais.
+
+    Retorna um dicionário {coluna: array} com as colunas Mancha, Area_m2 e Area_ha.
+    """
+    n = len(areas_manchas)
+    areas = np.array(list(areas_manchas.values()), dtype=np.float64).reshape(n, 2)
+
+    colunas = {nome: np.full(n, valor, dtype=object) for nome, valor in fixas.items()}
+    colunas["Mancha"] = np.array(list(areas_manchas.keys()))
+    colunas["Area_m2"] = areas[:, 0]
+    colunas["Area_ha"] = areas[:, 1]
+    return colunas
+
+def _tamanho_lote(colunas):
+    """
+    Número de linhas de um lote de colunas.
+    """
+    return len(next(iter(colunas.values()))) if colunas else 0
+
+def _escritor_csv(caminho, anexar):
+    """
+    Escritor CSV: o cabeçalho só é gravado se o arquivo for novo ou estiver vazio.
+    """
+    cabecalho = {"gravar": not (anexar and os.path.exists(caminho) and os.path.getsize(caminho) > 0)}
+    arquivo = open(caminho, "a" if anexar else "w", newline="")
+
+    def escrever(colunas):
+        pd.DataFrame(colunas).to_csv(arquivo, header=cabecalho["gravar"], index=False)
+        cabecalho["gravar"] = False
+
+    return escrever, arquivo.close, caminho
+
+def _escritor_parquet(caminho, anexar):
+    """
+    Escritor Parquet: cada lote vira um row group do mesmo arquivo.
+
+    Um arquivo Parquet não pode ser estendido depois de fechado; para anexar entre
+    execuções, use um diretório como destino (cada execução grava uma parte).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("A saída em Parquet requer o pacote pyarrow (pip install pyarrow).")
+
+    if os.path.isdir(caminho) or caminho.endswith(os.sep):
+        os.makedirs(caminho, exist_ok=True)
+        destino = os.path.join(caminho, f"parte-{time.time_ns()}-{os.getpid()}.parquet")
+    elif anexar and os.path.exists(caminho):
+        raise ValueError(f"Não é possível anexar a um arquivo Parquet existente: {caminho}. "
+                         "Use um diretório como destino para gravar uma parte por execução.")
+    else:
+        destino = caminho
+
+    escritor = {"parquet": None}
+
+    def escrever(colunas):
+        tabela = pa.table({nome: pa.array(valores) for nome, valores in colunas.items()})
+        if escritor["parquet"] is None:
+            escritor["parquet"] = pq.ParquetWriter(destino, tabela.schema)
+        else:
+            tabela = tabela.cast(escritor["parquet"].schema)
+        escritor["parquet"].write_table(tabela)
+
+    def fechar():
+        if escritor["parquet"] is not None:
+            escritor["parquet"].close()
+
+    return escrever, fechar, destino
+
+def _escritor_sqlite(caminho, anexar, tabela):
+    """
+    Escritor SQLite: sem `anexar`, a tabela é recriada no primeiro lote.
+    """
+    conexao = sqlite3.connect(caminho)
+    modo = {"if_exists": "append" if anexar else "replace"}
+
+    def escrever(colunas):
+        pd.DataFrame(colunas).to_sql(tabela, conexao, if_exists=modo["if_exists"], index=False)
+        modo["if_exists"] = "append"
+
+    def fechar():
+        conexao.commit()
+        conexao.close()
+
+    return escrever, fechar, f"{caminho} (tabela {tabela})"
+
+@contextmanager
+def abrir_saida(caminho, formato=None, anexar=False, tabela=TABELA_PADRAO):
+    """
+    Abre a saída de resultados e fornece uma função `escrever(colunas)` que grava um lote.
+
+    Parâmetros:
+    - caminho: Arquivo (ou diretório, para Parquet) de saída.
+    - formato: 'csv', 'parquet' ou 'sqlite' (padrão: pela extensão do caminho).
+    - anexar: Se True, acrescenta os resultados a uma saída existente em vez de substituí-la.
+    - tabela: Nome da tabela na saída SQLite.
+
+    Uso:
+        with abrir_saida("areas.csv") as escrever:
+            escrever(colunas_areas(areas, Estado="PA"))
+    """
+    formato = formato_saida(caminho, formato)
+    if formato == "csv":
+        escrever_lote, fechar, destino = _escritor_csv(caminho, anexar)
+    elif formato == "parquet":
+        escrever_lote, fechar, destino = _escritor_parquet(caminho, anexar)
+    elif formato == "sqlite":
+        escrever_lote, fechar, destino = _escritor_sqlite(caminho, anexar, tabela)
+    else:
+        raise ValueError(f"Formato de saída desconhecido: {formato}")
+
+    def escrever(colunas):
+        if _tamanho_lote(colunas) > 0:
+            escrever_lote(colunas)
+
+    try:
+        yield escrever
+    finally:
+        fechar()
+    print(f"Arquivo {formato.upper()} salvo em: {destino}")
+
+def adicionar_argumentos_saida(parser):
+    """
+    Adiciona ao parser os argumentos opcionais da saída de resultados.
+    """
+    parser.add_argument('--formato', type=str, choices=sorted(set(FORMATOS.values())), default=None,
+                        help="Formato de saída (padrão: pela extensão do arquivo; .csv, .parquet, .sqlite/.db).")
+    parser.add_argument('--anexar', action='store_true',
+                        help="Acrescenta os resultados a uma saída existente em vez de substituí-la.")
+    parser.add_argument('--tabela', type=str, default=TABELA_PADRAO,
+                        help=f"Nome da tabela na saída SQLite (padrão: {TABELA_PADRAO}).")
+    return parser
+
+def opcoes_saida(args):
+    """
+    Converte os argumentos de saída do parser nos parâmetros de `abrir_saida`.
+    """
+    return {"formato": args.formato, "anexar": args.anexar, "tabela": args.tabela}
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Servidor local de consultas de área sobre o mosaico.
+
+Em vez de iniciar um script `calcular_area_*` a cada pergunta (interpretador, imports
+e abertura do raster a cada vez), o servidor abre o mosaico uma vez, obtém o índice de
+zonas dos estados pelo cache de `indice_zonas` e responde em JSON:
+
+- GET  /saude                              estado do servidor e do cache de blocos
+- GET  /estados?valor_min=&valor_max=      áreas de cada classe em todos os estados
+- GET  /estados/<nome>?valor_min=&valor_max=
+- POST /poligono                           corpo {"geometria": {GeoJSON}, "crs": "EPSG:4326",
+                                           "valor_min": ..., "valor_max": ...}
+
+Só os blocos que cobrem a área consultada são lidos, e os blocos lidos (do mosaico e
+do índice de zonas) ficam em um cache LRU limitado em memória, compartilhado entre as
+requisições. O mosaico e o índice de zonas são abertos uma única vez, em um pool com um
+par de handles por vaga de consulta: um dataset do GDAL não pode ser lido por duas threads
+ao mesmo tempo, então cada consulta toma um par emprestado e o devolve ao terminar. Um
+semáforo limita quantas consultas são atendidas em paralelo ao tamanho do pool.
+
+O servidor escuta em HOST:PORTA ou, com --socket, em um socket Unix.
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+import rasterio
+from rasterio.errors import WindowError
+from rasterio.features import geometry_mask, geometry_window
+from rasterio.warp import transform_geom
+from rasterio.windows import Window
+
+import indice_zonas
+import motor_area
+
+# Memória padrão do cache de blocos (em bytes)
+CACHE_BLOCOS_PADRAO = 512 * 1024 * 1024
+
+# Consultas atendidas em paralelo, por padrão
+MAX_CONSULTAS_PADRAO = 4
+
+# Tempo máximo (em segundos) que uma consulta espera por uma vaga antes de receber 503
+_ESPERA_VAGA = 30
+
+# Resultados por estado guardados em memória (cada combinação de estado e intervalo de valores)
+_MAX_RESULTADOS = 1024
+
+# CRS das geometrias GeoJSON quando a consulta não informa outro (RFC 7946)
+CRS_GEOJSON = "EPSG:4326"
+
+def novo_cache_blocos(limite_bytes):
+    """
+    Cria um cache LRU de blocos, limitado por `limite_bytes`, seguro entre threads.
+    """
+    return {"blocos": OrderedDict(), "bytes": 0, "limite": limite_bytes, "trava": threading.Lock(),
+            "acertos": 0, "faltas": 0}
+
+def abrir_servico(raster_path, estados_path=None, campo=indice_zonas.CAMPO_ZONA_PADRAO, diretorio_cache=None,
+                  pixel_area=None, cache_blocos=CACHE_BLOCOS_PADRAO, max_consultas=MAX_CONSULTAS_PADRAO):
+    """
+    Prepara o estado do servidor: grade do mosaico, pesos de área, índice de zonas e caches.
+
+    Parâmetros:
+    - raster_path: Caminho para o mosaico.
+    - estados_path: Shapefile dos estados (opcional; sem ele, só /poligono fica disponível).
+    - campo: Atributo com o nome de cada estado.
+    - diretorio_cache: Diretório do cache de índices de zonas (opcional).
+    - pixel_area: Área fixa de cada pixel (opcional; ver `motor_area.definir_area_pixel`).
+    - cache_blocos: Memória máxima (em bytes) do cache de blocos.
+    - max_consultas: Número máximo de consultas atendidas ao mesmo tempo (e de pares de handles abertos).
+
+    Retorna um dicionário com o estado compartilhado pelas threads do servidor.
+    """
+    with rasterio.open(raster_path) as src:
+        pesos_linhas, unidade = motor_area.definir_area_pixel(src, pixel_area)
+        servico = {
+            "raster_path": raster_path,
+            "dtype": src.dtypes[0],
+            "crs": src.crs,
+            "pesos_linhas": pesos_linhas,
+            "unidade": unidade,
+            "indice_path": None,
+            "estados": {},
+            "local": threading.local(),
+            "handles": queue.Queue(),
+            "cache": novo_cache_blocos(cache_blocos),
+            "resultados": OrderedDict(),
+            "trava_resultados": threading.Lock(),
+            "vagas": threading.BoundedSemaphore(max_consultas),
+        }
+
+        if estados_path:
+            indice_path, nomes = indice_zonas.obter_indice_zonas(src, estados_path, campo, diretorio_cache)
+            _, formas = indice_zonas.carregar_zonas(estados_path, src.crs, campo)
+            servico["indice_path"] = indice_path
+
+            # Janela de cada estado na grade do mosaico, para ler só os blocos que ele cobre
+            for i, nome in enumerate(nomes):
+                geometrias = [geometria for geometria, zona_id in formas if zona_id == i + 1]
+                if geometrias:
+                    servico["estados"][nome] = (i + 1, geometry_window(src, geometrias))
+
+    # Um par de handles (mosaico e índice de zonas) por consulta atendida ao mesmo tempo
+    caminhos = [caminho for caminho in (raster_path, servico["indice_path"]) if caminho]
+    for _ in range(max_consultas):
+        servico["handles"].put({caminho: rasterio.open(caminho) for caminho in caminhos})
+    return servico
+
+def fechar_servico(servico):
+    """
+    Fecha os handles do pool do serviço.
+    """
+    while True:
+        try:
+            handles = servico["handles"].get_nowait()
+        except queue.Empty:
+            break
+        for src in handles.values():
+            src.close()
+
+@contextmanager
+def handles_da_consulta(servico):
+    """
+    Empresta à thread atual um par de handles do pool, devolvendo-o ao fim da consulta.
+
+    Espera um par livre se todos estiverem em uso; no servidor, o semáforo de vagas
+    garante que sempre haja um.
+    """
+    handles = servico["handles"].get()
+    servico["local"].handles = handles
+    try:
+        yield handles
+    finally:
+        del servico["local"].handles
+        servico["handles"].put(handles)
+
+def _dataset(servico, caminho):
+    """
+    Retorna o handle do dataset emprestado à consulta da thread atual (ver `handles_da_consulta`).
+    """
+    return servico["local"].handles[caminho]
+
+def janela_do_bloco(src, linha, coluna):
+    """
+    Retorna a janela do bloco (linha, coluna) de `src`, recortada na borda do raster.
+    """
+    altura_bloco, largura_bloco = src.block_shapes[0]
+    linha_off, col_off = linha * altura_bloco, coluna * largura_bloco
+    return Window(col_off, linha_off, min(largura_bloco, src.width - col_off),
+                  min(altura_bloco, src.height - linha_off))
+
+def ler_bloco(servico, caminho, linha, coluna):
+    """
+    Lê um bloco inteiro da primeira banda, passando pelo cache LRU de blocos.
+
+    Blocos não gravados (tiles esparsos) viram um array constante que não ocupa memória.
+    Os blocos devolvidos são somente leitura, pois são compartilhados entre as consultas.
+    """
+    cache = servico["cache"]
+    chave = (caminho, linha, coluna)
+    with cache["trava"]:
+        if chave in cache["blocos"]:
+            cache["blocos"].move_to_end(chave)
+            cache["acertos"] += 1
+            return cache["blocos"][chave][0]
+        cache["faltas"] += 1
+
+    src = _dataset(servico, caminho)
+    janela = janela_do_bloco(src, linha, coluna)
+    vazio = motor_area.valor_bloco_vazio(src)
+    if vazio is not None and motor_area.bloco_esparso(src, janela):
+        bloco = np.broadcast_to(np.array(vazio, dtype=src.dtypes[0]), (int(janela.height), int(janela.width)))
+        tamanho = bloco.itemsize
+    else:
+        bloco = src.read(1, window=janela)
+        bloco.flags.writeable = False
+        tamanho = bloco.nbytes
+
+    with cache["trava"]:
+        if chave not in cache["blocos"]:
+            cache["blocos"][chave] = (bloco, tamanho)
+            cache["bytes"] += tamanho
+        while cache["bytes"] > cache["limite"] and len(cache["blocos"]) > 1:
+            _, (_, tamanho_removido) = cache["blocos"].popitem(last=False)
+            cache["bytes"] -= tamanho_removido
+    return bloco
+
+def ler_janela(servico, caminho, janela):
+    """
+    Monta uma janela da primeira banda a partir dos blocos em cache.
+    """
+    src = _dataset(servico, caminho)
+    altura_bloco, largura_bloco = src.block_shapes[0]
+    if janela.height * janela.width == 0:
+        return np.empty((int(janela.height), int(janela.width)), dtype=src.dtypes[0])
+
+    partes = list(motor_area.blocos_da_janela(src, janela))
+    if len(partes) == 1:
+        destino = None
+    else:
+        destino = np.empty((int(janela.height), int(janela.width)), dtype=src.dtypes[0])
+
+    for parte in partes:
+        linha, coluna = int(parte.row_off) // altura_bloco, int(parte.col_off) // largura_bloco
+        bloco = ler_bloco(servico, caminho, linha, coluna)
+        linha_bloco = int(parte.row_off) - linha * altura_bloco
+        col_bloco = int(parte.col_off) - coluna * largura_bloco
+        recorte = bloco[linha_bloco:linha_bloco + int(parte.height), col_bloco:col_bloco + int(parte.width)]
+        if destino is None:
+            return recorte
+        linha_dest, col_dest = int(parte.row_off - janela.row_off), int(parte.col_off - janela.col_off)
+        destino[linha_dest:linha_dest + int(parte.height), col_dest:col_dest + int(parte.width)] = recorte
+    return destino
+
+def contar_na_janela(servico, janela, selecionar, valor_min=None, valor_max=None):
+    """
+    Conta os pixels de cada valor dentro de uma seleção, bloco a bloco do mosaico.
+
+    Parâmetros:
+    - janela: Janela do mosaico que contém a área consultada.
+    - selecionar: Função que recebe a janela de um bloco e retorna a máscara booleana
+      dos pixels que pertencem à área consultada.
+    - valor_min, valor_max: Intervalo de valores contados (opcional).
+
+    Retorna um dicionário {valor: (area_m2, area_ha)}.
+    """
+    plano = motor_area.planejar_contagem(servico["dtype"], valor_min, valor_max)
+    acumulador = motor_area.novo_acumulador(plano, 1)
+    src = _dataset(servico, servico["raster_path"])
+
+    for parte in motor_area.blocos_da_janela(src, janela):
+        dentro = selecionar(parte)
+        if not dentro.any():
+            continue
+        # A seleção entra como a zona 1; o resto da janela fica na zona 0, descartada
+        acumulador = motor_area.acumular_bloco(acumulador, ler_janela(servico, servico["raster_path"], parte), plano,
+                                               motor_area.pesos_da_janela(servico["pesos_linhas"], parte),
+                                               dentro.astype(np.uint8))
+
+    valores, contagens = motor_area.finalizar_contagem(acumulador, plano, 1)
+    return motor_area.areas_de_contagens(valores, contagens, servico["unidade"])
+
+def areas_estado(servico, nome, valor_min=None, valor_max=None):
+    """
+    Calcula (ou lê dos resultados já calculados) as áreas de um estado.
+    """
+    chave = (nome, valor_min, valor_max)
+    with servico["trava_resultados"]:
+        if chave in servico["resultados"]:
+            servico["resultados"].move_to_end(chave)
+            return servico["resultados"][chave]
+
+    zona_id, janela_estado = servico["estados"][nome]
+
+    def selecionar(parte):
+        return ler_janela(servico, servico["indice_path"], parte) == zona_id
+
+    areas_manchas = contar_na_janela(servico, janela_estado, selecionar, valor_min, valor_max)
+
+    with servico["trava_resultados"]:
+        servico["resultados"][chave] = areas_manchas
+        if len(servico["resultados"]) > _MAX_RESULTADOS:
+            servico["resultados"].popitem(last=False)
+    return areas_manchas
+
+def areas_poligono(servico, geometria, crs=CRS_GEOJSON, valor_min=None, valor_max=None):
+    """
+    Calcula as áreas de cada classe dentro de um polígono GeoJSON.
+
+    Um pixel entra no polígono se o seu centro estiver dentro dele, como em `rasterio.mask.mask`.
+    """
+    if servico["crs"] is not None and crs:
+        geometria = transform_geom(crs, servico["crs"], geometria)
+
+    src = _dataset(servico, servico["raster_path"])
+    try:
+        janela = geometry_window(src, [geometria])
+    except WindowError:
+        return {}  # Polígono fora do mosaico
+
+    def selecionar(parte):
+        return geometry_mask([geometria], out_shape=(int(parte.height), int(parte.width)),
+                             transform=src.window_transform(parte), invert=True)
+
+    return contar_na_janela(servico, janela, selecionar, valor_min, valor_max)
+
+def json_areas(areas_manchas):
+    """
+    Converte um dicionário {valor: (area_m2, area_ha)} na lista de linhas da resposta JSON,
+    com as mesmas colunas dos CSVs.
+    """
+    return [{"Mancha": valor.item() if hasattr(valor, "item") else valor,
+             "Area_m2": float(area_m2), "Area_ha": float(area_ha)}
+            for valor, (area_m2, area_ha) in areas_manchas.items()]
+
+def _intervalo(parametros):
+    """
+    Lê valor_min e valor_max de um dicionário de parâmetros (query string ou corpo JSON).
+    """
+    intervalo = []
+    for nome in ("valor_min", "valor_max"):
+        valor = parametros.get(nome)
+        if isinstance(valor, list):
+            valor = valor[0]
+        intervalo.append(None if valor in (None, "") else float(valor))
+    return intervalo
+
+class ManipuladorConsultas(BaseHTTPRequestHandler):
+    """
+    Atende as rotas do servidor; o estado compartilhado fica em `self.server.servico`.
+    """
+
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _atender(self, consulta):
+        servico = self.server.servico
+        if not servico["vagas"].acquire(timeout=_ESPERA_VAGA):
+            self._responder(503, {"erro": "Servidor ocupado; tente novamente."})
+            return
+        inicio = time.perf_counter()
+        try:
+            with handles_da_consulta(servico):
+                status, corpo = consulta()
+        except (ValueError, KeyError, TypeError) as erro:
+            status, corpo = 400, {"erro": str(erro)}
+        finally:
+            servico["vagas"].release()
+        if status == 200:
+            corpo["tempo_ms"] = round((time.perf_counter() - inicio) * 1000, 3)
+        self._responder(status, corpo)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parametros = parse_qs(url.query)
+        partes = [unquote(parte) for parte in url.path.strip("/").split("/") if parte]
+        servico = self.server.servico
+
+        if partes == ["saude"]:
+            cache = servico["cache"]
+            with cache["trava"]:
+                corpo = {"raster": servico["raster_path"], "estados": list(servico["estados"]),
+                         "cache_blocos": {"blocos": len(cache["blocos"]), "bytes": cache["bytes"],
+                                          "limite": cache["limite"], "acertos": cache["acertos"],
+                                          "faltas": cache["faltas"]}}
+            self._responder(200, corpo)
+        elif partes == ["estados"]:
+            self._atender(lambda: (200, {"estados": {
+                nome: json_areas(areas_estado(servico, nome, *_intervalo(parametros)))
+                for nome in servico["estados"]}}))
+        elif len(partes) == 2 and partes[0] == "estados":
+            if partes[1] not in servico["estados"]:
+                self._responder(404, {"erro": f"Estado não encontrado: {partes[1]}"})
+                return
+            self._atender(lambda: (200, {"estado": partes[1],
+                                         "areas": json_areas(areas_estado(servico, partes[1],
+                                                                          *_intervalo(parametros)))}))
+        else:
+            self._responder(404, {"erro": f"Rota não encontrada: {url.path}"})
+
+    def do_POST(self):
+        if urlparse(self.path).path.strip("/") != "poligono":
+            self._responder(404, {"erro": f"Rota não encontrada: {self.path}"})
+            return
+        try:
+            corpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            geometria = corpo["geometria"]
+        except (ValueError, KeyError) as erro:
+            self._responder(400, {"erro": f"Corpo inválido; esperado JSON com 'geometria': {erro}"})
+            return
+        servico = self.server.servico
+        self._atender(lambda: (200, {"areas": json_areas(areas_poligono(servico, geometria,
+                                                                        corpo.get("crs", CRS_GEOJSON),
+                                                                        *_intervalo(corpo)))}))
+
+    def address_string(self):
+        # Em um socket Unix o endereço do cliente é vazio
+        return self.client_address[0] if self.client_address else "unix"
+
+class ServidorUnix(ThreadingMixIn, UnixStreamServer):
+    """
+    Servidor HTTP em um socket Unix, uma thread por conexão.
+    """
+    daemon_threads = True
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local de consultas de área (JSON) sobre o mosaico.")
+    parser.add_argument('raster_path', type=str, help="Caminho para o mosaico.")
+    parser.add_argument('--estados', type=str, help="Shapefile dos estados (habilita as rotas /estados).")
+    parser.add_argument('--campo', type=str, default=indice_zonas.CAMPO_ZONA_PADRAO,
+                        help=f"Atributo do shapefile com o nome do estado (padrão: {indice_zonas.CAMPO_ZONA_PADRAO}).")
+    parser.add_argument('--cache-zonas', type=str, default=None,
+                        help="Diretório do cache de índices de zonas (padrão: $GEOWRI_CACHE ou ~/.cache/geowri).")
+    parser.add_argument('--resolucao', type=float, default=None,
+                        help="Resolução do pixel em metros (opcional; padrão: a do CRS do raster).")
+    parser.add_argument('--host', type=str, default="127.0.0.1", help="Endereço de escuta (padrão: 127.0.0.1).")
+    parser.add_argument('--porta', type=int, default=8765, help="Porta de escuta (padrão: 8765).")
+    parser.add_argument('--socket', type=str, default=None, help="Escuta em um socket Unix em vez de HOST:PORTA.")
+    parser.add_argument('--cache-blocos-mb', type=float, default=CACHE_BLOCOS_PADRAO / (1024 * 1024),
+                        help="Memória do cache de blocos, em MB (padrão: 512).")
+    parser.add_argument('--max-consultas', type=int, default=MAX_CONSULTAS_PADRAO,
+                        help=f"Consultas atendidas ao mesmo tempo (padrão: {MAX_CONSULTAS_PADRAO}).")
+    args = parser.parse_args()
+
+    pixel_area = args.resolucao * args.resolucao if args.resolucao else None
+    servico = abrir_servico(args.raster_path, args.estados, args.campo, args.cache_zonas, pixel_area,
+                            int(args.cache_blocos_mb * 1024 * 1024), args.max_consultas)
+
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        servidor = ServidorUnix(args.socket, ManipuladorConsultas)
+        endereco = args.socket
+    else:
+        servidor = ThreadingHTTPServer((args.host, args.porta), ManipuladorConsultas)
+        endereco = f"http://{args.host}:{args.porta}"
+    servidor.servico = servico
+
+    print(f"INFO: Servindo consultas de área de {args.raster_path} em {endereco}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        fechar_servico(servico)
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+if __name__ == "__main__":
+    main()
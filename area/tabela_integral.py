@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Tabelas de somas acumuladas (imagens integrais) por classe para consultas retangulares.
+
+Uma passada pelo mosaico conta os pixels de cada classe em células de CELULA x CELULA
+pixels e grava, para cada classe, a soma acumulada das células (tabela integral) em um
+arquivo .npy mapeado em memória, com os metadados em um .json ao lado.
+
+Com a tabela, a área de cada classe em qualquer retângulo alinhado às células sai de
+quatro leituras por classe, sem ler o raster. Em um retângulo qualquer, a parte interna
+alinhada vem da tabela e só as faixas de borda (menores que uma célula) são lidas do
+raster e contadas com o motor de `motor_area`.
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window, from_bounds
+
+import motor_area
+import saida_area
+
+# Lado padrão das células da tabela, em pixels
+CELULA_PADRAO = 64
+
+# Maior número de classes aceito na tabela (cada classe ocupa uma tabela inteira)
+MAX_CLASSES = 4096
+
+def caminho_metadados(tabela_path):
+    """
+    Retorna o caminho do .json de metadados de uma tabela integral.
+    """
+    return os.path.splitext(tabela_path)[0] + ".json"
+
+def _assinatura_raster(raster_path):
+    """
+    Identifica a versão do raster usada na tabela (tamanho e data de modificação).
+    """
+    estado = os.stat(raster_path)
+    return {"raster_path": os.path.abspath(raster_path), "tamanho": estado.st_size, "mtime_ns": estado.st_mtime_ns}
+
+def indices_de_classe(dados, valores):
+    """
+    Retorna o índice, em `valores` (ordenado), da classe de cada pixel, ou -1 para valores fora da lista.
+    """
+    if valores.size == 0:
+        return np.full(dados.shape, -1, dtype=np.intp)
+    posicoes = np.searchsorted(valores, dados).clip(0, valores.size - 1)
+    return np.where(valores[posicoes] == dados, posicoes, -1)
+
+def contar_celulas(indices_classe, pesos, celula, n_colunas, n_classes, linhas_celula=None, colunas_celula=None):
+    """
+    Conta os pixels de cada classe em cada célula de uma faixa que começa em uma borda de célula.
+
+    Parâmetros:
+    - indices_classe: Array 2D com o índice da classe de cada pixel da faixa (-1 = fora das classes).
+    - pesos: Peso inteiro de cada linha da faixa, ou None (cada pixel conta 1).
+    - celula: Lado das células, em pixels.
+    - n_colunas: Número de colunas de células.
+    - n_classes: Número de classes.
+    - linhas_celula, colunas_celula: Índice da célula de cada linha e de cada coluna da faixa
+      (crescentes, a partir de 0), para células que não têm um número inteiro de pixels.
+      Padrão: a divisão inteira por `celula`.
+
+    Retorna um array int64 (linhas_de_celulas, n_colunas, n_classes).
+    """
+    altura, largura = indices_classe.shape
+    if linhas_celula is None:
+        linhas_celula = np.arange(altura) // celula
+    if colunas_celula is None:
+        colunas_celula = np.arange(largura) // celula
+    n_linhas = int(linhas_celula[-1]) + 1
+    linha_celula = np.asarray(linhas_celula)[:, None]
+    coluna_celula = np.asarray(colunas_celula)[None, :]
+    indices = (linha_celula * n_colunas + coluna_celula) * n_classes + indices_classe
+
+    validos = indices_classe >= 0
+    tamanho = n_linhas * n_colunas * n_classes
+    if pesos is None:
+        contagens = np.bincount(indices[validos], minlength=tamanho)
+    else:
+        pesos_pixels = np.broadcast_to(pesos[:, None], indices_classe.shape)[validos]
+        contagens = np.rint(np.bincount(indices[validos], weights=pesos_pixels, minlength=tamanho)).astype(np.int64)
+    return contagens.reshape(n_linhas, n_colunas, n_classes)
+
+def construir_tabela_integral(raster_path, tabela_path, celula=CELULA_PADRAO, pixel_area=None, valor_min=None,
+                              valor_max=None, orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO, workers=1):
+    """
+    Constrói a tabela integral por classe do raster e grava em `tabela_path` (.npy) e no .json ao lado.
+
+    Parâmetros:
+    - raster_path: Caminho para o raster (ex.: o mosaico).
+    - tabela_path: Caminho do arquivo .npy da tabela.
+    - celula: Lado das células, em pixels.
+    - pixel_area, valor_min, valor_max, orcamento_memoria, workers: Ver `motor_area.calcular_area_manchas`.
+
+    A tabela tem forma (classes, linhas_de_celulas + 1, colunas_de_celulas + 1): a entrada
+    [k, i, j] é o peso total da classe k nas células acima de i e à esquerda de j.
+    """
+    with rasterio.open(raster_path) as src:
+        pesos_linhas, unidade = motor_area.definir_area_pixel(src, pixel_area)
+
+        # Primeira passada: as classes presentes no intervalo definem as camadas da tabela
+        valores, _ = motor_area.contar_pixels(src, valor_min, valor_max, orcamento_memoria, workers, pesos_linhas)
+        if valores.size > MAX_CLASSES:
+            raise ValueError(f"O raster tem {valores.size} classes no intervalo (máximo {MAX_CLASSES}); "
+                             "restrinja o intervalo com --valor-min/--valor-max.")
+
+        n_linhas, n_colunas = -(-src.height // celula), -(-src.width // celula)
+        print(f"INFO: Construindo a tabela integral de {valores.size} classes em {n_linhas} x {n_colunas} "
+              f"células de {celula} pixels...")
+
+        temporario = tabela_path + f".{os.getpid()}.tmp.npy"
+        tabela = np.lib.format.open_memmap(temporario, mode="w+", dtype=np.int64,
+                                           shape=(valores.size, n_linhas + 1, n_colunas + 1))
+        tabela[:, 0, :] = 0
+        tabela[:, :, 0] = 0
+
+        # Segunda passada: faixas com altura múltipla da célula, acumulando linha a linha de células
+        linhas_faixa = max(1, int(orcamento_memoria // (motor_area.bytes_por_pixel(src.dtypes[0]) * src.width))
+                           // celula) * celula
+        for inicio in range(0, src.height if valores.size else 0, linhas_faixa):
+            janela = Window(0, inicio, src.width, min(linhas_faixa, src.height - inicio))
+            indices_classe = indices_de_classe(src.read(1, window=janela), valores)
+            celulas = contar_celulas(indices_classe, motor_area.pesos_da_janela(pesos_linhas, janela),
+                                     celula, n_colunas, valores.size)
+
+            linha_celula = inicio // celula
+            for i in range(celulas.shape[0]):
+                acumulado_linha = np.cumsum(celulas[i], axis=0).T
+                tabela[:, linha_celula + i + 1, 1:] = tabela[:, linha_celula + i, 1:] + acumulado_linha
+        tabela.flush()
+        del tabela
+
+        metadados = {
+            **_assinatura_raster(raster_path),
+            "celula": celula,
+            "altura": src.height,
+            "largura": src.width,
+            "transform": list(src.transform)[:6],
+            "pixel_area": pixel_area,
+            "unidade": unidade,
+            "valor_min": valor_min,
+            "valor_max": valor_max,
+            "dtype": str(valores.dtype),
+            "valores": valores.tolist(),
+        }
+
+    os.replace(temporario, tabela_path)
+    with open(caminho_metadados(tabela_path), "w") as f:
+        json.dump(metadados, f, ensure_ascii=False, indent=2)
+    print(f"INFO: Tabela integral salva em: {tabela_path}")
+
+def abrir_tabela_integral(tabela_path, raster_path=None):
+    """
+    Abre uma tabela integral (mapeada em memória, sem carregá-la) com os seus metadados.
+
+    Se `raster_path` for informado e o raster tiver mudado desde a construção, retorna None.
+    """
+    metadados_path = caminho_metadados(tabela_path)
+    if not (os.path.exists(tabela_path) and os.path.exists(metadados_path)):
+        return None
+    with open(metadados_path) as f:
+        metadados = json.load(f)
+    if raster_path is not None and _assinatura_raster(raster_path) != {
+            chave: metadados[chave] for chave in ("raster_path", "tamanho", "mtime_ns")}:
+        return None
+
+    metadados["tabela"] = np.load(tabela_path, mmap_mode="r")
+    metadados["valores"] = np.array(metadados["valores"], dtype=metadados["dtype"])
+    return metadados
+
+def _limites_alinhados(inicio, fim, celula, total):
+    """
+    Retorna os índices (primeira, última) das bordas de célula dentro de [inicio, fim],
+    considerando que a última célula termina na borda do raster.
+    """
+    primeira = -(-inicio // celula)
+    ultima = fim // celula if fim < total else -(-total // celula)
+    return primeira, ultima
+
+def _borda_celula(indice, celula, total):
+    """
+    Posição, em pixels, da borda de célula de índice `indice`.
+    """
+    return min(indice * celula, total)
+
+def contar_retangulo(tabela, src, janela, orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO):
+    """
+    Soma os pesos de cada classe em uma janela do raster, usando a tabela integral.
+
+    Parâmetros:
+    - tabela: Tabela aberta com `abrir_tabela_integral`.
+    - src: O raster da tabela, aberto com `rasterio.open` (lido só nas bordas não alinhadas).
+    - janela: Janela inteira do raster.
+
+    Retorna um array int64 com o peso de cada classe de `tabela["valores"]`.
+    """
+    celula, altura, largura = tabela["celula"], tabela["altura"], tabela["largura"]
+    linha_ini, col_ini = max(0, int(janela.row_off)), max(0, int(janela.col_off))
+    linha_fim = min(altura, int(janela.row_off + janela.height))
+    col_fim = min(largura, int(janela.col_off + janela.width))
+    valores = tabela["valores"]
+    total = np.zeros(valores.size, dtype=np.int64)
+    if linha_fim <= linha_ini or col_fim <= col_ini:
+        return total
+
+    i0, i1 = _limites_alinhados(linha_ini, linha_fim, celula, altura)
+    j0, j1 = _limites_alinhados(col_ini, col_fim, celula, largura)
+    if i1 > i0 and j1 > j0:
+        # Parte alinhada às células: quatro leituras por classe
+        somas = tabela["tabela"]
+        total += somas[:, i1, j1] - somas[:, i0, j1] - somas[:, i1, j0] + somas[:, i0, j0]
+        interno = (_borda_celula(i0, celula, altura), _borda_celula(i1, celula, altura),
+                   _borda_celula(j0, celula, largura), _borda_celula(j1, celula, largura))
+        # Faixas de borda: acima e abaixo (largura inteira) e à esquerda e à direita (altura interna)
+        bordas = [(linha_ini, interno[0], col_ini, col_fim), (interno[1], linha_fim, col_ini, col_fim),
+                  (interno[0], interno[1], col_ini, interno[2]), (interno[0], interno[1], interno[3], col_fim)]
+    else:
+        # Retângulo menor que uma célula alinhada: tudo vem do raster
+        bordas = [(linha_ini, linha_fim, col_ini, col_fim)]
+
+    pesos_linhas, _ = motor_area.definir_area_pixel(src, tabela["pixel_area"], informar=False)
+    plano = motor_area.planejar_contagem(src.dtypes[0], tabela["valor_min"], tabela["valor_max"])
+    acumulador = motor_area.novo_acumulador(plano)
+    for linha_a, linha_b, col_a, col_b in bordas:
+        if linha_b <= linha_a or col_b <= col_a:
+            continue
+        borda = Window(col_a, linha_a, col_b - col_a, linha_b - linha_a)
+        for parte in motor_area.blocos_da_janela(src, borda):
+            acumulador = motor_area.acumular_bloco(acumulador, src.read(1, window=parte), plano,
+                                                   motor_area.pesos_da_janela(pesos_linhas, parte))
+
+    valores_borda, contagens_borda = motor_area.finalizar_contagem(acumulador, plano)
+    total[np.searchsorted(valores, valores_borda)] += contagens_borda
+    return total
+
+def areas_retangulo(tabela, src, janela=None, limites=None):
+    """
+    Calcula a área de cada classe em um retângulo, dado por uma janela de pixels ou por
+    limites (xmin, ymin, xmax, ymax) no CRS do raster.
+
+    Retorna um dicionário {valor: (area_m2, area_ha)} com as classes presentes no retângulo.
+    """
+    if janela is None:
+        janela = from_bounds(*limites, transform=src.transform).round_offsets().round_lengths()
+    contagens = contar_retangulo(tabela, src, janela)
+    presentes = contagens > 0
+    return motor_area.areas_de_contagens(tabela["valores"][presentes], contagens[presentes], tabela["unidade"])
+
+def main():
+    parser = argparse.ArgumentParser(description="Constrói e consulta a tabela integral por classe de um raster.")
+    parser.add_argument('raster_path', type=str, help="Caminho para o raster (ex.: o mosaico).")
+    parser.add_argument('tabela_path', type=str, help="Arquivo .npy da tabela (construído se ausente ou desatualizado).")
+    parser.add_argument('--celula', type=int, default=CELULA_PADRAO,
+                        help=f"Lado das células da tabela, em pixels (padrão: {CELULA_PADRAO}).")
+    parser.add_argument('--resolucao', type=float, default=None,
+                        help="Resolução do pixel em metros (opcional; padrão: a do CRS do raster).")
+    parser.add_argument('--valor-min', type=float, default=None, help="Valor mínimo das classes (opcional).")
+    parser.add_argument('--valor-max', type=float, default=None, help="Valor máximo das classes (opcional).")
+    parser.add_argument('--reconstruir', action='store_true', help="Reconstrói a tabela mesmo que esteja atualizada.")
+    consulta = parser.add_mutually_exclusive_group()
+    consulta.add_argument('--limites', type=float, nargs=4, metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'),
+                          help="Retângulo da consulta, no CRS do raster.")
+    consulta.add_argument('--janela', type=int, nargs=4, metavar=('COLUNA', 'LINHA', 'LARGURA', 'ALTURA'),
+                          help="Retângulo da consulta, em pixels.")
+    parser.add_argument('--saida', type=str, default=None,
+                        help="Arquivo de saída da consulta (padrão: mostrar na tela).")
+    motor_area.adicionar_argumentos_motor(parser)
+    saida_area.adicionar_argumentos_saida(parser)
+    args = parser.parse_args()
+
+    pixel_area = args.resolucao * args.resolucao if args.resolucao else None
+    tabela = None if args.reconstruir else abrir_tabela_integral(args.tabela_path, args.raster_path)
+    if tabela is not None and (tabela["celula"], tabela["pixel_area"], tabela["valor_min"], tabela["valor_max"]) != (
+            args.celula, pixel_area, args.valor_min, args.valor_max):
+        tabela = None
+    if tabela is None:
+        construir_tabela_integral(args.raster_path, args.tabela_path, args.celula, pixel_area, args.valor_min,
+                                  args.valor_max, **motor_area.opcoes_motor(args))
+        tabela = abrir_tabela_integral(args.tabela_path)
+
+    if args.limites is None and args.janela is None:
+        return
+
+    with rasterio.open(args.raster_path) as src:
+        janela = Window(*args.janela) if args.janela else None
+        areas_manchas = areas_retangulo(tabela, src, janela, args.limites)
+
+    if args.saida:
+        with saida_area.abrir_saida(args.saida, **saida_area.opcoes_saida(args)) as escrever:
+            escrever(saida_area.colunas_areas(areas_manchas))
+    else:
+        for valor, (area_m2, area_ha) in areas_manchas.items():
+            print(f"Mancha {valor}: {area_m2:.2f} m² ({area_ha:.2f} ha)")
+
+if __name__ == "__main__":
+    main()
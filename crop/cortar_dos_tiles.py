@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Corte direto dos tiles de origem, sem montar o mosaico nacional.
+
+Os contornos (footprints) dos tiles da pasta são lidos só dos cabeçalhos e indexados em
+uma STRtree. Para cada polígono da camada vetorial, a árvore indica os tiles que o
+intersectam, e só eles são mosaicados em memória (`rasterio.merge`), na janela do
+polígono alinhada à grade dos tiles. O resultado é o mesmo de cortar o mosaico completo
+com `crop_raster_by_state.py`. Janelas que não cabem no orçamento de memória são
+mosaicadas e gravadas em faixas de linhas.
+"""
+
+import os
+import sys
+import glob
+import math
+import argparse
+
+import numpy as np
+import rasterio
+import geopandas as gpd
+from rasterio.features import bounds, geometry_mask
+from rasterio.merge import merge
+from rasterio.transform import Affine
+from rasterio.windows import Window
+from shapely.geometry import box
+from shapely.strtree import STRtree
+
+# Módulos compartilhados com os scripts de área (planejamento de memória)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "area"))
+import motor_area
+
+import geometria_simplificada
+
+def verificar_entrada_existente(caminho):
+    """
+    Verifica se o arquivo ou diretório existe.
+    """
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f"Arquivo ou diretório não encontrado: {caminho}")
+
+def indexar_tiles(raster_folder):
+    """
+    Lê o contorno de cada tile .tif da pasta (só o cabeçalho) e monta o índice espacial.
+
+    Retorna um dicionário com os caminhos dos tiles, os contornos, a STRtree, o perfil do
+    primeiro tile (CRS, resolução, tipo de dado, nodata) e a extensão total dos tiles.
+    """
+    caminhos = sorted(glob.glob(os.path.join(raster_folder, "*.tif")))
+    if not caminhos:
+        raise ValueError(f"Nenhum arquivo raster encontrado no diretório especificado: {raster_folder}")
+
+    contornos = []
+    for caminho in caminhos:
+        with rasterio.open(caminho) as tile:
+            if not contornos:
+                perfil = tile.meta.copy()
+                res = tile.res
+            elif tile.crs != perfil["crs"] or tile.count != perfil["count"] or tile.dtypes[0] != perfil["dtype"]:
+                raise ValueError(f"O tile {caminho} tem CRS, bandas ou tipo de dado diferente de {caminhos[0]}.")
+            elif not np.allclose(tile.res, res):
+                raise ValueError(f"O tile {caminho} tem resolução {tile.res}, diferente de {res}.")
+            contornos.append(box(*tile.bounds))
+
+    extensao = (min(c.bounds[0] for c in contornos), min(c.bounds[1] for c in contornos),
+                max(c.bounds[2] for c in contornos), max(c.bounds[3] for c in contornos))
+    print(f"INFO: {len(caminhos)} tiles indexados em {raster_folder}.")
+    return {"caminhos": caminhos, "contornos": contornos, "arvore": STRtree(contornos), "perfil": perfil,
+            "extensao": extensao}
+
+def grade_do_poligono(indice, geometria):
+    """
+    Calcula a grade de saída de um polígono: o retângulo envolvente alinhado aos pixels
+    dos tiles e limitado à extensão total deles, como a janela de `mask(..., crop=True)`
+    sobre o mosaico.
+
+    Retorna uma tupla (transform, largura, altura), ou None se o polígono cair fora dos tiles.
+    """
+    xres, yres = indice["perfil"]["transform"].a, -indice["perfil"]["transform"].e
+    oeste, sul, leste, norte = indice["extensao"]
+
+    # Grade do mosaico completo (origem no canto noroeste dos tiles), com o mesmo
+    # arredondamento de `geometry_window`
+    transform_mosaico = Affine(xres, 0, oeste, 0, -yres, norte)
+    esquerda, baixo, direita, topo = bounds(geometria, transform=~transform_mosaico)
+    col_ini = max(0, math.floor(esquerda))
+    col_fim = min(round((leste - oeste) / xres), math.ceil(direita))
+    lin_ini = max(0, math.floor(topo))
+    lin_fim = min(round((norte - sul) / yres), math.ceil(baixo))
+    if col_ini >= col_fim or lin_ini >= lin_fim:
+        return None
+    return transform_mosaico * Affine.translation(col_ini, lin_ini), col_fim - col_ini, lin_fim - lin_ini
+
+def mosaicar_faixa(indice, tiles, transform, largura, altura, nodata):
+    """
+    Mosaica em memória, a partir dos tiles indicados, a área coberta pela grade informada.
+
+    Retorna o array (bandas, altura, largura); pixels sem tile ficam com nodata.
+    """
+    oeste, norte = transform.c, transform.f
+    leste, sul = oeste + largura * transform.a, norte + altura * transform.e
+    faixa = box(oeste, sul, leste, norte)
+    na_faixa = [indice["caminhos"][i] for i in tiles if indice["contornos"][i].intersects(faixa)]
+    if not na_faixa:
+        return np.full((indice["perfil"]["count"], altura, largura), nodata, dtype=indice["perfil"]["dtype"])
+
+    dados, _ = merge(na_faixa, bounds=(oeste, sul, leste, norte), res=(transform.a, -transform.e), nodata=nodata)
+    return dados[:, :altura, :largura]
+
+def cortar_dos_tiles(raster_folder, vector_path, output_dir, campo="nome",
+                     orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO, simplificar=False):
+    """
+    Corta os tiles de origem por cada polígono da camada vetorial e salva um GeoTIFF por polígono.
+
+    Parâmetros:
+    - raster_folder: Diretório com os tiles (.tif) na mesma grade.
+    - vector_path: Camada vetorial com os polígonos (ex.: municípios).
+    - output_dir: Diretório onde os rasters cortados serão salvos.
+    - campo: Atributo usado no nome de cada arquivo (raster_<valor>.tif).
+    - orcamento_memoria: Memória máxima (em bytes) para o mosaico de um polígono; acima dela,
+      o mosaico é montado e gravado em faixas de linhas.
+    - simplificar: Se True, usa os polígonos simplificados na grade dos tiles, em cache
+      (ver `geometria_simplificada`).
+
+    Retorna uma lista com os caminhos dos rasters cortados.
+    """
+    indice = indexar_tiles(raster_folder)
+    perfil = indice["perfil"]
+    nodata = perfil["nodata"] if perfil["nodata"] is not None else 0
+
+    if simplificar:
+        poligonos = geometria_simplificada.carregar_geometrias_simplificadas(vector_path, perfil["crs"],
+                                                                            perfil["transform"])
+    else:
+        poligonos = gpd.read_file(vector_path)
+    if perfil["crs"] is not None and poligonos.crs != perfil["crs"]:
+        poligonos = poligonos.to_crs(perfil["crs"])
+
+    raster_cortado_paths = []
+    for poligono in poligonos.itertuples():
+        nome = getattr(poligono, campo)
+        tiles = indice["arvore"].query(poligono.geometry, predicate="intersects")
+        grade = grade_do_poligono(indice, poligono.geometry) if len(tiles) else None
+        if grade is None:
+            print(f"AVISO: Nenhum tile intersecta o polígono {nome}; ignorado.")
+            continue
+        transform, largura, altura = grade
+
+        out_meta = perfil.copy()
+        out_meta.update({"driver": "GTiff", "height": altura, "width": largura, "transform": transform})
+        output_raster_path = os.path.join(output_dir, f"raster_{nome}.tif")
+
+        # Faixas de linhas inteiras que caibam no orçamento (uma só, se o polígono couber)
+        linhas = altura
+        if not motor_area.escolher_leitura(largura, altura, perfil["dtype"], perfil["count"], orcamento_memoria,
+                                           f"polígono {nome} ({len(tiles)} tiles)"):
+            bytes_pixel = motor_area.bytes_por_pixel(perfil["dtype"]) * perfil["count"]
+            linhas = max(1, int(orcamento_memoria // (bytes_pixel * largura)))
+
+        with rasterio.open(output_raster_path, "w", **out_meta) as dest:
+            for inicio in range(0, altura, linhas):
+                altura_faixa = min(linhas, altura - inicio)
+                transform_faixa = transform * Affine.translation(0, inicio)
+                dados = mosaicar_faixa(indice, tiles, transform_faixa, largura, altura_faixa, nodata)
+                fora = geometry_mask([poligono.geometry], out_shape=(altura_faixa, largura), transform=transform_faixa)
+                dados[:, fora] = nodata
+                dest.write(dados, window=Window(0, inicio, largura, altura_faixa))
+
+        raster_cortado_paths.append(output_raster_path)
+        print(f"Raster cortado para {nome} ({len(tiles)} de {len(indice['caminhos'])} tiles) salvo em: "
+              f"{output_raster_path}")
+
+    return raster_cortado_paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Corta os tiles de origem por cada polígono de uma camada vetorial, sem montar o mosaico.")
+    parser.add_argument('raster_folder', type=str, help="Diretório com os tiles (.tif).")
+    parser.add_argument('vector_path', type=str, help="Camada vetorial com os polígonos (ex.: municípios).")
+    parser.add_argument('output_dir', type=str, help="Diretório onde os rasters cortados serão salvos.")
+    parser.add_argument('--campo', type=str, default="nome", help="Atributo usado no nome dos arquivos (padrão: nome).")
+    parser.add_argument('--memoria-mb', type=float, default=motor_area.ORCAMENTO_MEMORIA_PADRAO / (1024 * 1024),
+                        help="Memória máxima para o mosaico de cada polígono, em MB; acima dela é gravado em faixas (padrão: 256).")
+    parser.add_argument('--simplificar', action='store_true',
+                        help="Simplifica os polígonos na grade dos tiles, sem mudar o corte, com cache em disco.")
+    args = parser.parse_args()
+
+    # Verificar se os caminhos de entrada existem
+    verificar_entrada_existente(args.raster_folder)
+    verificar_entrada_existente(args.vector_path)
+
+    # Criar o diretório de saída, se não existir
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    cortar_dos_tiles(args.raster_folder, args.vector_path, args.output_dir, args.campo,
+                     int(args.memoria_mb * 1024 * 1024), args.simplificar)
+
+if __name__ == "__main__":
+    main()
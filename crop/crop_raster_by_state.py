@@ -2,9 +2,24 @@
 
 import os
 import sys
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import rasterio
 import geopandas as gpd
-from rasterio.mask import mask
+from rasterio.features import geometry_mask
+from rasterio.mask import mask, geometry_window
+from rasterio.windows import Window
+
+# Módulos compartilhados com os scripts de área (índice de zonas em cache)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "area"))
+import indice_zonas
+import leitura_antecipada
+import motor_area
+
+import geometria_simplificada
+import vrt_recorte
 
 def verificar_entrada_existente(caminho):
     """
@@ -13,7 +28,257 @@ def verificar_entrada_existente(caminho):
     if not os.path.exists(caminho):
         raise FileNotFoundError(f"Arquivo ou diretório não encontrado: {caminho}")
 
-def cortar_raster_por_estado(raster_path, estados_shp_path, output_dir):
+def iterar_cortes_com_indice(src, indice_src, zona_id, faixas):
+    """
+    Corta faixas da janela de um estado usando o índice de zonas rasterizado, sem rasterizar
+    o polígono de novo. Cada faixa equivale ao trecho correspondente de `mask(src, geometria, crop=True)`.
+
+    Todos os blocos das faixas passam por uma única leitura antecipada: enquanto um bloco é
+    copiado, os seguintes (da mesma faixa ou da próxima) já estão sendo lidos em threads, que
+    abrem o raster com as mesmas opções de `src`. Em rasters com tiles, blocos sem nenhum pixel
+    do estado e blocos não gravados (tiles esparsos) não são decodificados, ficando com nodata;
+    em rasters em faixas de linhas inteiras, cada faixa é lida de uma vez.
+
+    Gera tuplas (faixa, out_image), na ordem de `faixas`; cada out_image é um array novo.
+    """
+    faixas = list(faixas)
+    nodata = src.nodata if src.nodata is not None else 0
+    por_bloco = src.block_shapes[0][1] < src.width
+    blocos_faixas = [list(motor_area.blocos_da_janela(src, faixa)) if por_bloco else [faixa] for faixa in faixas]
+
+    def ler(fontes, bloco, posicao):
+        fonte, indice = fontes
+        forma = (int(bloco.height), int(bloco.width))
+        zonas = indice.read(1, window=bloco,
+                            out=leitura_antecipada.buffer_do_anel(posicao, "zonas", forma, indice.dtypes[0]))
+        no_estado = zonas == zona_id
+        if not no_estado.any() or (por_bloco and fonte.count == 1 and motor_area.bloco_esparso(fonte, bloco)):
+            return None
+        saida = leitura_antecipada.buffer_do_anel(posicao, "raster", (fonte.count, *forma), fonte.dtypes[0])
+        return no_estado, fonte.read(window=bloco, out=saida)
+
+    leituras = leitura_antecipada.iterar_leituras([src.name, indice_src.name],
+                                                  [bloco for blocos in blocos_faixas for bloco in blocos], ler,
+                                                  opcoes=[src.options, indice_src.options])
+    pulados = 0
+    try:
+        for faixa, blocos in zip(faixas, blocos_faixas):
+            out_image = np.full((src.count, int(faixa.height), int(faixa.width)), nodata, dtype=src.dtypes[0])
+            for bloco, lido in (next(leituras) for _ in blocos):
+                if lido is None:
+                    pulados += 1
+                    continue
+                # Linhas e colunas de `out_image` cobertas pelo bloco
+                linha, coluna = int(bloco.row_off - faixa.row_off), int(bloco.col_off - faixa.col_off)
+                linhas, colunas = slice(linha, linha + int(bloco.height)), slice(coluna, coluna + int(bloco.width))
+                no_estado, dados = lido
+                out_image[:, linhas, colunas] = np.where(no_estado, dados, nodata)
+            yield faixa, out_image
+    finally:
+        leituras.close()
+
+    if pulados:
+        total = sum(len(blocos) for blocos in blocos_faixas)
+        print(f"INFO: {pulados} de {total} blocos pulados sem decodificar (vazios ou fora do estado).")
+
+def cortar_com_indice_zonas(src, indice_src, geometria_estado, zona_id, janela=None):
+    """
+    Corta o raster para um estado usando o índice de zonas rasterizado (ver `iterar_cortes_com_indice`).
+    Equivale a `mask(src, geometria_estado, crop=True)`.
+
+    Com `janela`, corta só essa parte (uma faixa) da janela do estado.
+
+    Retorna uma tupla (out_image, out_transform).
+    """
+    if janela is None:
+        janela = geometry_window(src, geometria_estado)
+    _, out_image = next(iterar_cortes_com_indice(src, indice_src, zona_id, [janela]))
+    return out_image, src.window_transform(janela)
+
+def cortar_com_geometria(src, geometria_estado, janela):
+    """
+    Corta uma faixa da janela do estado rasterizando o polígono só nessa faixa.
+    Equivale ao trecho correspondente de `mask(src, geometria_estado, crop=True)`.
+
+    Retorna uma tupla (out_image, out_transform).
+    """
+    nodata = src.nodata if src.nodata is not None else 0
+    out_transform = src.window_transform(janela)
+    out_image = src.read(window=janela)
+    fora = geometry_mask(geometria_estado, out_shape=out_image.shape[1:], transform=out_transform)
+    out_image[:, fora] = nodata
+    return out_image, out_transform
+
+def perfil_estado(src, janela):
+    """
+    Monta os metadados do raster cortado de um estado a partir da janela dele no raster de entrada.
+    """
+    out_meta = src.meta.copy()
+    out_meta.update({
+        "driver": "GTiff",
+        "height": int(janela.height),
+        "width": int(janela.width),
+        "transform": src.window_transform(janela)
+    })
+    return out_meta
+
+def cortar_estado(src, indice_src, nome, geometria_estado, zona_id, output_dir,
+                  orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO):
+    """
+    Corta o raster para um estado e salva o GeoTIFF no diretório de saída.
+
+    Parâmetros:
+    - src: Dataset do raster de entrada, aberto com `rasterio.open`.
+    - indice_src: Dataset do índice de zonas, ou None para usar `mask`.
+    - nome: Nome do estado (usado no nome do arquivo).
+    - geometria_estado: Lista com a geometria do estado.
+    - zona_id: Id do estado no índice de zonas (ignorado sem índice).
+    - output_dir: Diretório onde o raster cortado será salvo.
+    - orcamento_memoria: Ver `cortar_raster_por_estado`.
+
+    Retorna o caminho do raster cortado.
+    """
+    janela = geometry_window(src, geometria_estado)
+    out_meta = perfil_estado(src, janela)
+
+    # Caminho do arquivo cortado
+    output_raster_path = os.path.join(output_dir, f"raster_{nome}.tif")
+
+    bandas = src.count + (indice_src is not None)
+    if motor_area.escolher_leitura(janela.width, janela.height, src.dtypes[0], bandas, orcamento_memoria,
+                                   f"estado {nome}"):
+        # Cortar o raster para o estado de uma vez
+        if indice_src is not None:
+            out_image, _ = cortar_com_indice_zonas(src, indice_src, geometria_estado, zona_id, janela)
+        else:
+            out_image, _ = mask(src, geometria_estado, crop=True)
+
+        # Salvar o raster cortado
+        with rasterio.open(output_raster_path, "w", **out_meta) as dest:
+            dest.write(out_image)
+    else:
+        # Cortar e gravar em faixas de linhas que caibam no orçamento
+        bytes_pixel = motor_area.bytes_por_pixel(src.dtypes[0]) * bandas
+        with rasterio.open(output_raster_path, "w", **out_meta) as dest:
+            faixas = motor_area.iterar_faixas(src, orcamento_memoria, bytes_pixel, janela)
+            if indice_src is not None:
+                # Uma só leitura antecipada para todos os blocos do estado
+                partes = iterar_cortes_com_indice(src, indice_src, zona_id, faixas)
+            else:
+                partes = ((faixa, cortar_com_geometria(src, geometria_estado, faixa)[0]) for faixa in faixas)
+            for faixa, parte in partes:
+                dest.write(parte, window=Window(0, int(faixa.row_off - janela.row_off),
+                                                int(faixa.width), int(faixa.height)))
+
+    print(f"Raster cortado para o estado {nome} salvo em: {output_raster_path}")
+    return output_raster_path
+
+def _cortar_estado_em_processo(raster_path, indice_path, nome, geometrias, zona_id, output_dir, orcamento_memoria):
+    """
+    Corta um estado em um processo separado, abrindo os seus próprios datasets.
+
+    Handles do rasterio não podem ser compartilhados entre processos; cada tarefa recebe
+    só os caminhos e as geometrias do seu estado.
+    """
+    with rasterio.open(raster_path) as src:
+        indice_src = rasterio.open(indice_path) if indice_path else None
+        try:
+            return cortar_estado(src, indice_src, nome, geometrias, zona_id, output_dir, orcamento_memoria)
+        finally:
+            if indice_src is not None:
+                indice_src.close()
+
+def dividir_em_passada_unica(src, indice_path, estados, output_dir,
+                             orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO):
+    """
+    Corta todos os estados lendo o raster de entrada uma única vez.
+
+    O raster é percorrido bloco a bloco; os ids de zona de cada bloco vêm do índice de zonas
+    e os pixels de cada estado presente são gravados direto no raster cortado dele, mantido
+    aberto durante toda a passada. Blocos fora de todos os estados e blocos não gravados
+    (tiles esparsos) não são lidos. O resultado é o mesmo do corte com o índice de zonas.
+
+    Parâmetros:
+    - src: Dataset do raster de entrada, aberto com `rasterio.open`.
+    - indice_path: Caminho do índice de zonas, na grade de `src`.
+    - estados: Lista de tuplas (nome, geometrias, zona_id). Feições com o mesmo id (ex.: ilhas
+      de um estado) são gravadas no mesmo raster, cuja janela envolve todas elas.
+    - output_dir: Diretório onde os rasters cortados serão salvos.
+    - orcamento_memoria: Memória máxima (em bytes) para as janelas lidas à frente.
+
+    Retorna uma lista com os caminhos dos rasters cortados, um por estado, na ordem de `estados`.
+    """
+    nodata = src.nodata if src.nodata is not None else 0
+
+    # Um raster por zona, com a janela de todas as feições dela
+    nomes_zonas, geometrias_zonas = {}, {}
+    for nome, geometrias, zona_id in estados:
+        nomes_zonas.setdefault(zona_id, nome)
+        geometrias_zonas.setdefault(zona_id, []).extend(geometrias)
+    janelas_estados = {zona_id: geometry_window(src, geometrias) for zona_id, geometrias in geometrias_zonas.items()}
+    caminhos = {zona_id: os.path.join(output_dir, f"raster_{nome}.tif") for zona_id, nome in nomes_zonas.items()}
+
+    # Em rasters com tiles, bloco a bloco; em faixas de linhas inteiras, faixas dentro do orçamento
+    antecipacao = leitura_antecipada.ANTECIPACAO_PADRAO
+    bytes_pixel = motor_area.bytes_por_pixel(src.dtypes[0]) * (src.count + 1)
+    if src.block_shapes[0][1] >= src.width:
+        janelas = motor_area.iterar_faixas(src, orcamento_memoria // (antecipacao + 1), bytes_pixel)
+    else:
+        janelas = motor_area.iterar_janelas(src, orcamento_memoria // (antecipacao + 1) // (src.count + 1))
+
+    def ler(fontes, janela, posicao):
+        fonte, indice = fontes
+        forma = (int(janela.height), int(janela.width))
+        zonas = indice.read(1, window=janela,
+                            out=leitura_antecipada.buffer_do_anel(posicao, "zonas", forma, indice.dtypes[0]))
+        if not zonas.any() or (fonte.count == 1 and motor_area.bloco_esparso(fonte, janela)):
+            return zonas, None
+        saida = leitura_antecipada.buffer_do_anel(posicao, "raster", (fonte.count, *forma), fonte.dtypes[0])
+        return zonas, fonte.read(window=janela, out=saida)
+
+    destinos = {}
+    try:
+        for zona_id, caminho in caminhos.items():
+            destinos[zona_id] = rasterio.open(caminho, "w", **perfil_estado(src, janelas_estados[zona_id]))
+
+        lidos = total = 0
+        for janela, (zonas, dados) in leitura_antecipada.iterar_leituras([src.name, indice_path], janelas, ler,
+                                                                         antecipacao, [src.options, {}]):
+            total += 1
+            if dados is None:
+                continue
+            lidos += 1
+            for zona_id in np.flatnonzero(np.bincount(zonas.ravel())):
+                if zona_id not in destinos:
+                    continue
+
+                # Parte do bloco que cai na janela do estado
+                janela_estado = janelas_estados[zona_id]
+                linha_ini = max(int(janela.row_off), int(janela_estado.row_off))
+                col_ini = max(int(janela.col_off), int(janela_estado.col_off))
+                linha_fim = min(int(janela.row_off + janela.height), int(janela_estado.row_off + janela_estado.height))
+                col_fim = min(int(janela.col_off + janela.width), int(janela_estado.col_off + janela_estado.width))
+                if linha_ini >= linha_fim or col_ini >= col_fim:
+                    continue
+
+                linhas = slice(linha_ini - int(janela.row_off), linha_fim - int(janela.row_off))
+                colunas = slice(col_ini - int(janela.col_off), col_fim - int(janela.col_off))
+                parte = np.where(zonas[linhas, colunas] == zona_id, dados[:, linhas, colunas], nodata)
+                destinos[zona_id].write(parte, window=Window(col_ini - int(janela_estado.col_off),
+                                                             linha_ini - int(janela_estado.row_off),
+                                                             col_fim - col_ini, linha_fim - linha_ini))
+    finally:
+        for destino in destinos.values():
+            destino.close()
+
+    print(f"INFO: {lidos} de {total} blocos lidos do raster de entrada em uma única passada.")
+    for zona_id, caminho in caminhos.items():
+        print(f"Raster cortado para o estado {nomes_zonas[zona_id]} salvo em: {caminho}")
+    return list(caminhos.values())
+
+def cortar_raster_por_estado(raster_path, estados_shp_path, output_dir, usar_indice_zonas=False, diretorio_cache=None,
+                             orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO, workers=1, passada_unica=False,
+                             vrt=False, simplificar=False):
     """
     Corta o raster para cada estado do shapefile e salva no diretório de saída.
     
@@ -21,66 +286,131 @@ def cortar_raster_por_estado(raster_path, estados_shp_path, output_dir):
     - raster_path: Caminho para o raster de entrada.
     - estados_shp_path: Caminho para o shapefile dos estados da Amazônia Legal.
     - output_dir: Diretório onde os rasters cortados serão salvos.
+    - usar_indice_zonas: Se True, usa o índice de zonas rasterizado em cache (compartilhado com
+      `calcular_area_por_estado*`) em vez de rasterizar cada polígono a cada execução.
+    - diretorio_cache: Diretório do cache de índices de zonas (opcional).
+    - orcamento_memoria: Memória máxima (em bytes) para cortar um estado. Estados cuja janela
+      não cabe nele (ou em metade da RAM disponível) são cortados e gravados em faixas de linhas.
+    - workers: Número de processos. Com mais de um, os estados são cortados em paralelo,
+      dos de maior retângulo envolvente para os menores, e o orçamento é dividido entre eles.
+    - passada_unica: Se True, lê o raster uma única vez e grava todos os estados na mesma
+      passada (ver `dividir_em_passada_unica`); usa o índice de zonas.
+    - vrt: Se True, grava para cada estado um VRT com o polígono como linha de corte, sem copiar
+      pixels (ver `vrt_recorte`); `materializar_vrt.py` os converte em GeoTIFFs depois.
+    - simplificar: Se True, usa os polígonos simplificados na grade do raster, em cache
+      (ver `geometria_simplificada`), para cortar e para as linhas de corte dos VRTs.
     
-    Retorna uma lista com os caminhos dos rasters cortados.
+    Retorna uma lista com os caminhos dos rasters cortados, um por estado (feições com o mesmo
+    nome são cortadas juntas), na ordem do shapefile.
     """
     verificar_entrada_existente(raster_path)
     verificar_entrada_existente(estados_shp_path)
 
-    # Carregar o shapefile dos estados
-    estados_shp = gpd.read_file(estados_shp_path)
-
     # Abrir o raster de entrada
-    raster_cortado_paths = []
     with rasterio.open(raster_path) as src:
+        # Carregar o shapefile dos estados (simplificado na grade do raster, se pedido)
+        if simplificar:
+            estados_shp = geometria_simplificada.carregar_geometrias_simplificadas(estados_shp_path, src.crs,
+                                                                                   src.transform)
+        else:
+            estados_shp = gpd.read_file(estados_shp_path)
+
+        indice_path, ids = None, {}
+        if (usar_indice_zonas or passada_unica) and not vrt:
+            # Os VRTs usam o polígono como linha de corte; o índice não seria usado
+            indice_path, nomes = indice_zonas.obter_indice_zonas(src, estados_shp_path, "nome", diretorio_cache)
+            ids = {nome: i + 1 for i, nome in enumerate(nomes)}
+
+            # O índice está na grade do raster; as janelas precisam das geometrias no mesmo CRS
+            if src.crs is not None and estados_shp.crs != src.crs:
+                estados_shp = estados_shp.to_crs(src.crs)
+
+        if vrt and src.crs is not None and estados_shp.crs != src.crs:
+            estados_shp = estados_shp.to_crs(src.crs)
+
+        # Feições com o mesmo nome (ex.: ilhas de um estado) formam um único corte
+        geometrias_estados = {}
         for estado in estados_shp.itertuples():
-            geometria_estado = [estado.geometry]
+            geometrias_estados.setdefault(estado.nome, []).append(estado.geometry)
+        estados = [(nome, geometrias, ids.get(str(nome))) for nome, geometrias in geometrias_estados.items()]
 
-            # Cortar o raster para o estado
-            out_image, out_transform = mask(src, geometria_estado, crop=True)
-            
-            # Atualizar metadados
-            out_meta = src.meta.copy()
-            out_meta.update({
-                "driver": "GTiff",
-                "height": out_image.shape[1],
-                "width": out_image.shape[2],
-                "transform": out_transform
-            })
+        if vrt:
+            raster_cortado_paths = []
+            for nome, geometrias, _ in estados:
+                output_raster_path = vrt_recorte.gravar_vrt_recorte(raster_path, geometrias,
+                                                                    os.path.join(output_dir, f"raster_{nome}.vrt"))
+                raster_cortado_paths.append(output_raster_path)
+                print(f"Recorte virtual do estado {nome} salvo em: {output_raster_path}")
+            return raster_cortado_paths
 
-            # Caminho do arquivo cortado
-            output_raster_path = os.path.join(output_dir, f"raster_{estado.nome}.tif")
-            raster_cortado_paths.append(output_raster_path)
+        if passada_unica:
+            return dividir_em_passada_unica(src, indice_path, estados, output_dir, orcamento_memoria)
 
-            # Salvar o raster cortado
-            with rasterio.open(output_raster_path, "w", **out_meta) as dest:
-                dest.write(out_image)
+        if workers <= 1:
+            indice_src = rasterio.open(indice_path) if indice_path else None
+            try:
+                return [cortar_estado(src, indice_src, nome, geometrias, zona_id, output_dir, orcamento_memoria)
+                        for nome, geometrias, zona_id in estados]
+            finally:
+                if indice_src is not None:
+                    indice_src.close()
 
-            print(f"Raster cortado para o estado {estado.nome} salvo em: {output_raster_path}")
+    # Os estados maiores começam primeiro, para que nenhum fique sozinho no fim
+    def area_envolvente(i):
+        limites = np.array([geometria.bounds for geometria in estados[i][1]])
+        return (limites[:, 2].max() - limites[:, 0].min()) * (limites[:, 3].max() - limites[:, 1].min())
+    ordem = sorted(range(len(estados)), key=area_envolvente, reverse=True)
 
-    return raster_cortado_paths
+    # Usar "spawn" para não herdar o estado interno do GDAL do processo pai
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=contexto) as executor:
+        futuros = {i: executor.submit(_cortar_estado_em_processo, raster_path, indice_path, *estados[i], output_dir,
+                                      orcamento_memoria // workers)
+                   for i in ordem}
+        return [futuros[i].result() for i in range(len(estados))]
 
 def main():
-    if len(sys.argv) != 4:
-        print("Uso correto: python cortar_raster_por_estado.py <raster.tif> <estados.shp> <output_dir>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Corta o raster para cada estado do shapefile.")
+    parser.add_argument('raster_path', type=str, help="Caminho para o raster de entrada.")
+    parser.add_argument('estados_shp_path', type=str, help="Caminho para o shapefile dos estados.")
+    parser.add_argument('output_dir', type=str, help="Diretório onde os rasters cortados serão salvos.")
+    parser.add_argument('--indice-zonas', action='store_true',
+                        help="Usa o índice de zonas rasterizado em cache (o mesmo de calcular_area_por_estado*).")
+    parser.add_argument('--cache-zonas', type=str, default=None,
+                        help="Diretório do cache de índices de zonas (padrão: $GEOWRI_CACHE ou ~/.cache/geowri).")
+    parser.add_argument('--memoria-mb', type=float, default=motor_area.ORCAMENTO_MEMORIA_PADRAO / (1024 * 1024),
+                        help="Memória máxima para cortar cada estado, em MB; acima dela o corte é gravado em faixas (padrão: 256).")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Número de processos para cortar os estados em paralelo (padrão: 1).")
+    parser.add_argument('--passada-unica', action='store_true',
+                        help="Lê o raster uma única vez e grava todos os estados na mesma passada (usa o índice de zonas).")
+    parser.add_argument('--vrt', action='store_true',
+                        help="Grava VRTs com o polígono como linha de corte, sem copiar pixels (ver materializar_vrt.py).")
+    parser.add_argument('--simplificar', action='store_true',
+                        help="Simplifica os polígonos na grade do raster, sem mudar o corte, com cache em disco.")
+    args = parser.parse_args()
 
-    # Capturar os argumentos da linha de comando
-    raster_path = sys.argv[1]
-    estados_shp_path = sys.argv[2]
-    output_dir = sys.argv[3]
+    if args.passada_unica and args.workers > 1:
+        parser.error("--passada-unica lê o raster em um único processo; não use com --workers.")
+    if args.vrt and args.passada_unica:
+        parser.error("--vrt não copia pixels; não use com --passada-unica.")
+    if args.vrt and args.workers > 1:
+        parser.error("--vrt só grava os VRTs, sem processos em paralelo; não use com --workers.")
+    if args.vrt and args.indice_zonas:
+        parser.error("--vrt usa o polígono como linha de corte, sem o índice de zonas; não use com --indice-zonas.")
 
     # Verificar se os caminhos de entrada existem
-    verificar_entrada_existente(raster_path)
-    verificar_entrada_existente(estados_shp_path)
+    verificar_entrada_existente(args.raster_path)
+    verificar_entrada_existente(args.estados_shp_path)
     
     # Criar o diretório de saída, se não existir
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
 
     # Cortar o raster para cada estado e salvar no diretório de saída
-    cortar_raster_por_estado(raster_path, estados_shp_path, output_dir)
+    cortar_raster_por_estado(args.raster_path, args.estados_shp_path, args.output_dir,
+                             args.indice_zonas, args.cache_zonas, int(args.memoria_mb * 1024 * 1024), args.workers,
+                             args.passada_unica, args.vrt, args.simplificar)
 
 if __name__ == "__main__":
     main()
-
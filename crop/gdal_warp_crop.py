@@ -3,18 +3,24 @@ import os
 import sys
 import fiona
 from osgeo import gdal, ogr
+from rasterio.transform import Affine
+
+import geometria_simplificada
 
 # Habilitar exceções no GDAL
 gdal.UseExceptions()
 
-def cortar_raster_com_shapefile(raster_path, shapefile_path, output_path):
+def cortar_raster_com_shapefile(raster_path, shapefile_path, output_path, simplificar=False):
     """
     Corta um arquivo raster com um shapefile.
 
     Parâmetros:
     raster_path (str): Caminho para o arquivo raster (.tif).
     shapefile_path (str): Caminho para o shapefile (.shp).
-    output_path (str): Caminho para salvar o arquivo raster cortado.
+    output_path (str): Caminho para salvar o arquivo raster cortado. Com a extensão .vrt, grava
+    um VRT com o shapefile embutido como linha de corte, sem copiar pixels.
+    simplificar (bool): Se True, usa como linha de corte os polígonos simplificados na grade
+    do raster, sem mudar o corte, em cache (ver geometria_simplificada.py).
 
     Retorno:
     None. O arquivo cortado será salvo no local especificado.
@@ -29,9 +35,15 @@ def cortar_raster_com_shapefile(raster_path, shapefile_path, output_path):
     # Definir o driver GeoTIFF
     driver = gdal.GetDriverByName('GTiff')
 
-    # Criar o recorte utilizando o shapefile
+    # Linha de corte simplificada na grade do raster (já no CRS dele)
+    if simplificar:
+        shapefile_path = geometria_simplificada.obter_geometrias_simplificadas(
+            shapefile_path, raster.GetProjection() or None, Affine.from_gdal(*raster.GetGeoTransform()))
+
+    # Criar o recorte utilizando o shapefile; um VRT guarda só a referência à origem e a linha de corte
+    formato = "VRT" if output_path.lower().endswith(".vrt") else "GTiff"
     options = gdal.WarpOptions(
-        format="GTiff", cutlineDSName=shapefile_path, cropToCutline=True
+        format=formato, cutlineDSName=shapefile_path, cropToCutline=True
     )
     print(f"INFO: Cortando o raster {raster_path} com o shapefile {shapefile_path}...")
 
@@ -42,16 +54,18 @@ def cortar_raster_com_shapefile(raster_path, shapefile_path, output_path):
 
 # Função principal para capturar os argumentos da linha de comando
 def main():
-    if len(sys.argv) != 4:
-        print("Uso correto: python cortar_raster_com_shapefile.py raster.tif shapefile.shp output_cortado.tif")
+    argumentos = [argumento for argumento in sys.argv[1:] if argumento != "--simplificar"]
+    if len(argumentos) != 3:
+        print("Uso correto: python cortar_raster_com_shapefile.py raster.tif shapefile.shp output_cortado.tif [--simplificar]")
         sys.exit(1)
 
-    raster_path = sys.argv[1]
-    shapefile_path = sys.argv[2]
-    output_path = sys.argv[3]
+    raster_path = argumentos[0]
+    shapefile_path = argumentos[1]
+    output_path = argumentos[2]
+    simplificar = len(argumentos) < len(sys.argv) - 1
 
     try:
-        cortar_raster_com_shapefile(raster_path, shapefile_path, output_path)
+        cortar_raster_com_shapefile(raster_path, shapefile_path, output_path, simplificar)
     except Exception as e:
         print(f"Erro: {e}")
 
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Geometrias simplificadas na grade do raster, em cache.
+
+Os limites oficiais de estados e municípios têm milhões de vértices, e rasterizá-los
+(em `mask`, `geometry_mask` ou na linha de corte do `gdal.Warp`) domina o tempo do corte
+em rasters grossos. Vértices que se desviam menos que uma fração do pixel raramente mudam
+quais pixels ficam dentro do polígono, então as geometrias são simplificadas com tolerância
+de `TOLERANCIA_PIXELS_PADRAO` pixel: camadas que formam uma cobertura (estados, municípios)
+com `shapely.coverage_simplify`, que simplifica cada divisa uma única vez para os dois lados;
+as demais com Douglas-Peucker, preservando a topologia de cada polígono.
+
+Cada geometria simplificada é conferida na grade do raster: a janela de corte e a máscara
+de pixels precisam ser idênticas às da original. Os poucos pixels cuja decisão muda são
+corrigidos com quadrados minúsculos nos seus centros e, se o ajuste não compensar, a
+geometria fica com a original. O corte com a camada simplificada é, portanto, idêntico ao
+corte com a original.
+
+A camada simplificada fica em cache em disco (GeoPackage), com chave formada pelo hash do
+conteúdo do arquivo vetorial, pelo CRS, pela resolução e pelo alinhamento da grade do raster.
+Cortes seguintes de qualquer raster com a mesma grade (ex.: os tiles de um mosaico) carregam
+a camada pronta.
+"""
+
+import hashlib
+import json
+import math
+import os
+import sys
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from pyproj import CRS
+from rasterio.features import bounds, geometry_mask
+from rasterio.transform import Affine
+
+# Reutiliza o hash de arquivos vetoriais do índice de zonas e o orçamento de memória do motor
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "area"))
+import indice_zonas
+import motor_area
+
+# Desvio máximo da geometria simplificada, em pixels
+TOLERANCIA_PIXELS_PADRAO = 0.1
+
+# Lado dos quadrados de correção de pixels, em pixels: pequeno o bastante para não alcançar
+# outro centro de pixel
+_LADO_CORRECAO = 1e-3
+
+def diretorio_cache_padrao():
+    """
+    Retorna o diretório padrão do cache de geometrias simplificadas.
+
+    Usa a variável de ambiente GEOWRI_CACHE, se definida, ou ~/.cache/geowri.
+    """
+    base = os.environ.get("GEOWRI_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "geowri")
+    return os.path.join(base, "geometrias_simplificadas")
+
+def assinatura_grade(transform):
+    """
+    Retorna a resolução e o alinhamento (origem módulo o pixel) de uma grade sem rotação.
+
+    Rasters com a mesma assinatura têm os centros de pixel nas mesmas posições, e portanto
+    as mesmas decisões de pixel para qualquer geometria.
+    """
+    if transform.b != 0 or transform.d != 0:
+        raise ValueError("A simplificação de geometrias não suporta rasters rotacionados.")
+    xres, yres = abs(transform.a), abs(transform.e)
+    alinhamento = [round((transform.c % xres) / xres, 9) % 1.0, round((transform.f % yres) / yres, 9) % 1.0]
+    return {"resolucao": [float(xres), float(yres)], "alinhamento": alinhamento}
+
+def chave_geometrias(hash_vetor, crs, transform, fator):
+    """
+    Calcula a chave do cache para a combinação (conteúdo do vetor, CRS, grade, fração do pixel).
+    """
+    assinatura = json.dumps({"vetor": hash_vetor, "crs": crs.to_wkt() if crs is not None else None,
+                             "grade": assinatura_grade(transform), "fator": float(fator)}, sort_keys=True)
+    return hashlib.sha256(assinatura.encode()).hexdigest()[:32]
+
+def janela_em_pixels(geometria, transform):
+    """
+    Retorna a janela (linha, coluna, altura, largura) de pixels que envolve a geometria na
+    grade, com o mesmo arredondamento de `rasterio.mask.geometry_window`.
+    """
+    esquerda, baixo, direita, topo = bounds(geometria, transform=~transform)
+    linha, coluna = math.floor(min(topo, baixo)), math.floor(min(esquerda, direita))
+    return linha, coluna, math.ceil(max(topo, baixo)) - linha, math.ceil(max(esquerda, direita)) - coluna
+
+def _faixas_da_janela(janela, transform, orcamento_memoria):
+    """
+    Gera (linha inicial, forma, transform) das faixas de linhas da janela que caibam no orçamento.
+    """
+    linha, coluna, altura, largura = janela
+    linhas_faixa = max(1, int(orcamento_memoria // (2 * max(1, largura))))
+    for inicio in range(0, altura, linhas_faixa):
+        forma = (min(linhas_faixa, altura - inicio), largura)
+        yield linha + inicio, forma, transform * Affine.translation(coluna, linha + inicio)
+
+def _quadrados(pontos, lado):
+    """
+    Retorna quadrados de lado `lado` centrados nos pontos (array N x 2).
+    """
+    meio = lado / 2
+    return shapely.box(pontos[:, 0] - meio, pontos[:, 1] - meio, pontos[:, 0] + meio, pontos[:, 1] + meio)
+
+def ajustar_corte(original, simplificada, transform, orcamento_memoria=motor_area.ORCAMENTO_MEMORIA_PADRAO):
+    """
+    Ajusta a geometria simplificada para que produza o mesmo corte da original na grade:
+    mesma janela e mesma máscara de pixels (centro do pixel dentro do polígono, como em `mask`).
+
+    A janela é corrigida recortando a simplificada pelo retângulo envolvente da original e
+    acrescentando quadrados minúsculos nos seus vértices extremos. Os pixels cuja decisão
+    mudou recebem um quadrado minúsculo no centro, somado ou subtraído da geometria; como o
+    quadrado não alcança outro centro, só aquele pixel muda. A original é rasterizada uma
+    única vez, em faixas de linhas que caibam no orçamento de memória, e o resultado é
+    conferido contra a máscara da simplificada com os pixels corrigidos.
+
+    Retorna a geometria ajustada, ou None se o ajuste não reduzir vértices ou não reproduzir o corte.
+    """
+    janela = janela_em_pixels(original, transform)
+    lado = _LADO_CORRECAO * min(abs(transform.a), abs(transform.e))
+    if janela_em_pixels(simplificada, transform) != janela:
+        vertices = shapely.get_coordinates(original)
+        extremos = vertices[[vertices[:, 0].argmin(), vertices[:, 0].argmax(),
+                             vertices[:, 1].argmin(), vertices[:, 1].argmax()]]
+        simplificada = shapely.intersection(shapely.union_all([simplificada, *_quadrados(extremos, lado)]),
+                                            shapely.box(*original.bounds))
+        if janela_em_pixels(simplificada, transform) != janela:
+            return None
+
+    # Pixels com decisão diferente, por faixa: (linhas, colunas) globais e se ficam dentro
+    linhas, colunas, dentro = [], [], []
+    for inicio, forma, transform_faixa in _faixas_da_janela(janela, transform, orcamento_memoria):
+        fora_original = geometry_mask([original], out_shape=forma, transform=transform_faixa)
+        fora_simplificada = geometry_mask([simplificada], out_shape=forma, transform=transform_faixa)
+        linhas_faixa, colunas_faixa = np.nonzero(fora_original != fora_simplificada)
+        linhas.append(linhas_faixa + inicio)
+        colunas.append(colunas_faixa + janela[1])
+        dentro.append(~fora_original[linhas_faixa, colunas_faixa])
+    linhas, colunas, dentro = np.concatenate(linhas), np.concatenate(colunas), np.concatenate(dentro)
+
+    # Cada correção acrescenta 5 vértices; sem ganho, fica a original
+    vertices_ajustada = shapely.get_num_coordinates(simplificada) + 5 * linhas.size
+    if vertices_ajustada >= shapely.get_num_coordinates(original):
+        return None
+
+    ajustada = simplificada
+    if linhas.size:
+        centros = np.column_stack(transform * (colunas + 0.5, linhas + 0.5))
+        if dentro.any():
+            ajustada = shapely.union_all([ajustada, *_quadrados(centros[dentro], lado)])
+        if not dentro.all():
+            ajustada = shapely.difference(ajustada, shapely.union_all(_quadrados(centros[~dentro], lado)))
+        if janela_em_pixels(ajustada, transform) != janela:
+            return None
+
+    # Conferência: a ajustada deve reproduzir a simplificada com os pixels corrigidos
+    for inicio, forma, transform_faixa in _faixas_da_janela(janela, transform, orcamento_memoria):
+        esperado = geometry_mask([simplificada], out_shape=forma, transform=transform_faixa)
+        na_faixa = (linhas >= inicio) & (linhas < inicio + forma[0])
+        esperado[linhas[na_faixa] - inicio, colunas[na_faixa] - janela[1]] = ~dentro[na_faixa]
+        if not np.array_equal(esperado, geometry_mask([ajustada], out_shape=forma, transform=transform_faixa)):
+            return None
+    return ajustada
+
+def _forma_cobertura(geometrias):
+    """
+    Verifica se as geometrias formam uma cobertura (polígonos sem sobreposição, com as divisas
+    coincidentes), condição para a simplificação de cobertura.
+    """
+    if not all(geometria.geom_type in ("Polygon", "MultiPolygon") for geometria in geometrias):
+        return False
+    try:
+        return bool(shapely.coverage_is_valid(geometrias))
+    except shapely.errors.GEOSException:
+        return False
+
+def simplificar_geometrias(vetor, transform, fator=TOLERANCIA_PIXELS_PADRAO):
+    """
+    Simplifica as geometrias de uma camada (já no CRS do raster) sem mudar o corte na grade `transform`.
+
+    Retorna uma cópia da camada com as geometrias simplificadas e ajustadas (ver `ajustar_corte`);
+    as que não podem ser ajustadas com ganho ficam com a original.
+    """
+    originais = np.asarray(vetor.geometry.values, dtype=object)
+    validos = np.array([geometria is not None and not geometria.is_empty for geometria in originais], dtype=bool)
+    geometrias = originais[validos]
+    cobertura = _forma_cobertura(geometrias)
+    tolerancia = fator * min(abs(transform.a), abs(transform.e))
+
+    if cobertura:
+        simplificadas = shapely.coverage_simplify(geometrias, tolerancia)
+    else:
+        simplificadas = shapely.simplify(geometrias, tolerancia, preserve_topology=True)
+
+    finais = geometrias.copy()
+    corrigidos = originais_mantidas = 0
+    for i, (geometria, candidata) in enumerate(zip(geometrias, simplificadas)):
+        ajustada = ajustar_corte(geometria, candidata, transform)
+        if ajustada is None:
+            originais_mantidas += 1
+            continue
+        finais[i] = ajustada
+        corrigidos += int(not shapely.equals_exact(ajustada, candidata, 0))
+
+    simplificada = vetor.copy()
+    geometrias_finais = originais.copy()
+    geometrias_finais[validos] = finais
+    simplificada.geometry = gpd.GeoSeries(geometrias_finais, index=vetor.index, crs=vetor.crs)
+
+    antes = int(shapely.get_num_coordinates(geometrias).sum())
+    depois = int(shapely.get_num_coordinates(finais).sum())
+    print(f"INFO: Geometrias simplificadas ({'cobertura' if cobertura else 'Douglas-Peucker'}, tolerância "
+          f"{tolerancia:.6g}): {antes} -> {depois} vértices; {corrigidos} corrigidas pixel a pixel e "
+          f"{originais_mantidas} de {geometrias.size} mantidas originais.")
+    return simplificada
+
+def _remover_versoes_antigas(diretorio_cache, vetor_path, hash_vetor):
+    """
+    Remove as entradas do cache geradas de outra versão do mesmo arquivo vetorial.
+    """
+    for nome in os.listdir(diretorio_cache):
+        if not nome.endswith(".json"):
+            continue
+        metadados_path = os.path.join(diretorio_cache, nome)
+        try:
+            with open(metadados_path) as f:
+                metadados = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if metadados.get("vetor_path") == vetor_path and metadados.get("hash_vetor") != hash_vetor:
+            for caminho in (metadados_path, metadados_path[:-len(".json")] + ".gpkg"):
+                if os.path.exists(caminho):
+                    os.remove(caminho)
+
+def obter_geometrias_simplificadas(vetor_path, crs, transform, fator=TOLERANCIA_PIXELS_PADRAO, diretorio_cache=None):
+    """
+    Obtém a camada vetorial reprojetada e simplificada para a grade de um raster, reutilizando o cache.
+
+    Parâmetros:
+    - vetor_path: Caminho do arquivo vetorial (ex.: shapefile dos estados).
+    - crs: CRS do raster (objeto CRS do rasterio, WKT ou código EPSG); None mantém o do vetor.
+    - transform: Transformação afim do raster (`src.transform`), que define a grade.
+    - fator: Tolerância da simplificação, em frações do menor lado do pixel.
+    - diretorio_cache: Diretório do cache (padrão: `diretorio_cache_padrao()`).
+
+    Retorna o caminho do GeoPackage com a camada simplificada (no CRS do raster), que pode
+    ser lido com `gpd.read_file` ou passado ao GDAL como linha de corte.
+    """
+    diretorio_cache = diretorio_cache or diretorio_cache_padrao()
+    os.makedirs(diretorio_cache, exist_ok=True)
+    crs = CRS.from_user_input(crs) if crs is not None else None
+    hash_vetor = indice_zonas.hash_vetor(vetor_path)
+    chave = chave_geometrias(hash_vetor, crs, transform, fator)
+    camada_path = os.path.join(diretorio_cache, chave + ".gpkg")
+    metadados_path = os.path.join(diretorio_cache, chave + ".json")
+
+    if os.path.exists(camada_path) and os.path.exists(metadados_path):
+        print(f"INFO: Reutilizando as geometrias simplificadas em cache: {camada_path}")
+        return camada_path
+
+    vetor = gpd.read_file(vetor_path)
+    if crs is not None and vetor.crs != crs:
+        vetor = vetor.to_crs(crs)
+    simplificada = simplificar_geometrias(vetor, transform, fator)
+
+    # Gravar em arquivos temporários e renomear, para nunca deixar uma entrada pela metade
+    sufixo = f".{os.getpid()}.tmp"
+    camada_temporaria = os.path.join(diretorio_cache, chave + sufixo + ".gpkg")
+    simplificada.to_file(camada_temporaria, driver="GPKG")
+    with open(metadados_path + sufixo, "w") as f:
+        json.dump({"vetor_path": os.path.abspath(vetor_path), "hash_vetor": hash_vetor,
+                   "crs": crs.to_wkt() if crs is not None else None,
+                   "grade": assinatura_grade(transform), "fator": float(fator)},
+                  f, ensure_ascii=False, indent=2)
+    os.replace(camada_temporaria, camada_path)
+    os.replace(metadados_path + sufixo, metadados_path)
+    print(f"INFO: Geometrias simplificadas salvas em cache: {camada_path}")
+
+    _remover_versoes_antigas(diretorio_cache, os.path.abspath(vetor_path), hash_vetor)
+    return camada_path
+
+def carregar_geometrias_simplificadas(vetor_path, crs, transform, fator=TOLERANCIA_PIXELS_PADRAO,
+                                      diretorio_cache=None):
+    """
+    Carrega a camada vetorial simplificada para a grade de um raster (ver `obter_geometrias_simplificadas`).
+
+    Retorna um GeoDataFrame no CRS do raster.
+    """
+    return gpd.read_file(obter_geometrias_simplificadas(vetor_path, crs, transform, fator, diretorio_cache))
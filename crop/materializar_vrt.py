@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Converte recortes virtuais (VRT) em GeoTIFFs reais, só quando forem necessários.
+
+Cada VRT é lido bloco a bloco pelo GDAL e copiado para um GeoTIFF com o mesmo nome
+(raster_PA.vrt -> raster_PA.tif), no mesmo diretório ou no diretório indicado.
+"""
+
+import os
+import glob
+import argparse
+
+import rasterio
+from rasterio.shutil import copy as copiar_raster
+
+def verificar_entrada_existente(caminho):
+    """
+    Verifica se o arquivo ou diretório existe.
+    """
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f"Arquivo ou diretório não encontrado: {caminho}")
+
+def listar_vrts(entradas):
+    """
+    Expande diretórios na lista de entradas para os VRTs que eles contêm.
+    """
+    vrts = []
+    for entrada in entradas:
+        verificar_entrada_existente(entrada)
+        if os.path.isdir(entrada):
+            vrts.extend(sorted(glob.glob(os.path.join(entrada, "*.vrt"))))
+        else:
+            vrts.append(entrada)
+    return vrts
+
+def materializar_vrt(vrt_path, output_dir=None, compressao=None):
+    """
+    Copia um VRT para um GeoTIFF.
+
+    Parâmetros:
+    - vrt_path: Caminho do VRT.
+    - output_dir: Diretório do GeoTIFF (padrão: o mesmo do VRT).
+    - compressao: Compressão do GeoTIFF (ex.: "DEFLATE"), opcional.
+
+    Retorna o caminho do GeoTIFF.
+    """
+    nome = os.path.splitext(os.path.basename(vrt_path))[0] + ".tif"
+    output_path = os.path.join(output_dir or os.path.dirname(os.path.abspath(vrt_path)), nome)
+
+    opcoes = {"BIGTIFF": "IF_SAFER"}
+    if compressao:
+        opcoes.update({"compress": compressao, "tiled": True})
+    with rasterio.open(vrt_path) as src:
+        copiar_raster(src, output_path, driver="GTiff", **opcoes)
+
+    print(f"Raster materializado salvo em: {output_path}")
+    return output_path
+
+def main():
+    # Configurar os argumentos da linha de comando
+    parser = argparse.ArgumentParser(description="Converter recortes virtuais (VRT) em GeoTIFFs.")
+    parser.add_argument('entradas', type=str, nargs='+', help="VRTs ou diretórios com VRTs.")
+    parser.add_argument('--saida', type=str, default=None, help="Diretório dos GeoTIFFs (padrão: o mesmo de cada VRT).")
+    parser.add_argument('--compressao', type=str, default=None, help="Compressão dos GeoTIFFs (ex.: DEFLATE, LZW).")
+    args = parser.parse_args()
+
+    # Criar o diretório de saída, se não existir
+    if args.saida and not os.path.exists(args.saida):
+        os.makedirs(args.saida)
+
+    for vrt_path in listar_vrts(args.entradas):
+        materializar_vrt(vrt_path, args.saida, args.compressao)
+
+if __name__ == "__main__":
+    main()
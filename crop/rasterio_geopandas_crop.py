@@ -4,29 +4,44 @@ import geopandas as gpd
 import rasterio
 from rasterio.mask import mask
 
-def recortar_raster_com_shapefile(raster_path, shapefile_path, output_raster_path):
+import geometria_simplificada
+import vrt_recorte
+
+def recortar_raster_com_shapefile(raster_path, shapefile_path, output_raster_path, simplificar=False):
     """
     Recorta um arquivo raster com base em um shapefile.
 
     Parâmetros:
     raster_path (str): Caminho para o arquivo raster (.tif).
     shapefile_path (str): Caminho para o arquivo shapefile (.shp).
-    output_raster_path (str): Caminho para salvar o arquivo raster recortado (.tif).
+    output_raster_path (str): Caminho para salvar o arquivo raster recortado (.tif). Com a extensão
+    .vrt, grava um recorte virtual, sem copiar pixels (ver materializar_vrt.py).
+    simplificar (bool): Se True, usa as geometrias simplificadas na grade do raster, em cache
+    (ver geometria_simplificada.py).
 
     Retorno:
     str: Caminho para o arquivo raster recortado.
     """
-    # Carregar o shapefile
-    brasil_shp = gpd.read_file(shapefile_path)
-    
     # Abrir o raster original
     with rasterio.open(raster_path) as src:
+        # Carregar o shapefile (simplificado na resolução do raster, se pedido)
+        if simplificar:
+            brasil_shp = geometria_simplificada.carregar_geometrias_simplificadas(shapefile_path, src.crs, src.transform)
+        else:
+            brasil_shp = gpd.read_file(shapefile_path)
+
         # Verificar se o shapefile e o raster estão no mesmo sistema de coordenadas
         if brasil_shp.crs != src.crs:
             brasil_shp = brasil_shp.to_crs(src.crs)
         
         # Obter as geometrias do shapefile
         geometries = brasil_shp.geometry.values
+
+        # Recorte virtual: só grava o VRT com as geometrias como linha de corte
+        if output_raster_path.lower().endswith(".vrt"):
+            vrt_recorte.gravar_vrt_recorte(raster_path, list(geometries), output_raster_path)
+            print(f'Recorte virtual salvo em: {output_raster_path}')
+            return output_raster_path
         
         # Recortar o raster usando o shapefile
         out_image, out_transform = mask(dataset=src, shapes=geometries, crop=True)
@@ -49,16 +64,18 @@ def recortar_raster_com_shapefile(raster_path, shapefile_path, output_raster_pat
 
 # Função principal para capturar os argumentos da linha de comando
 def main():
-    if len(sys.argv) != 4:
-        print("Uso correto: python recortar_raster.py raster.tif shapefile.shp output_raster.tif")
+    argumentos = [argumento for argumento in sys.argv[1:] if argumento != "--simplificar"]
+    if len(argumentos) != 3:
+        print("Uso correto: python recortar_raster.py raster.tif shapefile.shp output_raster.tif [--simplificar]")
         sys.exit(1)
 
-    raster_path = sys.argv[1]
-    shapefile_path = sys.argv[2]
-    output_raster_path = sys.argv[3]
+    raster_path = argumentos[0]
+    shapefile_path = argumentos[1]
+    output_raster_path = argumentos[2]
+    simplificar = len(argumentos) < len(sys.argv) - 1
 
     try:
-        recortar_raster_com_shapefile(raster_path, shapefile_path, output_raster_path)
+        recortar_raster_com_shapefile(raster_path, shapefile_path, output_raster_path, simplificar)
     except Exception as e:
         print(f"Erro: {e}")
         sys.exit(1)
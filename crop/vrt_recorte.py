@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Recorte virtual: em vez de copiar os pixels para um novo GeoTIFF, grava um VRT leve que
+aponta para a janela do raster de origem, com o polígono embutido como linha de corte
+(cutline) do GDAL. Gravar o VRT leva milissegundos; os pixels só são lidos (e cortados)
+por quem abrir o VRT, e `materializar_vrt.py` o converte em um arquivo real quando preciso.
+
+O resultado da leitura é o mesmo de `mask(src, geometrias, crop=True)`: pixels com o
+centro fora do polígono ficam com nodata.
+"""
+
+import os
+
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.mask import geometry_window
+from rasterio.vrt import WarpedVRT
+from shapely import affinity
+from shapely.geometry import shape
+from shapely.ops import unary_union
+
+def geometria_em_pixels(src, geometria):
+    """
+    Converte uma geometria (no CRS do raster) para coordenadas de coluna/linha do raster,
+    o sistema em que o GDAL espera a linha de corte.
+    """
+    if not hasattr(geometria, "geom_type"):
+        geometria = shape(geometria)
+    inversa = ~src.transform
+    return affinity.affine_transform(geometria, [inversa.a, inversa.b, inversa.d, inversa.e,
+                                                 inversa.xoff, inversa.yoff])
+
+def gravar_vrt_recorte(raster_path, geometrias, vrt_path):
+    """
+    Grava um VRT que recorta o raster pelas geometrias, sem copiar pixels.
+
+    Parâmetros:
+    - raster_path: Caminho do raster de origem (gravado como caminho absoluto no VRT).
+    - geometrias: Lista de geometrias (shapely ou GeoJSON) no CRS do raster.
+    - vrt_path: Caminho do VRT de saída.
+
+    Retorna o caminho do VRT.
+    """
+    with rasterio.open(os.path.abspath(raster_path)) as src:
+        janela = geometry_window(src, geometrias)
+        linha_de_corte = unary_union([geometria_em_pixels(src, geometria) for geometria in geometrias])
+        nodata = src.nodata if src.nodata is not None else 0
+
+        # Mesma grade da origem, só que restrita à janela do recorte: o warp vira uma cópia
+        # pixel a pixel, com os pixels fora da linha de corte em nodata
+        with WarpedVRT(src, crs=src.crs, transform=src.window_transform(janela), width=int(janela.width),
+                       height=int(janela.height), nodata=nodata, resampling=Resampling.nearest,
+                       cutline=linha_de_corte.wkt) as vrt:
+            xml = vrt.tags(ns="xml:VRT")["xml:VRT"]
+
+    with open(vrt_path, "w") as f:
+        f.write(xml)
+    return vrt_path
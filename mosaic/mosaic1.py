@@ -58,6 +58,8 @@ def executar_gdal_merge(result_folder, demList):
     --config GDAL_NUM_THREADS ALL_CPUS: Utiliza todos os núcleos disponíveis do CPU para otimizar o processo.
     -o: Nome do arquivo de mosaico de saída.
     -co COMPRESS=DEFLATE: Aplica compressão DEFLATE ao arquivo de saída para reduzir o tamanho.
+    -co SPARSE_OK=TRUE: Não grava os blocos sem nenhum raster de entrada, que os scripts de área
+                        e de corte pulam sem decodificar.
     -n 0: Define o valor de "no data" como 0.
     
     Retorno:
@@ -69,7 +71,7 @@ def executar_gdal_merge(result_folder, demList):
     # Comando gdal_merge com paralelismo e compressão DEFLATE
     cmd = [
         "gdal_merge.py", "-ps", str(res), str(res), "--config", "GDAL_NUM_THREADS", "ALL_CPUS",
-        "-o", os.path.join(result_folder, "mosaic.tif"), "-co", "COMPRESS=DEFLATE", "-n", "0"
+        "-o", os.path.join(result_folder, "mosaic.tif"), "-co", "COMPRESS=DEFLATE", "-co", "SPARSE_OK=TRUE", "-n", "0"
     ] + demList
     
     # Executar o comando
@@ -98,7 +100,7 @@ def criar_vrt_exportar_tif(result_folder, demList):
     # Exporta o VRT para um arquivo TIF com compressão DEFLATE
     gdal.Translate(
         os.path.join(result_folder, "mosaic2.tif"), vrt, 
-        xRes=res, yRes=res, creationOptions=["COMPRESS=DEFLATE"]
+        xRes=res, yRes=res, creationOptions=["COMPRESS=DEFLATE", "SPARSE_OK=TRUE"]
     )
     
     # Libera o objeto VRT da memória